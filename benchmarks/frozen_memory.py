@@ -0,0 +1,82 @@
+"""
+比较模型实例与只读视图 (`Document.freeze`、`FindResult.frozen`) 的内存占用与构建耗时:
+
+    python benchmarks/frozen_memory.py
+"""
+
+import gc
+import time
+import tracemalloc
+from collections.abc import Callable
+from datetime import datetime, timezone
+from typing import Any
+
+from bson import ObjectId
+
+from mango import Document, EmbeddedDocument, Field
+from mango.frozen import frozen_view
+
+COUNT = 100000
+
+
+class Address(EmbeddedDocument):
+    city: str
+    zip: int = 0
+
+
+class User(Document):
+    name: str
+    age: int
+    score: float
+    tags: list[str] = Field(default_factory=list)
+    created_at: datetime
+    address: Address
+
+
+def documents() -> list[dict[str, Any]]:
+    created_at = datetime.now(timezone.utc)
+    return [
+        {
+            "_id": ObjectId(),
+            "name": f"user{i}",
+            "age": i,
+            "score": i / 3,
+            "tags": ["a", "b"],
+            "created_at": created_at,
+            "address": {"city": "city", "zip": i},
+        }
+        for i in range(COUNT)
+    ]
+
+
+def measure(build: Callable[[dict[str, Any]], object]) -> tuple[float, float]:
+    """构建所有文档, 返回每个实例占用的字节数与构建耗时的微秒数"""
+    data = documents()
+    start = time.perf_counter()
+    for document in data:
+        build(document)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    instances = [build(document) for document in data]
+    del data
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del instances
+    return current / COUNT, elapsed / COUNT * 1e6
+
+
+def main() -> None:
+    view = frozen_view(User)
+    results = {
+        "model": measure(User.from_doc),
+        "frozen": measure(view.from_doc),
+    }
+    for name, (size, elapsed) in results.items():
+        print(f"{name:>8}: {size:.0f} bytes, {elapsed:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
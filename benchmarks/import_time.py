@@ -0,0 +1,70 @@
+"""
+测量导入 mango 与创建模型类的耗时:
+
+    python benchmarks/import_time.py
+
+每个导入语句在新的解释器中运行, 取中位数。
+"dependencies" 为 mango 导入的第三方库的耗时, 与 `from mango import Document` 的差值为 mango 自身的耗时。
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from mango import Document, Field
+
+RUNS = 15
+MODELS = 300
+FIELDS = 20
+
+STATEMENTS = {
+    "import mango": "import mango",
+    "from mango import Document": "from mango import Document",
+    "dependencies": "import bson, motor.motor_asyncio, pydantic",
+}
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def import_time(statement: str) -> float:
+    """在新的解释器中执行导入语句, 返回耗时的毫秒数"""
+    code = (
+        "import time\n"
+        "start = time.perf_counter()\n"
+        f"{statement}\n"
+        "print(time.perf_counter() - start)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],  # noqa: S603
+        check=True,
+        capture_output=True,
+        cwd=ROOT,
+        text=True,
+    ).stdout
+    return float(output) * 1000
+
+
+def class_creation() -> float:
+    """创建模型类, 返回每个模型耗时的微秒数"""
+    annotations = {f"f{i}": int for i in range(FIELDS)}
+    namespace = {"__annotations__": annotations} | {
+        f"f{i}": Field(0) for i in range(FIELDS)
+    }
+    start = time.perf_counter()
+    for i in range(MODELS):
+        type(f"Model{i}", (Document,), dict(namespace))
+    return (time.perf_counter() - start) / MODELS * 1e6
+
+
+def main() -> None:
+    for name, statement in STATEMENTS.items():
+        median = statistics.median(import_time(statement) for _ in range(RUNS))
+        print(f"{name:>28}: {median:.1f} ms")
+    best = min(class_creation() for _ in range(5))
+    print(f"{'class creation':>28}: {best:.0f} us/model")
+
+
+if __name__ == "__main__":
+    main()
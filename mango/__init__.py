@@ -1,22 +1,70 @@
-from importlib.metadata import version
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
 
-from mango.expression import OPR
-from mango.fields import Field
-from mango.index import Attr, Index, Order
-from mango.models import Document, EmbeddedDocument
-from mango.source import Mango
-from mango.stage import Pipeline
+if TYPE_CHECKING:  # pragma: no cover
+    from mango.advisor import IndexAdvisor
+    from mango.expression import OPR
+    from mango.fields import Field
+    from mango.index import Attr, Index, Order
+    from mango.meta import Capped, Storage, TimeSeries
+    from mango.models import Document, EmbeddedDocument
+    from mango.ref import Ref
+    from mango.source import Mango
+    from mango.stage import Pipeline
+    from mango.view import MaterializedView
 
-__version__ = version("mango-odm")
+    __version__: str
+
+_exports = {
+    "OPR": "mango.expression",
+    "Attr": "mango.index",
+    "Capped": "mango.meta",
+    "Document": "mango.models",
+    "EmbeddedDocument": "mango.models",
+    "Field": "mango.fields",
+    "Index": "mango.index",
+    "IndexAdvisor": "mango.advisor",
+    "Mango": "mango.source",
+    "MaterializedView": "mango.view",
+    "Order": "mango.index",
+    "Pipeline": "mango.stage",
+    "Ref": "mango.ref",
+    "Storage": "mango.meta",
+    "TimeSeries": "mango.meta",
+}
 
 __all__ = [
     "OPR",
-    "Field",
     "Attr",
-    "Index",
-    "Order",
+    "Capped",
     "Document",
     "EmbeddedDocument",
+    "Field",
+    "Index",
+    "IndexAdvisor",
     "Mango",
+    "MaterializedView",
+    "Order",
     "Pipeline",
+    "Ref",
+    "Storage",
+    "TimeSeries",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    """在首次访问时导入子模块, 以减少 `import mango` 的耗时"""
+    if name == "__version__":
+        from importlib.metadata import version
+
+        value: Any = version("mango-odm")
+    elif module := _exports.get(name):
+        value = getattr(import_module(module), name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted({*globals(), *_exports, "__version__"})
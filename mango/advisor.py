@@ -0,0 +1,339 @@
+import itertools
+import logging
+import os
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, ClassVar, Literal, TypeAlias, get_args
+
+from mango.index import Attr, Index, Order
+from mango.utils import get_indexes
+
+if TYPE_CHECKING:  # pragma: no cover
+    from mango.models import Document
+
+logger = logging.getLogger(__name__)
+
+AdvisorMode: TypeAlias = Literal["off", "log", "raise"]
+
+IndexKeys: TypeAlias = list[tuple[str, Any]]
+
+UNINDEXABLE_OPERATORS = {"$expr", "$where", "$nor"}
+
+GEO_OPERATORS = {"$near", "$nearSphere", "$geoWithin", "$geoIntersects"}
+
+
+class IndexAdviceError(Exception):
+    """查询未被已声明的索引覆盖"""
+
+
+@dataclass
+class QueryShape:
+    equality: list[str] = field(default_factory=list)
+    """等值匹配的字段"""
+    range: list[str] = field(default_factory=list)
+    """范围匹配的字段"""
+    unindexable: bool = False
+    """是否包含无法使用索引的条件"""
+    text: bool = False
+    """是否包含全文搜索"""
+    geo: list[str] = field(default_factory=list)
+    """地理空间匹配的字段"""
+
+    @property
+    def fields(self) -> list[str]:
+        return self.equality + [f for f in self.range if f not in self.equality]
+
+    def merge(self, other: "QueryShape") -> "QueryShape":
+        return QueryShape(
+            self.equality + other.equality,
+            self.range + other.range,
+            self.unindexable or other.unindexable,
+            self.text or other.text,
+            self.geo + other.geo,
+        )
+
+
+@dataclass
+class IndexAdvice:
+    model: type["Document"]
+    filter: dict[str, Any]
+    sort: list[tuple[str, Any]]
+    projection: dict[str, Any] | None = None
+    index: IndexKeys | None = None
+    """查询可能使用的索引键"""
+    collection_scan: bool = False
+    """是否可能执行全集合扫描"""
+    in_memory_sort: bool = False
+    """是否可能在内存中排序"""
+    covered: bool = False
+    """是否为覆盖查询"""
+    suggestion: Index | None = None
+    """能够覆盖查询的建议索引"""
+
+    @property
+    def ok(self) -> bool:
+        return not (self.collection_scan or self.in_memory_sort)
+
+    def __str__(self) -> str:
+        problems = []
+        if self.collection_scan:
+            problems.append("可能执行全集合扫描")
+        if self.in_memory_sort:
+            problems.append("可能在内存中排序")
+        if not problems:
+            return f"{self.model.__name__} 的查询已被索引 {self.index} 覆盖"
+        message = (
+            f"{self.model.__name__} 的查询{', '.join(problems)}: "
+            f"filter={self.filter}, sort={self.sort}"
+        )
+        if self.suggestion:
+            keys = {
+                k: getattr(v, "value", v)
+                for k, v in self.suggestion.document["key"].items()
+            }
+            message += f", 建议索引: {keys}"
+        return message
+
+
+def is_equality(value: Any) -> bool:
+    """判断过滤值是否为等值匹配"""
+    if not isinstance(value, Mapping):
+        return True
+    if not any(str(k).startswith("$") for k in value):
+        return True
+    if value.keys() == {"$eq"}:
+        return True
+    return value.keys() == {"$in"} and len(value["$in"]) == 1
+
+
+def query_shapes(query: Mapping[str, Any]) -> list[QueryShape]:
+    """将过滤条件拆解为查询形状, `$or` 的每个分支都会产生一个独立的形状"""
+    shape = QueryShape()
+    branches: list[list[QueryShape]] = []
+    for key, value in query.items():
+        if key == "$and":
+            for sub in value:
+                branches.append(query_shapes(sub))
+        elif key == "$or":
+            branches.append([s for sub in value for s in query_shapes(sub)])
+        elif key in UNINDEXABLE_OPERATORS:
+            shape.unindexable = True
+        elif key == "$text":
+            shape.text = True
+        elif key.startswith("$"):
+            continue
+        elif is_equality(value):
+            shape.equality.append(key)
+        else:
+            shape.range.append(key)
+            if not GEO_OPERATORS.isdisjoint(value):
+                shape.geo.append(key)
+
+    shapes = []
+    for combination in itertools.product(*branches):
+        merged = shape
+        for other in combination:
+            merged = merged.merge(other)
+        shapes.append(merged)
+    return shapes
+
+
+def index_keys(index: Index) -> IndexKeys:
+    return list(index.document["key"].items())
+
+
+def direction_of(value: Any) -> int | None:
+    try:
+        return Order(value).value
+    except ValueError:
+        return None
+
+
+def is_text_sort(direction: Any) -> bool:
+    """是否为按全文搜索得分排序"""
+    return isinstance(direction, Mapping)
+
+
+def can_filter(keys: IndexKeys, shape: QueryShape) -> bool:
+    """索引的前缀字段是否出现在过滤条件中, 全文搜索需要文本索引"""
+    if shape.text:
+        return any(direction == Attr.TEXT for _, direction in keys)
+    return bool(keys) and keys[0][0] in shape.fields
+
+
+def can_sort(
+    keys: IndexKeys, shape: QueryShape, sort: Sequence[tuple[str, Any]]
+) -> bool:
+    """索引能否提供指定的排序顺序"""
+    required = [
+        (k, d) for k, d in sort if k not in shape.equality and not is_text_sort(d)
+    ]
+    if not required:
+        return True
+    remaining = list(keys)
+    while remaining and remaining[0][0] in shape.equality:
+        remaining.pop(0)
+    if len(remaining) < len(required):
+        return False
+    reverse = None
+    for (key, direction), (rkey, rdirection) in zip(remaining, required, strict=False):
+        index_direction = direction_of(direction)
+        sort_direction = direction_of(rdirection)
+        if key != rkey or None in (index_direction, sort_direction):
+            return False
+        same = index_direction == sort_direction
+        if reverse is None:
+            reverse = not same
+        elif reverse == same:
+            return False
+    return True
+
+
+def can_cover(
+    keys: IndexKeys, shape: QueryShape, projection: Mapping[str, Any] | None
+) -> bool:
+    """查询所需的全部字段是否都包含在索引中"""
+    if not projection:
+        return False
+    included = {k for k, v in projection.items() if v}
+    if "_id" not in projection or projection["_id"]:
+        included.add("_id")
+    names = {k for k, _ in keys}
+    return included <= names and set(shape.fields) <= names
+
+
+def suggest_index(shape: QueryShape, sort: Sequence[tuple[str, Any]]) -> Index | None:
+    """
+    按照 等值-排序-范围 的规则构造建议索引, 地理空间字段使用球型地理空间索引。
+    全文搜索的字段无法从查询中得知, 不会给出建议。
+    """
+    if shape.text:
+        return None
+    keys: dict[str, Any] = {}
+    for name in shape.equality:
+        keys.setdefault(name, Order.ASC)
+    for name, direction in sort:
+        if not is_text_sort(direction):
+            keys.setdefault(name, Order(direction))
+    for name in shape.range:
+        keys.setdefault(name, Attr.GEOSPHERE if name in shape.geo else Order.ASC)
+    return Index(*keys.items()) if keys else None
+
+
+class IndexAdvisor:
+    """开发模式下的索引顾问, 检查查询是否被模型声明的索引覆盖"""
+
+    mode: ClassVar[AdvisorMode] = "off"
+    _indexes: ClassVar[dict[type["Document"], tuple[Any, list[IndexKeys]]]] = {}
+
+    @classmethod
+    def enable(cls, mode: AdvisorMode = "log") -> None:
+        """启用索引顾问, `log` 将记录警告日志, `raise` 将引发异常"""
+        if mode not in get_args(AdvisorMode):
+            raise ValueError(f"未知的索引顾问模式: {mode}")
+        cls.mode = mode
+
+    @classmethod
+    def disable(cls) -> None:
+        """禁用索引顾问"""
+        cls.mode = "off"
+
+    @classmethod
+    def reset(cls, model: type["Document"] | None = None) -> None:
+        """清除缓存的索引键, 未指定模型时清除全部"""
+        if model is None:
+            cls._indexes.clear()
+        else:
+            cls._indexes.pop(model, None)
+
+    @classmethod
+    def indexes(cls, model: type["Document"]) -> list[IndexKeys]:
+        """
+        模型声明的全部索引键, 包含默认的 `_id` 索引。
+        字段或元配置的索引列表变化后缓存自动失效, 其他修改需调用 `reset`。
+        """
+        indexes = model.__meta__.indexes
+        signature = (tuple(model.__fields__), id(indexes), len(indexes))
+        cached = cls._indexes.get(model)
+        if cached and cached[0] == signature:
+            return cached[1]
+        keys = [[("_id", Order.ASC.value)]]
+        keys += [
+            index_keys(index)
+            for index in get_indexes(model)
+            if not index.document.get("hidden")
+        ]
+        cls._indexes[model] = (signature, keys)
+        return keys
+
+    @classmethod
+    def analyze(
+        cls,
+        model: type["Document"],
+        filter: Mapping[str, Any],
+        sort: Sequence[tuple[str, Any]] = (),
+        projection: Mapping[str, Any] | None = None,
+    ) -> IndexAdvice:
+        """分析查询的过滤条件、排序与投影"""
+        advice = IndexAdvice(
+            model,
+            dict(filter),
+            list(sort),
+            dict(projection) if projection is not None else None,
+        )
+        indexes = cls.indexes(model)
+        for shape in query_shapes(filter):
+            if shape.unindexable:
+                advice.collection_scan = True
+                continue
+
+            filtered = bool(shape.fields) or shape.text
+            if not filtered and not sort:
+                continue
+
+            filterable = [keys for keys in indexes if can_filter(keys, shape)]
+            if filtered and not filterable:
+                advice.collection_scan = True
+                advice.in_memory_sort |= bool(sort)
+            else:
+                candidates = filterable if filtered else indexes
+                sortable = [keys for keys in candidates if can_sort(keys, shape, sort)]
+                if not sortable:
+                    if filtered:
+                        advice.in_memory_sort |= bool(sort)
+                    else:
+                        advice.collection_scan = True
+                        advice.in_memory_sort = True
+                if chosen := next(iter(sortable or filterable), None):
+                    advice.index = advice.index or chosen
+                    advice.covered = can_cover(chosen, shape, projection)
+
+            if not advice.ok and not advice.suggestion:
+                advice.suggestion = suggest_index(shape, sort)
+
+        return advice
+
+    @classmethod
+    def check(
+        cls,
+        model: type["Document"],
+        filter: Mapping[str, Any],
+        sort: Sequence[tuple[str, Any]] = (),
+        projection: Mapping[str, Any] | None = None,
+    ) -> IndexAdvice | None:
+        """启用时分析查询, 并根据模式记录日志或引发异常"""
+        if cls.mode == "off":
+            return None
+        advice = cls.analyze(model, filter, sort, projection)
+        if not advice.ok:
+            if cls.mode == "raise":
+                raise IndexAdviceError(str(advice))
+            logger.warning(advice)
+        return advice
+
+
+if mode := os.getenv("MANGO_INDEX_ADVISOR"):
+    try:
+        IndexAdvisor.enable(mode)  # type: ignore
+    except ValueError:
+        logger.warning("忽略无效的 MANGO_INDEX_ADVISOR 环境变量: %s", mode)
@@ -0,0 +1,148 @@
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable, Iterable
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, ClassVar, NamedTuple, TypeVar
+
+if TYPE_CHECKING:  # pragma: no cover
+    from mango.models import Document
+
+T = TypeVar("T")
+
+_generations: dict[type["Document"], int] = {}
+
+
+def generation(model: type["Document"]) -> int:
+    """模型的写入代数, 每次写入后递增"""
+    return _generations.get(model, 0)
+
+
+def generations(
+    model: type["Document"], related: Iterable[type["Document"]] = ()
+) -> tuple[int, ...]:
+    """模型与相关模型的写入代数"""
+    return (generation(model), *(generation(m) for m in related))
+
+
+def invalidate(model: type["Document"]) -> None:
+    """使模型的全部缓存查询结果失效, 在模型的每次写入后调用"""
+    _generations[model] = _generations.get(model, 0) + 1
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    """命中次数"""
+    misses: int = 0
+    """未命中次数"""
+    evictions: int = 0
+    """因容量不足淘汰的条目数量"""
+    expirations: int = 0
+    """因过期或写入失效的条目数量"""
+
+    @property
+    def hit_rate(self) -> float:
+        """命中率"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class CacheEntry(NamedTuple):
+    value: Any
+    generation: tuple[int, ...]
+    expires: float
+
+
+class QueryCache:
+    """
+    查询结果缓存。
+    按最近最少使用淘汰条目, 条目在过期或模型及其相关模型发生写入后失效。
+    写入失效仅对通过 mango 在当前进程中执行的写入有效。
+    """
+
+    default: ClassVar["QueryCache"]
+
+    def __init__(self, max_entries: int = 1024, max_documents: int = 1000) -> None:
+        """
+        max_entries: 最多缓存的查询数量。
+        max_documents: 单个查询最多缓存的文档数量, 结果更多的查询不会被缓存。
+        """
+        self.max_entries = max_entries
+        self.max_documents = max_documents
+        self.stats = CacheStats()
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self._entries.clear()
+
+    def get(
+        self,
+        model: type["Document"],
+        key: Hashable,
+        related: Iterable[type["Document"]] = (),
+    ) -> CacheEntry | None:
+        """
+        获取仍然有效的条目。
+        `related` 为结果中包含其文档的其他模型, 如 `$lookup` 连接的模型。
+        """
+        if (entry := self._entries.get(key)) is None:
+            return None
+        if (
+            entry.generation != generations(model, related)
+            or entry.expires < time.monotonic()
+        ):
+            del self._entries[key]
+            self.stats.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(
+        self,
+        model: type["Document"],
+        key: Hashable,
+        value: Any,
+        *,
+        gen: tuple[int, ...],
+        ttl: float,
+        related: Iterable[type["Document"]] = (),
+    ) -> None:
+        """
+        缓存查询结果。
+        `gen` 为查询开始时模型与相关模型的写入代数, 如果查询期间发生了写入, 结果将不会被缓存。
+        """
+        if gen != generations(model, related):
+            return
+        if isinstance(value, list) and len(value) > self.max_documents:
+            return
+        self._entries[key] = CacheEntry(value, gen, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    async def fetch(
+        self,
+        model: type["Document"],
+        key: Hashable,
+        ttl: float,
+        read: Callable[[], Awaitable[T]],
+        related: Iterable[type["Document"]] = (),
+    ) -> T:
+        """从缓存中获取查询结果, 未命中时执行查询并缓存"""
+        related = tuple(related)
+        if entry := self.get(model, key, related):
+            self.stats.hits += 1
+            return entry.value
+        self.stats.misses += 1
+        gen = generations(model, related)
+        value = await read()
+        self.set(model, key, value, gen=gen, ttl=ttl, related=related)
+        return value
+
+
+QueryCache.default = QueryCache()
@@ -0,0 +1,52 @@
+"""
+pydantic 导入。
+mango 的模型基于 pydantic v1 的接口, 所有模块都从此处导入 pydantic。
+"""
+
+from pydantic import (
+    BaseModel,
+    ValidationError,
+    create_model,
+    root_validator,
+    validator,
+)
+from pydantic.error_wrappers import ErrorWrapper
+from pydantic.fields import (
+    SHAPE_DEQUE,
+    SHAPE_FROZENSET,
+    SHAPE_LIST,
+    SHAPE_SEQUENCE,
+    SHAPE_SET,
+    SHAPE_SINGLETON,
+    SHAPE_TUPLE,
+    SHAPE_TUPLE_ELLIPSIS,
+    FieldInfo,
+    ModelField,
+    Undefined,
+)
+from pydantic.main import ModelMetaclass
+from pydantic.typing import NoArgAnyCallable
+from pydantic.utils import ROOT_KEY
+
+__all__ = [
+    "ROOT_KEY",
+    "SHAPE_DEQUE",
+    "SHAPE_FROZENSET",
+    "SHAPE_LIST",
+    "SHAPE_SEQUENCE",
+    "SHAPE_SET",
+    "SHAPE_SINGLETON",
+    "SHAPE_TUPLE",
+    "SHAPE_TUPLE_ELLIPSIS",
+    "BaseModel",
+    "ErrorWrapper",
+    "FieldInfo",
+    "ModelField",
+    "ModelMetaclass",
+    "NoArgAnyCallable",
+    "Undefined",
+    "ValidationError",
+    "create_model",
+    "root_validator",
+    "validator",
+]
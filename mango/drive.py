@@ -1,3 +1,4 @@
+import contextlib
 import os
 from collections.abc import Iterator
 from typing import Any, ClassVar
@@ -7,6 +8,7 @@ from motor.motor_asyncio import (
     AsyncIOMotorCollection,
     AsyncIOMotorDatabase,
 )
+from pymongo.errors import CollectionInvalid
 from typing_extensions import Self
 
 DEFAULT_CONNECT_URI = os.getenv("MANGO_URI") or "mongodb://localhost:27017"
@@ -58,6 +60,19 @@ class Database:
             f"port={self.client.PORT})"
         )
 
+    async def create_collection(self, name: str, **options: Any) -> Collection:
+        """使用选项创建集合, 如果集合已存在, 则直接返回它"""
+        with contextlib.suppress(CollectionInvalid):
+            await self.db.create_collection(name, **options)
+        return self[name]
+
+    async def collection_options(self, name: str) -> dict[str, Any] | None:
+        """获取集合创建时的选项, 如果集合不存在, 则返回 None"""
+        cursor = await self.db.list_collections(filter={"name": name})
+        async for info in cursor:
+            return info.get("options", {})
+        return None
+
     async def drop_collection(self, collection: str | Collection) -> None:
         """删除集合"""
         name = collection if isinstance(collection, str) else collection.name
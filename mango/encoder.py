@@ -4,6 +4,8 @@ from typing import Any, ClassVar, TypeAlias
 
 from bson.codec_options import CodecOptions, TypeRegistry
 
+from mango.ref import Ref
+
 EncodeType: TypeAlias = dict[type[Any] | tuple[type[Any], ...], Callable[..., Any]]
 
 
@@ -11,16 +13,30 @@ class Encoder:
     default_encode_type: ClassVar[EncodeType] = {
         set: list,
         Enum: lambda e: e.value,
+        Ref: lambda r: r.id,
     }
 
+    _created: ClassVar[dict[tuple[Any, ...], CodecOptions]] = {}
+
     @classmethod
     def create(
         cls,
         encode_type: EncodeType | None = None,
     ) -> CodecOptions:
-        """创建一个编码器"""
+        """创建一个编码器, 编码类型相同的编码器将被复用"""
         encode_type = encode_type or {}
+        key = tuple(encode_type.items())
+        try:
+            return cls._created[key]
+        except KeyError:
+            options = cls._created[key] = cls._create(encode_type)
+            return options
+        except TypeError:
+            # 编码函数不可哈希
+            return cls._create(encode_type)
 
+    @classmethod
+    def _create(cls, encode_type: EncodeType) -> CodecOptions:
         def encoder(value: Any) -> Any:
             for type_, encoder in (encode_type | cls.default_encode_type).items():
                 if isinstance(value, type_):
@@ -1,17 +1,52 @@
+import contextlib
+from collections.abc import Mapping
 from dataclasses import dataclass
+from decimal import Decimal
 from enum import Enum, auto
-from typing import TYPE_CHECKING, Any
+from types import UnionType
+from typing import Any, TypeAlias, Union, get_args, get_origin
 
-from pydantic.fields import ModelField
+import bson
 from typing_extensions import Self
 
+from mango.compat import (
+    SHAPE_DEQUE,
+    SHAPE_FROZENSET,
+    SHAPE_LIST,
+    SHAPE_SEQUENCE,
+    SHAPE_SET,
+    SHAPE_SINGLETON,
+    SHAPE_TUPLE,
+    SHAPE_TUPLE_ELLIPSIS,
+    BaseModel,
+    ModelField,
+)
 from mango.fields import FieldInfo
+from mango.utils import is_sequence, validate_value
 
-if TYPE_CHECKING:  # pragma: no cover
-    from mango.models import Document
+Geometry: TypeAlias = Mapping[str, Any] | tuple[float, float] | list[float]
 
+ARRAY_SHAPES = {
+    SHAPE_LIST,
+    SHAPE_SET,
+    SHAPE_FROZENSET,
+    SHAPE_TUPLE,
+    SHAPE_TUPLE_ELLIPSIS,
+    SHAPE_SEQUENCE,
+    SHAPE_DEQUE,
+}
+"""保存为数组的字段形状"""
 
-class Operators(Enum):
+NUMBER_TYPES = (int, float, Decimal, bson.Decimal128)
+
+
+class OperatorEnum(Enum):
+    def __str__(self) -> str:
+        first, *rest = self.name.lower().split("_")
+        return f"${first}{''.join(word.capitalize() for word in rest)}"
+
+
+class Operators(OperatorEnum):
     EQ = auto()
     """等于"""
     NE = auto()
@@ -36,17 +71,93 @@ class Operators(Enum):
     """不包含在"""
     REGEX = auto()
     """正则匹配"""
-
-    def __str__(self) -> str:
-        return f"${self.name.lower()}"
+    TEXT = auto()
+    """全文搜索"""
+    NEAR = auto()
+    """按距离由近到远匹配"""
+    NEAR_SPHERE = auto()
+    """按球面距离由近到远匹配"""
+    GEO_WITHIN = auto()
+    """位于指定的几何图形内"""
+    GEO_INTERSECTS = auto()
+    """与指定的几何图形相交"""
+
+
+SEARCH_OPERATORS = {
+    Operators.TEXT,
+    Operators.NEAR,
+    Operators.NEAR_SPHERE,
+    Operators.GEO_WITHIN,
+    Operators.GEO_INTERSECTS,
+}
+"""依赖文本或地理空间索引的查询操作符, 只能用于查询过滤条件"""
+
+
+class UpdateOperators(OperatorEnum):
+    SET = auto()
+    """设置字段的值"""
+    UNSET = auto()
+    """移除字段"""
+    INC = auto()
+    """增加字段的值"""
+    MUL = auto()
+    """将字段的值乘以指定数值"""
+    MIN = auto()
+    """仅当指定值小于字段的值时更新"""
+    MAX = auto()
+    """仅当指定值大于字段的值时更新"""
+    PUSH = auto()
+    """向数组添加元素"""
+    ADD_TO_SET = auto()
+    """向数组添加不存在的元素"""
+    PULL = auto()
+    """从数组移除匹配的元素"""
+    POP = auto()
+    """移除数组的第一个或最后一个元素"""
 
 
 class ExpressionField:
-    def __init__(
-        self, field: ModelField, parents: list[tuple[str, "Document"]]
-    ) -> None:
-        self.field = field
-        self.parents = parents
+    """
+    模型字段的查询表达式构建器。
+    完整的 BSON 字段路径在创建时计算, 实例不可变, 内嵌字段的访问结果会被缓存复用。
+    """
+
+    __slots__ = ("field", "path", "by_alias", "_children")
+
+    field: ModelField
+    path: str
+    """字段在 MongoDB 文档中的完整路径"""
+    by_alias: bool
+    """内嵌字段路径是否使用别名"""
+
+    def __init__(self, field: ModelField, path: str, by_alias: bool = False) -> None:
+        object.__setattr__(self, "field", field)
+        object.__setattr__(self, "path", path)
+        object.__setattr__(self, "by_alias", by_alias)
+        object.__setattr__(self, "_children", {})
+
+    @classmethod
+    def of(cls, field: ModelField, by_alias: bool = False) -> Self:
+        """创建模型的顶层字段, 主键字段的路径为 `_id`"""
+        if isinstance(finfo := field.field_info, FieldInfo) and finfo.primary_key:
+            return cls(field, "_id", by_alias)
+        return cls(field, field.alias if by_alias else field.name, by_alias)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{self.__class__.__name__} 不可修改")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{self.__class__.__name__} 不可修改")
+
+    def __copy__(self) -> Self:
+        return self
+
+    def __deepcopy__(self, memo: dict[int, Any]) -> Self:
+        # 实例不可变, 复制时直接复用, 如编译包含字段的聚合阶段
+        return self
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return self.__class__, (self.field, self.path, self.by_alias)
 
     def __eq__(self, other: Any) -> "Expression":
         return OPR(self).eq(other)
@@ -73,22 +184,75 @@ class ExpressionField:
         return f"ExpressionField(name={self!s}, type={self.field._type_display()})"
 
     def __str__(self) -> str:
-        names = [p[0] for p in self.parents]
-        if isinstance(finfo := self.field.field_info, FieldInfo) and finfo.primary_key:
-            names.append("_id")
-        else:
-            names.append(self.field.name)
-        return ".".join(names)
+        return self.path
+
+    def set(self, value: Any) -> "Update":
+        """设置字段的值"""
+        return Update(self, UpdateOperators.SET, value)
+
+    def unset(self) -> "Update":
+        """移除字段"""
+        return Update(self, UpdateOperators.UNSET, "")
+
+    def inc(self, amount: int | float = 1) -> "Update":
+        """增加字段的值, 可以为负数"""
+        return Update(self, UpdateOperators.INC, amount)
+
+    def mul(self, factor: int | float) -> "Update":
+        """将字段的值乘以指定数值"""
+        return Update(self, UpdateOperators.MUL, factor)
+
+    def min(self, value: Any) -> "Update":
+        """仅当指定值小于字段的值时更新"""
+        return Update(self, UpdateOperators.MIN, value)
+
+    def max(self, value: Any) -> "Update":
+        """仅当指定值大于字段的值时更新"""
+        return Update(self, UpdateOperators.MAX, value)
+
+    def push(
+        self,
+        *values: Any,
+        position: int | None = None,
+        slice: int | None = None,
+        sort: Any = None,
+    ) -> "Update":
+        """
+        向数组添加元素。
+
+        position: 插入元素的位置。
+        slice: 添加后仅保留数组的前 n 个(正数)或后 n 个(负数)元素。
+        sort: 添加后对数组排序。
+        """
+        modifiers = {"$position": position, "$slice": slice, "$sort": sort}
+        value = {"$each": list(values)}
+        value |= {k: v for k, v in modifiers.items() if v is not None}
+        return Update(self, UpdateOperators.PUSH, value)
+
+    def add_to_set(self, *values: Any) -> "Update":
+        """向数组添加不存在的元素"""
+        return Update(self, UpdateOperators.ADD_TO_SET, {"$each": list(values)})
+
+    def pull(self, condition: Any) -> "Update":
+        """从数组移除与值或条件匹配的全部元素"""
+        return Update(self, UpdateOperators.PULL, condition)
+
+    def pop(self, last: bool = True) -> "Update":
+        """移除数组的最后一个或第一个元素"""
+        return Update(self, UpdateOperators.POP, 1 if last else -1)
 
     def __getattr__(self, name: str) -> Any:
-        """内嵌查询反向查找分配父级"""
-        attr = getattr(self.field.outer_type_, name)
-        if isinstance(attr, self.__class__):
-            new_parent = (self.field.name, self.field.outer_type_)
-            if new_parent not in attr.parents:
-                attr.parents.append(new_parent)
-            if new_parents := list(set(self.parents) - set(attr.parents)):
-                attr.parents = new_parents + attr.parents
+        """访问内嵌文档的字段, 返回带有完整路径的新字段"""
+        if name.startswith("__"):
+            raise AttributeError(name)
+        with contextlib.suppress(KeyError):
+            return self._children[name]
+        attr = getattr(self.field.type_, name)
+        if isinstance(attr, ExpressionField):
+            field = attr.field
+            segment = field.alias if self.by_alias else field.name
+            attr = self.__class__(field, f"{self.path}.{segment}", self.by_alias)
+            self._children[name] = attr
         return attr
 
 
@@ -112,6 +276,25 @@ class Expression:
         value = {str(self.operator): self.unpack(self.value)}
         return {str(self.key): value} if self.key else value
 
+    def expr(self) -> dict[str, Any]:
+        """转换为聚合表达式结构"""
+        if self.operator in SEARCH_OPERATORS:
+            raise ValueError(f"{self.operator} 不能用于聚合表达式")
+        if self.key is None:
+            items = [compile_expression(e) for e in self.value]
+            if self.operator is Operators.NOR:
+                return {"$not": [{"$or": items}]}
+            return {str(self.operator): items}
+        field = compile_expression(self.key)
+        value = compile_expression(self.unpack(self.value))
+        if self.operator is Operators.REGEX:
+            return {"$regexMatch": {"input": field, "regex": value}}
+        if self.operator is Operators.IN:
+            return {"$in": [field, list(value)]}
+        if self.operator is Operators.NIN:
+            return {"$not": [{"$in": [field, list(value)]}]}
+        return {str(self.operator): [field, value]}
+
     def unpack(self, value: Any) -> Any:
         # TODO: 将嵌入文档模型转换为 mongodb 文档形式
         return value
@@ -120,6 +303,63 @@ class Expression:
         return self.value if self.operator is operator else [self]
 
 
+@dataclass
+class Update:
+    key: ExpressionField
+    operator: UpdateOperators
+    value: Any
+
+    def __repr__(self) -> str:
+        return f"Update({{'{self.operator}': {{'{self.key}': {self.value!r}}}}})"
+
+    def validate(self, model: type[BaseModel]) -> Any:
+        """使用字段类型验证更新的值"""
+        field = self.key.field
+        is_array = field.shape in ARRAY_SHAPES
+        operator = self.operator
+        if operator in {UpdateOperators.UNSET, UpdateOperators.POP}:
+            return self.value
+        if operator in {UpdateOperators.INC, UpdateOperators.MUL}:
+            if not is_number_field(field):
+                raise TypeError(f"{operator} 只能用于数字字段: {self.key}")
+            # 增量与倍数不是字段的值, 不受字段的类型与约束限制
+            if isinstance(self.value, bool) or not isinstance(
+                self.value, int | float | bson.Decimal128
+            ):
+                raise TypeError(f"{operator} 的值必须是数字: {self.key}")
+            return self.value
+        if operator in {UpdateOperators.PUSH, UpdateOperators.ADD_TO_SET}:
+            if not is_array:
+                raise TypeError(f"{operator} 只能用于数组字段: {self.key}")
+            each = [validate_value(model, field, v) for v in self.value["$each"]]
+            return self.value | {"$each": each}
+        if operator is UpdateOperators.PULL:
+            if not is_array:
+                raise TypeError(f"{operator} 只能用于数组字段: {self.key}")
+            if isinstance(self.value, Expression | Mapping):
+                return compile_filter(self.value)
+            return validate_value(model, field, self.value)
+        return validate_value(model, field, self.value, item=False)
+
+
+def is_number_field(field: ModelField) -> bool:
+    """字段的值是否为数字, 类型为 `Any` 时视为数字"""
+    if field.shape != SHAPE_SINGLETON:
+        return False
+    types = [field.type_]
+    if get_origin(field.type_) in {Union, UnionType}:
+        types = [t for t in get_args(field.type_) if t is not type(None)]
+    return all(
+        t is Any
+        or (
+            isinstance(t, type)
+            and issubclass(t, NUMBER_TYPES)
+            and not issubclass(t, bool)
+        )
+        for t in types
+    )
+
+
 class OPR:
     def __init__(self, key: Any) -> None:
         if not isinstance(key, ExpressionField):
@@ -156,6 +396,80 @@ class OPR:
         """正则匹配"""
         return Expression(self.key, Operators.REGEX, values)
 
+    def near(
+        self,
+        point: Geometry,
+        max_distance: float | None = None,
+        min_distance: float | None = None,
+    ) -> Expression:
+        """
+        按距离由近到远匹配文档, 需要字段上存在地理空间索引。
+
+        point: GeoJSON 点或 (经度, 纬度) 坐标。
+        max_distance: 最大距离, 单位为米。
+        min_distance: 最小距离, 单位为米。
+        """
+        return Expression(
+            self.key, Operators.NEAR, near_query(point, max_distance, min_distance)
+        )
+
+    def near_sphere(
+        self,
+        point: Geometry,
+        max_distance: float | None = None,
+        min_distance: float | None = None,
+    ) -> Expression:
+        """按球面距离由近到远匹配文档, 参数同 `near`"""
+        return Expression(
+            self.key,
+            Operators.NEAR_SPHERE,
+            near_query(point, max_distance, min_distance),
+        )
+
+    def geo_within(self, geometry: Geometry) -> Expression:
+        """
+        位于指定的几何图形内。
+
+        geometry: GeoJSON 多边形, 或 `{"$box": ...}`、`{"$centerSphere": ...}` 等形状操作符。
+        """
+        if isinstance(geometry, Mapping) and "type" not in geometry:
+            return Expression(self.key, Operators.GEO_WITHIN, dict(geometry))
+        return Expression(
+            self.key, Operators.GEO_WITHIN, {"$geometry": to_geometry(geometry)}
+        )
+
+    def geo_intersects(self, geometry: Geometry) -> Expression:
+        """与指定的 GeoJSON 几何图形相交"""
+        return Expression(
+            self.key, Operators.GEO_INTERSECTS, {"$geometry": to_geometry(geometry)}
+        )
+
+    @classmethod
+    def text(
+        cls,
+        search: str,
+        language: str | None = None,
+        case_sensitive: bool | None = None,
+        diacritic_sensitive: bool | None = None,
+    ) -> Expression:
+        """
+        使用集合的文本索引进行全文搜索。
+
+        search: 搜索的词语, 使用引号包含短语, 使用 `-` 排除词语。
+        language: 分词与停用词使用的语言。
+        case_sensitive: 是否区分大小写。
+        diacritic_sensitive: 是否区分变音符号。
+        """
+        options = {
+            "$language": language,
+            "$caseSensitive": case_sensitive,
+            "$diacriticSensitive": diacritic_sensitive,
+        }
+        value = {"$search": search} | {
+            k: v for k, v in options.items() if v is not None
+        }
+        return Expression(None, Operators.TEXT, value)
+
     @classmethod
     def or_(cls, *expressions: Expression | bool) -> Expression:
         merge = cls._merge(Operators.OR, expressions)
@@ -187,3 +501,113 @@ class OPR:
                 merge_expr.append(expression)
 
         return operator, merge_expr
+
+
+def to_geometry(value: Geometry) -> dict[str, Any]:
+    """将 (经度, 纬度) 坐标转换为 GeoJSON 点, GeoJSON 对象保持不变"""
+    if isinstance(value, Mapping):
+        return dict(value)
+    if is_sequence(value) and len(value) == 2:  # noqa: PLR2004
+        return {"type": "Point", "coordinates": list(value)}
+    raise TypeError("几何图形应为 GeoJSON 对象或 (经度, 纬度) 坐标")
+
+
+def near_query(
+    point: Geometry, max_distance: float | None, min_distance: float | None
+) -> dict[str, Any]:
+    query: dict[str, Any] = {"$geometry": to_geometry(point)}
+    if max_distance is not None:
+        query["$maxDistance"] = max_distance
+    if min_distance is not None:
+        query["$minDistance"] = min_distance
+    return query
+
+
+def compile_filter(*conditions: Mapping[Any, Any] | Expression) -> dict[str, Any]:
+    """将多个映射或表达式编译并合并为 MongoDB 查询过滤条件"""
+    compiled: dict[str, Any] = {}
+    for condition in conditions:
+        if isinstance(condition, Mapping):
+            condition = dict(condition)
+        elif isinstance(condition, Expression):
+            condition = condition.struct()
+        else:
+            raise TypeError("查询过滤条件不正确, 应为映射或表达式")
+        compiled |= compile_query(condition)
+    return compiled
+
+
+def compile_update(
+    model: type[BaseModel],
+    *updates: Update,
+    codec_options: bson.CodecOptions = bson.DEFAULT_CODEC_OPTIONS,
+    **values: Any,
+) -> dict[str, Any]:
+    """
+    将字段更新编译为 MongoDB 更新文档, 更新的值将使用字段类型验证。
+    `values` 为已验证的字段值, 将使用 `$set` 更新。
+    """
+    compiled: dict[str, dict[str, Any]] = {}
+    paths: set[str] = set()
+    items = [(str(UpdateOperators.SET), k, v) for k, v in values.items()]
+    items += [(str(u.operator), str(u.key), u.validate(model)) for u in updates]
+    for operator, path, value in items:
+        if any(
+            path == p or path.startswith(f"{p}.") or p.startswith(f"{path}.")
+            for p in paths
+        ):
+            raise ValueError(f"更新的字段路径存在冲突: {path}")
+        paths.add(path)
+        compiled.setdefault(operator, {})[path] = to_document(value)
+    return bson.decode(bson.encode(compiled, codec_options=codec_options))
+
+
+def to_document(value: Any) -> Any:
+    """将值中的模型转换为文档结构"""
+    if isinstance(value, BaseModel):
+        return value.dict()
+    if isinstance(value, Mapping):
+        return {k: to_document(v) for k, v in value.items()}
+    if is_sequence(value):
+        return [to_document(i) for i in value]
+    return value
+
+
+def compile_expression(value: Any) -> Any:
+    """
+    将包含字段与表达式的值编译为聚合表达式结构。
+    字段将被编译为字段路径 `$field`, 表达式将被编译为聚合操作符。
+    """
+    if isinstance(value, ExpressionField):
+        return f"${value}"
+    if isinstance(value, Expression):
+        return value.expr()
+    if isinstance(value, Mapping):
+        return {str(k): compile_expression(v) for k, v in value.items()}
+    if is_sequence(value):
+        return [compile_expression(i) for i in value]
+    return value
+
+
+def compile_query(source: Mapping[Any, Any]) -> dict[str, Any]:
+    """将包含字段与表达式的映射编译为 MongoDB 查询结构"""
+    compiled: dict[str, Any] = {}
+
+    for key, value in source.items():
+        key = str(key)
+        if isinstance(value, Expression):
+            compiled[key] = value.struct()
+        elif isinstance(value, Mapping):
+            compiled[key] = compile_query(value)
+        elif is_sequence(value):
+            compiled[key] = []
+            for i in value:
+                if isinstance(i, Expression):
+                    i = i.struct()
+                if isinstance(i, Mapping):
+                    i = compile_query(i)
+                compiled[key].append(i)
+        else:
+            compiled[key] = value
+
+    return compiled
@@ -2,12 +2,12 @@ from collections.abc import Callable, Generator, Mapping, Set
 from typing import Any, AnyStr
 
 from bson import ObjectId
-from pydantic.fields import FieldInfo as PDFieldInfo
-from pydantic.fields import Undefined
-from pydantic.typing import NoArgAnyCallable
+from pymongo.collation import Collation
 from typing_extensions import Self
 
-from mango.index import Index, IndexType
+from mango.compat import FieldInfo as PDFieldInfo
+from mango.compat import NoArgAnyCallable, Undefined
+from mango.index import Index, IndexType, PartialFilter
 
 
 class ObjectIdField(ObjectId):
@@ -32,8 +32,26 @@ class FieldInfo(PDFieldInfo):
         self.index: bool | IndexType | Index | None = kwargs.pop("index", None)
         self.expire: int | None = kwargs.pop("expire", None)
         self.unique: bool = kwargs.pop("unique", None)
+        self.sparse: bool = kwargs.pop("sparse", False)
+        self.hidden: bool = kwargs.pop("hidden", False)
+        self.partial: PartialFilter | None = kwargs.pop("partial", None)
+        self.collation: Collation | Mapping[str, Any] | None = kwargs.pop(
+            "collation", None
+        )
         super().__init__(default=default, **kwargs)
 
+    def index_options(self) -> dict[str, Any]:
+        """字段索引的选项"""
+        options = {
+            "unique": self.unique,
+            "sparse": self.sparse,
+            "hidden": self.hidden,
+            "expire": self.expire,
+            "partial": self.partial,
+            "collation": self.collation,
+        }
+        return {k: v for k, v in options.items() if v is not None and v is not False}
+
 
 def Field(
     default: Any = Undefined,
@@ -65,6 +83,10 @@ def Field(
     index: bool | IndexType | Index | None = None,
     expire: int | None = None,
     unique: bool = False,
+    sparse: bool = False,
+    hidden: bool = False,
+    partial: "PartialFilter | None" = None,
+    collation: Collation | Mapping[str, Any] | None = None,
     **extra: Any,
 ) -> Any:
     """
@@ -72,6 +94,10 @@ def Field(
     index: 索引
     expire: 到期时间, int 表示创建后多少秒后到期, datetime 表示到期时间
     unique: 唯一索引
+    sparse: 稀疏索引, 仅索引包含该字段的文档
+    hidden: 隐藏索引, 查询计划器将不会使用它
+    partial: 部分索引的过滤条件, 仅索引匹配的文档
+    collation: 索引使用的排序规则
     """
     field_info = FieldInfo(
         default,
@@ -102,6 +128,10 @@ def Field(
         index=index,
         expire=expire,
         unique=unique,
+        sparse=sparse,
+        hidden=hidden,
+        partial=partial,
+        collation=collation,
         **extra,
     )
     field_info._validate()
@@ -0,0 +1,106 @@
+from collections.abc import Mapping, Set
+from types import MappingProxyType
+from typing import Any, ClassVar, Generic, TypeVar
+
+from mango.compat import BaseModel
+
+T_Model = TypeVar("T_Model", bound=BaseModel)
+
+_views: dict[type[BaseModel], type["FrozenView[Any]"]] = {}
+
+
+class FrozenView(Generic[T_Model]):
+    """
+    模型的只读视图。
+    使用 `__slots__` 保存已验证的字段值, 不保留 pydantic 的验证状态,
+    内嵌模型转换为视图, 列表转换为元组, 字典与集合转换为只读的映射与 `frozenset`。
+    视图可以比较与哈希, 但包含映射的视图不可哈希。
+    """
+
+    __slots__ = ()
+
+    __model__: ClassVar[type[BaseModel]]
+
+    def __init__(self, **values: Any) -> None:
+        for name in self.__slots__:
+            object.__setattr__(self, name, values[name])
+
+    @classmethod
+    def from_model(cls, instance: T_Model) -> "FrozenView[T_Model]":
+        """从模型实例构建视图"""
+        return cls(**{name: freeze(getattr(instance, name)) for name in cls.__slots__})
+
+    @classmethod
+    def from_doc(cls, document: dict[str, Any]) -> "FrozenView[T_Model]":
+        """从文档构建视图, 文档将使用模型验证"""
+        return cls.from_model(cls.__model__.from_doc(document))  # type: ignore
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{self.__class__.__name__} 是只读的")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{self.__class__.__name__} 是只读的")
+
+    def __eq__(self, other: Any) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, n) == getattr(other, n) for n in self.__slots__)
+
+    def __hash__(self) -> int:
+        return hash((self.__class__, *(getattr(self, n) for n in self.__slots__)))
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{n}={getattr(self, n)!r}" for n in self.__slots__)
+        return f"{self.__class__.__name__}({values})"
+
+    def dict(self, by_alias: bool = False) -> dict[str, Any]:
+        """转换为字典, 内嵌视图与元组将还原为字典与列表"""
+        data: dict[str, Any] = {}
+        for name in self.__slots__:
+            key = self.__model__.__fields__[name].alias if by_alias else name
+            data[key] = thaw(getattr(self, name), by_alias)
+        return data
+
+    def thaw(self) -> T_Model:
+        """转换为完整的模型实例"""
+        return self.__model__.parse_obj(self.dict(by_alias=True))  # type: ignore
+
+
+def frozen_view(model: type[T_Model]) -> type[FrozenView[T_Model]]:
+    """获取模型的只读视图类, 每个模型只会生成一次"""
+    try:
+        return _views[model]
+    except KeyError:
+        view = type(
+            f"Frozen{model.__name__}",
+            (FrozenView,),
+            {"__slots__": tuple(model.__fields__), "__model__": model},
+        )
+        _views[model] = view
+        return view
+
+
+def freeze(value: Any) -> Any:
+    """将值中的模型转换为只读视图, 列表转换为元组, 字典与集合转换为只读的映射与 `frozenset`"""
+    if isinstance(value, BaseModel):
+        return frozen_view(type(value)).from_model(value)
+    if isinstance(value, list | tuple):
+        return tuple(freeze(i) for i in value)
+    if isinstance(value, Mapping):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, Set):
+        return frozenset(freeze(i) for i in value)
+    return value
+
+
+def thaw(value: Any, by_alias: bool = False) -> Any:
+    """将值中的只读视图与映射还原为字典, 元组还原为列表, `frozenset` 还原为集合"""
+    if isinstance(value, FrozenView):
+        return value.dict(by_alias)
+    if isinstance(value, tuple):
+        return [thaw(i, by_alias) for i in value]
+    if isinstance(value, Mapping):
+        return {k: thaw(v, by_alias) for k, v in value.items()}
+    if isinstance(value, Set):
+        return {thaw(i, by_alias) for i in value}
+    return value
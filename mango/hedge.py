@@ -0,0 +1,171 @@
+import asyncio
+from collections import deque
+from collections.abc import Awaitable, Callable, Hashable, Mapping
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, ClassVar, TypeVar
+
+from pymongo.read_preferences import ReadPreference
+
+if TYPE_CHECKING:  # pragma: no cover
+    from motor.motor_asyncio import AsyncIOMotorCollection
+    from pymongo.read_preferences import _ServerMode
+
+    from mango.drive import Collection
+
+T = TypeVar("T")
+
+Read = Callable[["AsyncIOMotorCollection | Collection", int | None], Awaitable[T]]
+"""读取函数, 接收集合与服务器端的最长执行毫秒数"""
+
+
+@dataclass
+class HedgeStats:
+    requests: int = 0
+    """对冲模式下的读取次数"""
+    hedged: int = 0
+    """发出对冲请求的次数"""
+    wins: int = 0
+    """对冲请求先于原请求返回的次数"""
+
+    @property
+    def hedge_rate(self) -> float:
+        """发出对冲请求的比例"""
+        return self.hedged / self.requests if self.requests else 0.0
+
+    @property
+    def win_rate(self) -> float:
+        """对冲请求获胜的比例"""
+        return self.wins / self.hedged if self.hedged else 0.0
+
+
+def query_shape(filter: Mapping[str, Any]) -> tuple[str, ...]:
+    """查询的形状, 仅包含字段与操作符, 不包含值"""
+    shape = []
+    for key, value in sorted(filter.items()):
+        if isinstance(value, Mapping) and all(str(k).startswith("$") for k in value):
+            shape.append(f"{key}:{','.join(sorted(value))}")
+        else:
+            shape.append(key)
+    return tuple(shape)
+
+
+class HedgePolicy:
+    """
+    对冲读取策略。
+    读取在延迟后仍未返回时, 使用另一个读取偏好向副本集的其他成员发出相同的请求,
+    采用先返回的结果并取消另一个请求。仅适用于幂等的读取。
+
+    取消只停止客户端的等待, 已发出的查询仍会在服务器上执行至结束,
+    因此对冲请求带有 `maxTimeMS`, 以限制其在服务器上的开销。
+    """
+
+    default: ClassVar["HedgePolicy"]
+
+    def __init__(
+        self,
+        delay_ms: float | None = None,
+        percentile: float = 0.95,
+        read_preference: "_ServerMode | None" = None,
+        max_time_ms: int | None = 1000,
+        fallback_delay_ms: float = 50,
+        window: int = 200,
+        min_samples: int = 20,
+    ) -> None:
+        """
+        delay_ms: 发出对冲请求前等待的毫秒数, 不指定则使用同一查询形状的观测延迟分位数。
+        percentile: 作为对冲延迟的延迟分位数。
+        read_preference: 对冲请求使用的读取偏好, 不指定时选择与原请求不同的成员:
+            原请求读取主节点时读取从节点, 否则读取主节点。
+            需要指定成员时, 可以使用带有标签集的读取偏好, 如 `Secondary(tag_sets=...)`。
+        max_time_ms: 对冲请求在服务器上的最长执行毫秒数, 超时的对冲请求将让位于原请求。
+        fallback_delay_ms: 观测样本不足时使用的延迟。
+        window: 每个查询形状保留的最近延迟样本数量。
+        min_samples: 使用观测延迟前需要的最少样本数量。
+        """
+        if not 0 < percentile < 1:
+            raise ValueError("percentile 应在 0 与 1 之间")
+        self.delay_ms = delay_ms
+        self.percentile = percentile
+        self.read_preference = read_preference
+        self.max_time_ms = max_time_ms
+        self.fallback_delay_ms = fallback_delay_ms
+        self.window = window
+        self.min_samples = min_samples
+        self.stats = HedgeStats()
+        self._latencies: dict[Hashable, deque[float]] = {}
+        self._background: set[asyncio.Future[Any]] = set()
+
+    def delay(self, shape: Hashable) -> float:
+        """对冲请求前等待的秒数"""
+        if self.delay_ms is not None:
+            return self.delay_ms / 1000
+        samples = self._latencies.get(shape)
+        if not samples or len(samples) < self.min_samples:
+            return self.fallback_delay_ms / 1000
+        ordered = sorted(samples)
+        return ordered[min(int(len(ordered) * self.percentile), len(ordered) - 1)]
+
+    def hedge_preference(self, collection: "Collection") -> "_ServerMode":
+        """对冲请求使用的读取偏好"""
+        if self.read_preference is not None:
+            return self.read_preference
+        if collection.read_preference == ReadPreference.PRIMARY:
+            return ReadPreference.SECONDARY
+        return ReadPreference.PRIMARY
+
+    def observe(self, shape: Hashable, latency: float) -> None:
+        """记录一次读取的延迟"""
+        if (samples := self._latencies.get(shape)) is None:
+            samples = self._latencies[shape] = deque(maxlen=self.window)
+        samples.append(latency)
+
+    async def read(self, collection: "Collection", shape: Hashable, read: Read[T]) -> T:
+        """
+        执行对冲读取。
+        对冲请求获胜时仍等待原请求结束并记录其延迟, 否则慢请求的样本将缺失, 对冲延迟会持续降低。
+        """
+        loop = asyncio.get_running_loop()
+        self.stats.requests += 1
+        start = loop.time()
+
+        def record(task: asyncio.Future[T]) -> None:
+            self._background.discard(task)
+            if not task.cancelled() and task.exception() is None:
+                self.observe(shape, loop.time() - start)
+
+        primary = asyncio.ensure_future(read(collection, None))
+        primary.add_done_callback(record)
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.delay(shape))
+            if done:
+                return primary.result()
+
+            self.stats.hedged += 1
+            hedge_collection = collection.with_options(
+                read_preference=self.hedge_preference(collection)
+            )
+            hedge = asyncio.ensure_future(read(hedge_collection, self.max_time_ms))
+            pending.add(hedge)
+            while True:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                task = next((t for t in done if t.exception() is None), None)
+                if task is None and pending:
+                    # 先返回的请求失败时, 等待另一个请求
+                    continue
+                task = task or done.pop()
+                if task is hedge:
+                    self.stats.wins += 1
+                    if primary in pending:
+                        # 原请求在后台继续执行, 结束时记录延迟
+                        pending.discard(primary)
+                        self._background.add(primary)
+                return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+HedgePolicy.default = HedgePolicy()
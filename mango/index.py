@@ -1,8 +1,12 @@
 from collections.abc import Mapping
 from enum import Enum, unique
-from typing import Any, TypeAlias
+from typing import TYPE_CHECKING, Any, TypeAlias
 
 import pymongo
+from pymongo.collation import Collation
+
+if TYPE_CHECKING:  # pragma: no cover
+    from mango.expression import Expression, ExpressionField
 
 
 class IndexEnum(Enum):
@@ -31,7 +35,9 @@ class Attr(str, IndexEnum):
 
 
 IndexType: TypeAlias = Order | Attr
-IndexTuple: TypeAlias = tuple[str, IndexType | Mapping[str, Any]]
+IndexKey: TypeAlias = "str | ExpressionField"
+IndexTuple: TypeAlias = tuple[IndexKey, IndexType | Mapping[str, Any]]
+PartialFilter: TypeAlias = "Mapping[IndexKey, Any] | Expression"
 
 
 class Index(pymongo.IndexModel):
@@ -48,25 +54,83 @@ class Index(pymongo.IndexModel):
     TEXT = Attr.TEXT
     """文本索引"""
 
+    WILDCARD = "$**"
+    """通配符索引键"""
+
     def __init__(
         self,
-        *keys: str | IndexTuple,
+        *keys: "IndexKey | IndexTuple",
         name: str | None = None,
         unique: bool = False,
         background: bool = False,
         sparse: bool = False,
+        hidden: bool = False,
+        expire: int | None = None,
+        partial: "PartialFilter | None" = None,
+        collation: Collation | Mapping[str, Any] | None = None,
+        wildcard_projection: Mapping[IndexKey, bool | int] | None = None,
         **kwargs: Any,
     ) -> None:
-        keys = tuple((k, self.ASC) if isinstance(k, str) else k for k in keys)
+        """
+        keys: 索引键, 可以是字段名、字段或 (字段, 索引类型) 元组, 多个键将组成复合索引。
+        hidden: 隐藏索引, 查询计划器将不会使用它, 但仍会被维护。
+        expire: 到期时间, 文档将在索引字段的时间之后的指定秒数到期。
+        partial: 部分索引的过滤条件, 可以是映射或表达式, 仅索引匹配的文档。
+        collation: 索引使用的排序规则。
+        wildcard_projection: 通配符索引包含或排除的字段。
+        """
+        keys = tuple(
+            (str(k[0]), k[1]) if isinstance(k, tuple) else (str(k), self.ASC)
+            for k in keys
+        )
         params = {
             "name": name,
             "unique": unique,
             "background": background,
             "sparse": sparse,
+            "hidden": hidden,
+            "collation": collation,
         }
         params = {k: v for k, v in params.items() if v}
+        if expire is not None:
+            params["expireAfterSeconds"] = expire
+        if partial is not None:
+            params["partialFilterExpression"] = compile_partial(partial)
+        if wildcard_projection is not None:
+            params["wildcardProjection"] = {
+                str(k): v for k, v in wildcard_projection.items()
+            }
         super().__init__(
             keys,
             **params,
             **kwargs,
         )
+
+    @classmethod
+    def wildcard(
+        cls,
+        path: "IndexKey | None" = None,
+        *,
+        projection: Mapping[IndexKey, bool | int] | None = None,
+        **kwargs: Any,
+    ) -> "Index":
+        """
+        创建通配符索引。
+
+        path: 索引指定字段下的全部子字段, 不指定则索引文档的全部字段。
+        projection: 包含或排除的字段, 仅在不指定 `path` 时可用。
+        """
+        if path is not None and projection is not None:
+            raise ValueError("指定字段的通配符索引不能设置 projection")
+        key = f"{path}.{cls.WILDCARD}" if path is not None else cls.WILDCARD
+        return cls(key, wildcard_projection=projection, **kwargs)
+
+
+def compile_partial(partial: PartialFilter) -> dict[str, Any]:
+    """将部分索引的过滤条件编译为 MongoDB 查询结构"""
+    # 表达式模块依赖于此模块, 需要延迟导入
+    from mango.expression import Expression, compile_query
+
+    if isinstance(partial, Expression):
+        partial = partial.struct()
+    return compile_query(partial)
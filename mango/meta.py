@@ -1,17 +1,124 @@
 from collections.abc import Sequence
-from typing import Any, ClassVar
+from dataclasses import dataclass
+from typing import Any, ClassVar, Literal
 
 from mango.drive import Database
 from mango.encoder import EncodeType
 from mango.index import Index, IndexTuple
 
 
+@dataclass(frozen=True)
+class TimeSeries:
+    """时序集合选项"""
+
+    time_field: str
+    """保存时间的字段, 值必须为日期时间"""
+    meta_field: str | None = None
+    """保存元数据的字段, 元数据相同的文档将被分到同一个桶中"""
+    granularity: Literal["seconds", "minutes", "hours"] | None = None
+    """相邻测量值的时间间隔粒度"""
+    expire: int | None = None
+    """到期时间, 文档将在时间字段之后的指定秒数被删除"""
+
+    def options(self) -> dict[str, Any]:
+        """创建集合的选项"""
+        timeseries = {"timeField": self.time_field}
+        if self.meta_field:
+            timeseries["metaField"] = self.meta_field
+        if self.granularity:
+            timeseries["granularity"] = self.granularity
+        options: dict[str, Any] = {"timeseries": timeseries}
+        if self.expire is not None:
+            options["expireAfterSeconds"] = self.expire
+        return options
+
+
+@dataclass(frozen=True)
+class Capped:
+    """固定集合选项, 集合写满后将按插入顺序覆盖最旧的文档"""
+
+    size: int
+    """集合的最大字节数"""
+    max: int | None = None
+    """集合的最大文档数量"""
+
+    def options(self) -> dict[str, Any]:
+        """创建集合的选项"""
+        options: dict[str, Any] = {"capped": True, "size": self.size}
+        if self.max is not None:
+            options["max"] = self.max
+        return options
+
+
+@dataclass(frozen=True)
+class Storage:
+    """WiredTiger 存储选项"""
+
+    block_compressor: Literal["none", "snappy", "zlib", "zstd"] | None = None
+    """集合数据的块压缩算法"""
+    prefix_compression: bool | None = None
+    """集合索引是否使用前缀压缩"""
+
+    def options(self) -> dict[str, Any]:
+        """创建集合的选项"""
+        options: dict[str, Any] = {}
+        if self.block_compressor:
+            options["storageEngine"] = wired_tiger(
+                block_compressor=self.block_compressor
+            )
+        if self.prefix_compression is not None:
+            options["indexOptionDefaults"] = {
+                "storageEngine": wired_tiger(
+                    prefix_compression=str(self.prefix_compression).lower()
+                )
+            }
+        return options
+
+
+def wired_tiger(**config: str) -> dict[str, Any]:
+    return {
+        "wiredTiger": {"configString": ",".join(f"{k}={v}" for k, v in config.items())}
+    }
+
+
 class MetaConfig:
     name: ClassVar[str | None] = None
     database: ClassVar[Database | str | None] = None
     indexes: ClassVar[Sequence[str | Index | Sequence[IndexTuple]]] = []
     bson_encoders: ClassVar[EncodeType] = {}
     by_alias: ClassVar[bool] = False
+    version_field: ClassVar[str] = "_v"
+    migrate_on_read: ClassVar[bool] = False
+    timeseries: ClassVar[TimeSeries | None] = None
+    clustered: ClassVar[bool] = False
+    capped: ClassVar[Capped | None] = None
+    storage: ClassVar[Storage | None] = None
+    shard_key: ClassVar[Sequence[str]] = []
+
+
+def collection_options(meta: type[MetaConfig]) -> dict[str, Any]:
+    """模型声明的创建集合的选项"""
+    kinds = [
+        kind
+        for kind, declared in (
+            ("timeseries", meta.timeseries),
+            ("clustered", meta.clustered),
+            ("capped", meta.capped),
+        )
+        if declared
+    ]
+    if len(kinds) > 1:
+        raise ValueError(f"集合选项 {', '.join(kinds)} 不能同时使用")
+    options: dict[str, Any] = {}
+    if meta.timeseries:
+        options |= meta.timeseries.options()
+    if meta.clustered:
+        options["clusteredIndex"] = {"key": {"_id": 1}, "unique": True}
+    if meta.capped:
+        options |= meta.capped.options()
+    if meta.storage:
+        options |= meta.storage.options()
+    return options
 
 
 def inherit_meta(
@@ -19,6 +126,10 @@ def inherit_meta(
     parent_config: type[MetaConfig],
     **namespace: Any,
 ) -> type[MetaConfig]:
+    if not namespace and (not self_config or issubclass(self_config, parent_config)):
+        # 没有新的配置时直接复用, 避免为每个模型创建新的类
+        return self_config or parent_config
+
     if not self_config:
         base_classes = (parent_config,)
     elif self_config == parent_config:
@@ -0,0 +1,135 @@
+import asyncio
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, TypeAlias
+
+from pymongo import ReplaceOne
+
+from mango.cache import invalidate
+
+if TYPE_CHECKING:  # pragma: no cover
+    from mango.models import Document
+
+Migration: TypeAlias = Callable[[dict[str, Any]], dict[str, Any]]
+
+_migrations: dict[type["Document"], dict[int, Migration]] = {}
+
+
+def register(model: type["Document"], version: int, migration: Migration) -> None:
+    """注册模型的迁移函数"""
+    if version < 1:
+        raise ValueError("迁移版本必须大于 0")
+    migrations = _migrations.setdefault(model, {})
+    if version in migrations:
+        raise ValueError(f"{model.__name__} 已存在版本 {version} 的迁移")
+    migrations[version] = migration
+    _migrations[model] = dict(sorted(migrations.items()))
+
+
+def migrations_of(model: type["Document"]) -> dict[int, Migration]:
+    """模型已注册的迁移, 按版本升序排列"""
+    return _migrations.get(model, {})
+
+
+def schema_version(model: type["Document"]) -> int:
+    """模型当前的结构版本, 即已注册的最高迁移版本, 未注册迁移时为 0"""
+    return next(reversed(migrations_of(model)), 0)
+
+
+def document_version(model: type["Document"], document: dict[str, Any]) -> int:
+    return document.get(model.__meta__.version_field, 0)
+
+
+def migrate_document(
+    model: type["Document"], document: dict[str, Any]
+) -> dict[str, Any]:
+    """依次应用文档版本之后的迁移, 并标记为当前版本"""
+    version = document_version(model, document)
+    for target, migration in migrations_of(model).items():
+        if target > version:
+            document = migration(document)
+            document[model.__meta__.version_field] = target
+    return document
+
+
+@dataclass
+class MigrationReport:
+    scanned: int = 0
+    """读取的文档数量"""
+    migrated: int = 0
+    """已迁移的文档数量"""
+    skipped: int = 0
+    """迁移期间被其他写入修改而跳过的文档数量"""
+    last_id: Any = None
+    """最后处理的文档主键, 可以用于从该位置继续"""
+
+
+class MigrationRunner:
+    """
+    在线批量迁移。
+    按 `_id` 顺序读取版本低于当前版本的文档, 不经过模型验证直接转换原始文档,
+    并以无序的 `bulk_write` 批次写回。已迁移的文档会被标记版本, 中断后重新运行将从剩余的文档继续。
+    写回仅在文档与读取时完全相同时进行, 期间被其他写入修改的文档将被跳过, 在下次运行时迁移。
+    """
+
+    def __init__(
+        self,
+        model: type["Document"],
+        batch_size: int = 500,
+        max_rate: float | None = None,
+        after: Any = None,
+    ) -> None:
+        """
+        batch_size: 每批次读取与写入的文档数量。
+        max_rate: 每秒最多迁移的文档数量, 用于限制对线上服务的影响。
+        after: 仅迁移主键大于该值的文档。
+        """
+        self.model = model
+        self.batch_size = batch_size
+        self.max_rate = max_rate
+        self.report = MigrationReport(last_id=after)
+
+    @property
+    def filter(self) -> dict[str, Any]:
+        """需要迁移的文档的过滤条件"""
+        field = self.model.__meta__.version_field
+        filter: dict[str, Any] = {field: {"$not": {"$gte": schema_version(self.model)}}}
+        if self.report.last_id is not None:
+            filter["_id"] = {"$gt": self.report.last_id}
+        return filter
+
+    async def run(self) -> MigrationReport:
+        """运行迁移直到没有需要迁移的文档"""
+        if not schema_version(self.model):
+            return self.report
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        collection = self.model.__collection__
+        shard_key = self.model.__shard_key__
+        while documents := await collection.find(
+            self.filter, sort=[("_id", 1)], limit=self.batch_size
+        ).to_list(length=None):
+            operations = [
+                ReplaceOne(
+                    {
+                        "_id": document["_id"],
+                        **{path: document.get(path) for path in shard_key},
+                        # 仅当文档与读取时完全相同时替换, 任何并发写入都会使其被跳过
+                        "$expr": {"$eq": ["$$ROOT", {"$literal": document}]},
+                    },
+                    migrate_document(self.model, dict(document)),
+                )
+                for document in documents
+            ]
+            try:
+                result = await collection.bulk_write(operations, ordered=False)
+            finally:
+                invalidate(self.model)
+            self.report.scanned += len(documents)
+            self.report.migrated += result.modified_count
+            self.report.skipped += len(documents) - result.matched_count
+            self.report.last_id = documents[-1]["_id"]
+            if self.max_rate:
+                expected = self.report.scanned / self.max_rate
+                await asyncio.sleep(max(expected - (loop.time() - start), 0))
+        return self.report
@@ -1,31 +1,62 @@
 import contextlib
-from collections.abc import Mapping, MutableMapping, Sequence
+from collections.abc import Callable, Iterable, Mapping, MutableMapping, Sequence
 from functools import reduce
 from typing import TYPE_CHECKING, Any, ClassVar
 
 import bson
 from bson import ObjectId
-from pydantic import BaseModel
-from pydantic.main import ModelMetaclass
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from typing_extensions import Self, dataclass_transform
 
+from mango.cache import invalidate
+from mango.compat import BaseModel, ModelMetaclass, ValidationError
 from mango.encoder import Encoder
-from mango.expression import Expression, ExpressionField, Operators
+from mango.expression import (
+    SEARCH_OPERATORS,
+    Expression,
+    ExpressionField,
+    Operators,
+    Update,
+    compile_update,
+)
 from mango.fields import Field, FieldInfo, ObjectIdField
+from mango.frozen import FrozenView, frozen_view
+from mango.hedge import HedgePolicy
 from mango.meta import MetaConfig, inherit_meta
-from mango.result import AggregateResult, FindMapping, FindResult
+from mango.migration import (
+    Migration,
+    MigrationReport,
+    MigrationRunner,
+    migrate_document,
+    register,
+    schema_version,
+)
+from mango.optimizer import overlaps
+from mango.result import AggregateResult, FindMapping, FindResult, KeyField
 from mango.source import Mango
 from mango.stage import Pipeline
-from mango.utils import add_fields, all_check, validate_fields
-
-if TYPE_CHECKING:
+from mango.stream import ChangeStream
+from mango.transfer import (
+    DEFAULT_BATCH_SIZE,
+    StrPath,
+    TransferFormat,
+    export_model,
+    import_model,
+)
+from mango.utils import add_fields, all_check, get_path, validate_fields
+from mango.writer import BufferedWriter
+
+if TYPE_CHECKING:  # pragma: no cover
     from bson.codec_options import CodecOptions
-    from pydantic.fields import ModelField
     from pymongo.results import DeleteResult, UpdateResult
 
+    from mango.compat import ModelField
     from mango.drive import Collection, Database
 
-operators = tuple(str(i) for i in Operators)
+operators = tuple(str(i) for i in Operators if i not in SEARCH_OPERATORS)
+
+DUPLICATE_KEY_ERROR = 11000
 
 
 def is_need_default_pk(
@@ -44,7 +75,9 @@ def is_need_default_pk(
 
 
 def set_default_pk(model: type["Document"]) -> None:
-    value = Field(default_factory=ObjectId, allow_mutation=False, init=False)
+    value = Field(
+        default_factory=ObjectId, allow_mutation=False, init=False, primary_key=True
+    )
     add_fields(model, id=(ObjectIdField, value))
     model.__primary_key__ = "id"
 
@@ -52,8 +85,9 @@ def set_default_pk(model: type["Document"]) -> None:
 def flat_filter(data: Mapping[str, Any]) -> dict[str, Any]:
     flatted = {}
     for key, value in data.items():
-        if key.startswith(operators):
-            flatted |= flat_filter(reduce(lambda x, y: x | y, value))
+        if key.startswith("$"):
+            if key.startswith(operators) and isinstance(value, list):
+                flatted |= flat_filter(reduce(lambda x, y: x | y, value))
         elif "." in key:
             parent, child = key.split(".", maxsplit=1)
             flatted[parent] = flat_filter({child: value})
@@ -73,6 +107,24 @@ def merge_map(data: MutableMapping[Any, Any], into: Mapping[Any, Any]) -> None:
             data[k] = v
 
 
+def expression_field(model: type[BaseModel], name: str) -> ExpressionField:
+    """
+    通过类属性访问字段的查询表达式。
+    表达式在首次访问时创建并缓存在模型自身, 子类不会取得父类字段的表达式。
+    """
+    namespace = vars(model)
+    fields = namespace.get("__fields__", {})
+    if name.startswith("__") or (field := fields.get(name)) is None:
+        raise AttributeError(
+            f"type object {model.__name__!r} has no attribute {name!r}"
+        )
+    expressions = namespace.get("__expressions__", {})
+    if (expression := expressions.get(name)) is None:
+        by_alias = getattr(namespace.get("__meta__"), "by_alias", False)
+        expression = expressions[name] = ExpressionField.of(field, by_alias)
+    return expression
+
+
 @dataclass_transform(kw_only_default=True, field_specifiers=(Field, FieldInfo))
 class MetaDocument(ModelMetaclass):
     def __new__(
@@ -88,7 +140,8 @@ class MetaDocument(ModelMetaclass):
             if base != BaseModel and issubclass(base, Document):
                 meta = inherit_meta(base.__meta__, MetaConfig)
 
-        kwargs.setdefault("database", kwargs.pop("db", None))
+        if (db := kwargs.pop("db", None)) is not None:
+            kwargs.setdefault("database", db)
 
         allowed_meta_kwargs = {
             key
@@ -104,11 +157,11 @@ class MetaDocument(ModelMetaclass):
 
         scls = super().__new__(cls, cname, bases, attrs, **kwargs)
 
-        # 由于此处代码使用了 setattr，导致子类重写父类的字段时会引发错误，暂无解决办法
+        # 由于字段的查询表达式可以通过类属性访问，导致子类重写父类的字段时会引发错误，暂无解决办法
         # NameError: Field name "xxx" shadows a BaseModel attribute;
         # use a different field name with "alias='xxx'".
+        scls.__expressions__ = {}
         for fname, field in scls.__fields__.items():
-            setattr(scls, fname, ExpressionField(field, []))
             if isinstance(finfo := field.field_info, FieldInfo) and finfo.primary_key:
                 pk = finfo.alias or fname
                 if getattr(scls, "__primary_key__", pk) != pk:
@@ -121,10 +174,21 @@ class MetaDocument(ModelMetaclass):
         ):
             set_default_pk(scls)
 
+        shard_key = []
+        for fname in scls.__meta__.shard_key:
+            if (field := scls.__fields__.get(fname)) is None:
+                raise ValueError(f"分片键 {fname} 不是 {cname} 的字段")
+            field.field_info.allow_mutation = False
+            shard_key.append(str(getattr(scls, fname)))
+        scls.__shard_key__ = tuple(shard_key)
+
         Mango.register_model(scls)
 
         return scls
 
+    def __getattr__(cls, name: str) -> Any:
+        return expression_field(cls, name)
+
 
 @dataclass_transform(kw_only_default=True, field_specifiers=(Field, FieldInfo))
 class MetaEmbeddedDocument(ModelMetaclass):
@@ -136,12 +200,15 @@ class MetaEmbeddedDocument(ModelMetaclass):
         **kwargs: Any,
     ) -> Any:
         scls = super().__new__(cls, name, bases, attrs, **kwargs)
-        for fname, field in scls.__fields__.items():
-            setattr(scls, fname, ExpressionField(field, []))
+        scls.__expressions__ = {}
+        for field in scls.__fields__.values():
             if isinstance(finfo := field.field_info, FieldInfo) and finfo.primary_key:
                 raise ValueError("内嵌文档不可设置主键")
         return scls
 
+    def __getattr__(cls, name: str) -> Any:
+        return expression_field(cls, name)
+
 
 class Document(BaseModel, metaclass=MetaDocument):
     if TYPE_CHECKING:  # pragma: no cover
@@ -151,6 +218,8 @@ class Document(BaseModel, metaclass=MetaDocument):
         __encoder__: ClassVar[CodecOptions]
         __collection__: ClassVar[Collection]
         __primary_key__: ClassVar[str]
+        __shard_key__: ClassVar[tuple[str, ...]]
+        __expressions__: ClassVar[dict[str, ExpressionField]]
 
         def __init_subclass__(
             cls,
@@ -171,22 +240,62 @@ class Document(BaseModel, metaclass=MetaDocument):
     async def insert(self) -> Self:
         """插入文档"""
         await self.__collection__.insert_one(self.doc())
+        invalidate(self.__class__)
         return self
 
-    async def update(self, **kwargs: Any) -> bool:
-        """更新文档"""
+    async def update(self, *updates: Update, **kwargs: Any) -> bool:
+        """
+        更新文档。
+
+        updates: 字段更新操作, 如 `Model.views.inc(1)`, 将在服务器上原子地执行,
+        并使用更新后的文档刷新当前实例。
+        kwargs: 需要设置的字段值。
+        """
+        if updates:
+            values = (
+                validate_fields(self.__class__, kwargs, self.__dict__) if kwargs else {}
+            )
+            paths = [str(u.key) for u in updates]
+            paths += [str(getattr(self.__class__, name)) for name in values]
+            if immutable := [
+                path
+                for path in paths
+                if any(overlaps(path, key) for key in ("_id", *self.__shard_key__))
+            ]:
+                raise ValueError(f"主键与分片键不可修改: {immutable[0]}")
+            update = compile_update(
+                self.__class__, *updates, codec_options=self.__encoder__, **values
+            )
+            document = await self.__collection__.find_one_and_update(
+                self._key_filter(), update, return_document=ReturnDocument.AFTER
+            )
+            invalidate(self.__class__)
+            if document is None:
+                return False
+            self.__dict__.update(self.from_doc(document).__dict__)
+            return True
         if kwargs:
-            values = validate_fields(self.__class__, kwargs)
+            values = validate_fields(self.__class__, kwargs, self.__dict__)
             for field, value in values.items():
                 setattr(self, field, value)
+        immutable = {self.__primary_key__, *self.__meta__.shard_key}
+        document = self.doc(exclude=immutable)
+        # 部分更新不会迁移文档中的其他字段, 不能标记为当前版本
+        document.pop(self.__meta__.version_field, None)
         result: UpdateResult = await self.__collection__.update_one(
-            {"_id": self.pk}, {"$set": self.doc(exclude={self.__primary_key__})}
+            self._key_filter(), {"$set": document}
         )
+        invalidate(self.__class__)
         return bool(result.modified_count)
 
     async def save(self, **kwargs: Any) -> Self:
-        """保存文档，如果文档不存在，则插入，否则更新它。"""
-        existing_doc = await self.__collection__.find_one({"_id": self.pk})
+        """
+        保存文档，如果文档不存在，则插入，否则更新它。
+        时序集合中的测量值不可按主键更新, 将总是插入。
+        """
+        if self.__meta__.timeseries:
+            return await self.insert()
+        existing_doc = await self.__collection__.find_one(self._key_filter())
         if existing_doc:
             await self.update(**kwargs)
         else:
@@ -195,9 +304,26 @@ class Document(BaseModel, metaclass=MetaDocument):
 
     async def delete(self) -> bool:
         """删除文档"""
-        result: DeleteResult = await self.__collection__.delete_one({"_id": self.pk})
+        result: DeleteResult = await self.__collection__.delete_one(self._key_filter())
+        invalidate(self.__class__)
         return bool(result.deleted_count)
 
+    def _key_filter(self) -> dict[str, Any]:
+        """定位文档的过滤条件, 包含主键与分片键, 使写入仅路由到文档所在的分片"""
+        filter = {"_id": self.pk}
+        if shard_key := self.__meta__.shard_key:
+            data = self.dict(include=set(shard_key))
+            values = {
+                path: data[fname]
+                for fname, path in zip(shard_key, self.__shard_key__, strict=True)
+            }
+            filter |= bson.decode(bson.encode(values, codec_options=self.__encoder__))
+        return filter
+
+    def freeze(self) -> FrozenView[Self]:
+        """转换为只读的紧凑视图, 使用 `thaw` 可以还原为模型"""
+        return frozen_view(self.__class__).from_model(self)
+
     def doc(self, **kwargs: Any) -> dict[str, Any]:
         """转换为 MongoDB 文档"""
         kwargs["by_alias"] = self.__meta__.by_alias
@@ -206,27 +332,130 @@ class Document(BaseModel, metaclass=MetaDocument):
         exclude = kwargs.get("exclude")
         if not (exclude and pk in exclude):
             data["_id"] = data.pop(pk)
+        if version := schema_version(self.__class__):
+            data[self.__meta__.version_field] = version
         return bson.decode(bson.encode(data, codec_options=self.__encoder__))
 
     @classmethod
     def from_doc(cls, document: dict[str, Any]) -> Self:
-        """从文档构建模型实例"""
+        """从文档构建模型实例, 启用 `migrate_on_read` 时将先迁移旧版本的文档"""
+        if cls.__meta__.migrate_on_read:
+            document = migrate_document(cls, document)
         with contextlib.suppress(KeyError):
             document[cls.__primary_key__] = document.pop("_id")
         return cls(**document)
 
     @classmethod
     async def save_all(cls, *documents: Self) -> None:
-        """保存全部文档"""
-        await cls.__collection__.insert_many(doc.doc() for doc in documents)
+        """保存全部文档, 时序集合使用无序插入, 以便服务器按桶合并写入"""
+        try:
+            await cls.__collection__.insert_many(
+                (doc.doc() for doc in documents),
+                ordered=cls.__meta__.timeseries is None,
+            )
+        finally:
+            invalidate(cls)
+
+    @classmethod
+    def migration(cls, version: int) -> Callable[[Migration], Migration]:
+        """
+        注册迁移函数的装饰器。
+        迁移函数接收原始文档并返回迁移后的文档, 版本号从 1 开始递增,
+        模型的当前版本为最高的迁移版本, 写入的文档将被标记该版本。
+        """
+
+        def decorator(migration: Migration) -> Migration:
+            register(cls, version, migration)
+            return migration
+
+        return decorator
+
+    @classmethod
+    async def migrate(
+        cls, batch_size: int = 500, max_rate: float | None = None, after: Any = None
+    ) -> MigrationReport:
+        """
+        迁移版本低于当前版本的文档, 返回迁移报告。
+
+        batch_size: 每批次读取与写入的文档数量。
+        max_rate: 每秒最多迁移的文档数量。
+        after: 仅迁移主键大于该值的文档, 可以传入上次报告的 `last_id` 继续。
+        """
+        return await MigrationRunner(cls, batch_size, max_rate, after).run()
+
+    @classmethod
+    def writer(
+        cls,
+        max_batch: int = 1000,
+        max_delay_ms: float = 50,
+        max_queue: int = 10000,
+    ) -> BufferedWriter[Self]:
+        """
+        创建后台批量插入文档的写入器, 适用于高频插入。
+
+        max_batch: 每批次最多写入的文档数量。
+        max_delay_ms: 第一个文档进入批次后最多等待的毫秒数。
+        max_queue: 队列的最大长度, 队列已满时插入将等待。
+        """
+        return BufferedWriter(cls, max_batch, max_delay_ms, max_queue)
+
+    @classmethod
+    async def export(
+        cls,
+        path: StrPath,
+        *filter: FindMapping | Expression,
+        format: TransferFormat | None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> int:
+        """
+        将符合条件的文档导出到文件, 返回导出的文档数量。
+        文档以原始 BSON 按批次写入, 不会构建模型实例。
+
+        format: `bson` 为连续存放的 BSON 文档, 与 mongodump 兼容; `jsonl` 为每行一个扩展 JSON 文档。
+        未指定时根据文件扩展名推断。
+        """
+        return await export_model(
+            cls, path, *filter, format=format, batch_size=batch_size
+        )
+
+    @classmethod
+    async def import_(
+        cls,
+        path: StrPath,
+        format: TransferFormat | None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        validate: bool = False,
+        workers: int | None = None,
+    ) -> int:
+        """
+        将文件中的文档导入集合, 返回导入的文档数量。
+        文件通过内存映射读取, 文档按批次使用无序的 `insert_many` 写入。
+
+        validate: 写入前使用模型验证每个批次, 存在无效文档时引发异常, 此前的批次已写入。
+        workers: 读取与验证使用的线程数量, 默认为 CPU 核心数。
+        """
+        return await import_model(
+            cls,
+            path,
+            format=format,
+            batch_size=batch_size,
+            validate=validate,
+            workers=workers,
+        )
+
+    @classmethod
+    async def estimated_count(cls) -> int:
+        """使用集合元数据获取文档总数的估计值, 无需扫描文档"""
+        return await cls.__collection__.estimated_document_count()
 
     @classmethod
     def aggregate(
         cls, pipeline: Pipeline | Sequence[Mapping[str, Any]], *args: Any, **kwargs: Any
-    ) -> AggregateResult:
+    ) -> AggregateResult[dict[str, Any]]:
         """聚合查询"""
-        cursor = cls.__collection__.aggregate(pipeline, *args, **kwargs)
-        return AggregateResult(cursor)
+        if isinstance(pipeline, Pipeline):
+            pipeline = pipeline.compile(cls.__encoder__)
+        return AggregateResult(cls.__collection__, pipeline, *args, **kwargs)
 
     @classmethod
     def find(
@@ -239,9 +468,33 @@ class Document(BaseModel, metaclass=MetaDocument):
         raise TypeError("查询表达式类型不正确")
 
     @classmethod
-    async def get(cls, _id: Any) -> Self | None:
-        """通过主键查询文档"""
-        return await cls.find({"_id": _id}).get()
+    def watch(
+        cls,
+        *args: FindMapping | Expression | bool,
+        **kwargs: Any,
+    ) -> ChangeStream[Self]:
+        """监听集合的变更, 可使用表达式过滤变更后的完整文档"""
+        if all_check(args, Expression | Mapping):
+            return ChangeStream(cls, *args, **kwargs)  # type: ignore
+        raise TypeError("查询表达式类型不正确")
+
+    @classmethod
+    async def get(
+        cls,
+        _id: Any,
+        hedge: HedgePolicy | bool = False,
+        shard_key: FindMapping | None = None,
+    ) -> Self | None:
+        """
+        通过主键查询文档。
+
+        hedge: 启用对冲读取, 可以是对冲策略, 为 `True` 时使用共享的默认策略。
+        shard_key: 文档的分片键的值, 指定后查询仅路由到文档所在的分片。
+        """
+        result = cls.find({"_id": _id}, shard_key or {})
+        if hedge:
+            result.hedge(None if hedge is True else hedge)
+        return await result.get()
 
     @classmethod
     async def get_or_create(
@@ -249,20 +502,114 @@ class Document(BaseModel, metaclass=MetaDocument):
         *args: FindMapping | Expression | bool,
         defaults: FindMapping | Self | None = None,
     ) -> Self:
-        """获取文档, 如果不存在, 则创建"""
+        """
+        获取文档, 如果不存在, 则创建。
+        查询与创建在一次 `find_one_and_update` 的 upsert 中原子地完成。
+        过滤条件与 `defaults` 不能构成有效的文档时, 仅查询已存在的文档。
+        """
+        cls._check_upsert()
         result: FindResult[Self] = FindResult(cls, *args)  # type: ignore
-        if model := await result.get():
-            return model
+        filter = result.filter
+        cls._shard_filter(flat_filter(filter))
+        try:
+            candidate = cls._candidate(flat_filter(filter), defaults)
+        except ValidationError:
+            if model := await result.get():
+                return model
+            raise
+        try:
+            document = await cls.__collection__.find_one_and_update(
+                filter,
+                {"$setOnInsert": candidate},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            invalidate(cls)
+        except DuplicateKeyError:
+            # 并发的 upsert 已创建了该文档
+            if model := await result.get():
+                return model
+            raise
+        return cls.from_doc(document)
+
+    @classmethod
+    async def get_or_create_many(
+        cls,
+        key: KeyField,
+        values: Iterable[Any],
+        defaults: FindMapping | Self | None = None,
+    ) -> list[Self]:
+        """
+        批量获取字段值为指定值的文档, 不存在的文档将被创建。
+        使用一次 `$in` 查询与一次批量 upsert 完成, 返回的文档与值的顺序一致。
+        声明了分片键时, 新文档的分片键取自 `defaults` 或字段默认值, 并包含在 upsert 的过滤条件中。
+        """
+        cls._check_upsert()
+        path = str(key)
+        if path == cls.__primary_key__:
+            path = "_id"
+        values = list(dict.fromkeys(values))
+        found = {
+            get_path(document, path): document
+            async for document in cls.__collection__.find({path: {"$in": values}})
+        }
+        if missing := [v for v in values if v not in found]:
+            candidates = [
+                cls._candidate(flat_filter({path: {"$eq": v}}), defaults)
+                for v in missing
+            ]
+            operations = [
+                UpdateOne(
+                    {path: v} | cls._shard_filter(c), {"$setOnInsert": c}, upsert=True
+                )
+                for v, c in zip(missing, candidates, strict=True)
+            ]
+            try:
+                result = await cls.__collection__.bulk_write(operations, ordered=False)
+                upserted = result.upserted_ids
+            except BulkWriteError as e:
+                errors = e.details["writeErrors"]
+                if any(error["code"] != DUPLICATE_KEY_ERROR for error in errors):
+                    raise
+                upserted = {u["index"]: u["_id"] for u in e.details["upserted"]}
+            finally:
+                invalidate(cls)
+            found |= {missing[i]: candidates[i] for i in upserted}
+            if raced := [v for i, v in enumerate(missing) if i not in upserted]:
+                # 并发的 upsert 已创建了这些文档
+                async for document in cls.__collection__.find({path: {"$in": raced}}):
+                    found[get_path(document, path)] = document
+        return [cls.from_doc(dict(found[v])) for v in values if v in found]
+
+    @classmethod
+    def _shard_filter(cls, data: Mapping[str, Any]) -> dict[str, Any]:
+        """从文档数据中取出分片键的值, 缺少分片键时引发异常"""
+        if missing := [path for path in cls.__shard_key__ if path not in data]:
+            raise ValueError(f"upsert 的过滤条件缺少分片键: {', '.join(missing)}")
+        return {path: data[path] for path in cls.__shard_key__}
+
+    @classmethod
+    def _check_upsert(cls) -> None:
+        if cls.__meta__.timeseries:
+            raise TypeError(f"{cls.__name__} 是时序集合模型, 不支持 upsert")
+
+    @classmethod
+    def _candidate(
+        cls, data: dict[str, Any], defaults: FindMapping | Self | None
+    ) -> dict[str, Any]:
+        """构建待插入的文档, 仅验证一次"""
         default = defaults.doc() if isinstance(defaults, Document) else defaults or {}
-        data = flat_filter(result.filter)
         merge_map(data, default)
-        model = cls.from_doc(data)
-        return await model.save()
+        return cls.from_doc(data).doc()
 
     class Config:
         validate_assignment = True
 
 
 class EmbeddedDocument(BaseModel, metaclass=MetaEmbeddedDocument):
+    def freeze(self) -> FrozenView[Self]:
+        """转换为只读的紧凑视图, 使用 `thaw` 可以还原为模型"""
+        return frozen_view(self.__class__).from_model(self)
+
     class Config:
         validate_assignment = True
@@ -0,0 +1,318 @@
+import difflib
+from collections.abc import Callable, Iterable, Mapping, Sequence
+from dataclasses import dataclass, field
+from typing import Any, TypeAlias
+
+from bson import json_util
+
+Stage: TypeAlias = Mapping[str, Any]
+
+Rule: TypeAlias = Callable[[list[Stage], int], str | None]
+
+BARRIER_OPERATORS = {"$expr", "$where", "$text", "$jsonSchema", "$comment"}
+"""包含这些操作符的 `$match` 不参与重排"""
+
+ONE_TO_ONE_STAGES = {
+    "$set",
+    "$addFields",
+    "$project",
+    "$unset",
+    "$lookup",
+    "$replaceWith",
+    "$replaceRoot",
+}
+"""每个输入文档恰好输出一个文档的阶段, `$limit` 与 `$skip` 可以越过它们"""
+
+MAX_PASSES = 100
+
+
+@dataclass
+class OptimizeReport:
+    before: list[Stage]
+    after: list[Stage] = field(default_factory=list)
+    changes: list[str] = field(default_factory=list)
+    """已应用的优化"""
+
+    def diff(self) -> str:
+        """优化前后管道的差异"""
+        return "\n".join(
+            difflib.unified_diff(
+                [dump_stage(s) for s in self.before],
+                [dump_stage(s) for s in self.after],
+                "before",
+                "after",
+                lineterm="",
+            )
+        )
+
+    def __str__(self) -> str:
+        if not self.changes:
+            return "管道无需优化"
+        changes = "\n".join(f"- {change}" for change in self.changes)
+        return f"{changes}\n{self.diff()}"
+
+
+def dump_stage(stage: Stage) -> str:
+    return json_util.dumps(stage, default=str)
+
+
+def stage_name(stage: Stage) -> str:
+    return next(iter(stage))
+
+
+def stage_value(stage: Stage) -> Any:
+    return stage[stage_name(stage)]
+
+
+def overlaps(path: str, other: str) -> bool:
+    """两个字段路径是否存在包含关系"""
+    return path == other or path.startswith(f"{other}.") or other.startswith(f"{path}.")
+
+
+def is_literal_flag(value: Any) -> bool:
+    return isinstance(value, bool | int) and not isinstance(value, float)
+
+
+def match_fields(query: Mapping[str, Any]) -> set[str] | None:
+    """`$match` 引用的字段, 如果无法确定则返回 `None`"""
+    fields: set[str] = set()
+    for key, value in query.items():
+        if key in BARRIER_OPERATORS:
+            return None
+        if key in {"$and", "$or", "$nor"}:
+            for sub in value:
+                if (sub_fields := match_fields(sub)) is None:
+                    return None
+                fields |= sub_fields
+        elif key.startswith("$"):
+            return None
+        else:
+            fields.add(key)
+    return fields
+
+
+def referenced_fields(value: Any) -> set[str] | None:
+    """聚合表达式中引用的字段路径, 如果引用了整个文档则返回 `None`"""
+    if isinstance(value, str):
+        if value.startswith("$$"):
+            return None if value.split(".")[0] in {"$$ROOT", "$$CURRENT"} else set()
+        return {value[1:]} if value.startswith("$") else set()
+    if isinstance(value, Mapping):
+        value = value.values()
+    elif not isinstance(value, list | tuple):
+        return set()
+    fields: set[str] = set()
+    for item in value:
+        if (item_fields := referenced_fields(item)) is None:
+            return None
+        fields |= item_fields
+    return fields
+
+
+def projection_kind(spec: Mapping[str, Any]) -> str | None:
+    """投影的类型: `include`、`exclude`, 包含计算字段时返回 `None`"""
+    values = [v for k, v in spec.items() if k != "_id"]
+    if not all(is_literal_flag(v) for v in values):
+        return None
+    if all(values):
+        return "include"
+    return "exclude" if not any(values) else None
+
+
+def modified_fields(stage: Stage, fields: Iterable[str]) -> bool | None:
+    """
+    阶段是否会修改或移除指定的字段。
+    返回 `None` 表示该阶段不可越过。
+    """
+    name, value = stage_name(stage), stage_value(stage)
+    fields = list(fields)
+    if name == "$sort":
+        return False
+    if name in {"$set", "$addFields"}:
+        changed: Iterable[str] = value
+    elif name == "$unset":
+        changed = [value] if isinstance(value, str) else value
+    elif name == "$lookup":
+        changed = [value.get("as", "")]
+    elif name == "$unwind":
+        path = value if isinstance(value, str) else value["path"]
+        changed = [path.lstrip("$")]
+        if isinstance(value, Mapping) and value.get("includeArrayIndex"):
+            changed.append(value["includeArrayIndex"])
+    elif name == "$project":
+        kind = projection_kind(value)
+        if kind == "exclude":
+            changed = [k for k, v in value.items() if not v]
+        elif kind == "include":
+            id_excluded = "_id" in value and not value["_id"]
+            included = [k for k, v in value.items() if v]
+            return any(
+                (f == "_id" and id_excluded)
+                or (
+                    f != "_id"
+                    and not any(f == i or f.startswith(f"{i}.") for i in included)
+                )
+                for f in fields
+            )
+        else:
+            return None
+    else:
+        return None
+    return any(overlaps(f, c) for f in fields for c in changed)
+
+
+def merge_matches(first: Mapping[str, Any], second: Mapping[str, Any]) -> dict:
+    if first.keys().isdisjoint(second.keys()):
+        return {**first, **second}
+    return {"$and": [dict(first), dict(second)]}
+
+
+def rule_merge_match(stages: list[Stage], i: int) -> str | None:
+    """合并相邻的 `$match`"""
+    if i == 0 or not stage_name(stages[i]) == stage_name(stages[i - 1]) == "$match":
+        return None
+    stages[i - 1 : i + 1] = [
+        {"$match": merge_matches(stage_value(stages[i - 1]), stage_value(stages[i]))}
+    ]
+    return f"合并第 {i} 与第 {i + 1} 阶段的 $match"
+
+
+def rule_push_match(stages: list[Stage], i: int) -> str | None:
+    """将 `$match` 前移到不影响其过滤字段的阶段之前"""
+    if i == 0 or stage_name(stages[i]) != "$match":
+        return None
+    previous = stages[i - 1]
+    if stage_name(previous) == "$match":
+        return None
+    if (fields := match_fields(stage_value(stages[i]))) is None:
+        return None
+    if modified_fields(previous, fields) is not False:
+        return None
+    stages[i - 1], stages[i] = stages[i], previous
+    return f"将 $match 移动到 {stage_name(previous)} 之前"
+
+
+def rule_merge_set(stages: list[Stage], i: int) -> str | None:
+    """合并相邻且互不依赖的 `$set`/`$addFields`"""
+    if i == 0:
+        return None
+    first, second = stages[i - 1], stages[i]
+    name = stage_name(second)
+    if name not in {"$set", "$addFields"} or stage_name(first) != name:
+        return None
+    first_spec, second_spec = stage_value(first), stage_value(second)
+    if (refs := referenced_fields(second_spec)) is None:
+        return None
+    if any(overlaps(f, r) for f in first_spec for r in [*refs, *second_spec]):
+        return None
+    stages[i - 1 : i + 1] = [{name: {**first_spec, **second_spec}}]
+    return f"合并相邻的 {name}"
+
+
+def merge_projections(
+    first: Mapping[str, Any], second: Mapping[str, Any]
+) -> dict[str, Any] | None:
+    """合并两个同类型的投影, 无法合并时返回 `None`"""
+    kind = projection_kind(first)
+    if kind is None or kind != projection_kind(second):
+        return None
+    if kind == "exclude":
+        return {**first, **second}
+    merged: dict[str, Any] = {}
+    for k, v in second.items():
+        if k == "_id":
+            merged[k] = v
+            continue
+        # 存在包含关系的两个路径只有较窄的一个会保留到结果中
+        for f, fv in first.items():
+            if fv and overlaps(k, f):
+                merged[f if f.startswith(f"{k}.") else k] = v
+    if not merged.keys() - {"_id"}:
+        return None
+    for spec in (first, second):
+        if "_id" in spec and not spec["_id"]:
+            merged["_id"] = spec["_id"]
+    return merged
+
+
+def rule_merge_project(stages: list[Stage], i: int) -> str | None:
+    """合并相邻的 `$project`"""
+    if i == 0 or not stage_name(stages[i]) == stage_name(stages[i - 1]) == "$project":
+        return None
+    merged = merge_projections(stage_value(stages[i - 1]), stage_value(stages[i]))
+    if merged is None:
+        return None
+    stages[i - 1 : i + 1] = [{"$project": merged}]
+    return "合并相邻的 $project"
+
+
+def rule_merge_unset(stages: list[Stage], i: int) -> str | None:
+    """合并相邻的 `$unset`"""
+    if i == 0 or not stage_name(stages[i]) == stage_name(stages[i - 1]) == "$unset":
+        return None
+    fields: list[str] = []
+    for stage in stages[i - 1 : i + 1]:
+        spec = stage_value(stage)
+        fields += [spec] if isinstance(spec, str) else list(spec)
+    stages[i - 1 : i + 1] = [{"$unset": list(dict.fromkeys(fields))}]
+    return "合并相邻的 $unset"
+
+
+def rule_push_limit(stages: list[Stage], i: int) -> str | None:
+    """将 `$limit`/`$skip` 前移到一对一的阶段之前, 使其尽早与 `$sort` 相邻"""
+    if i == 0 or stage_name(stages[i]) not in {"$limit", "$skip"}:
+        return None
+    previous = stages[i - 1]
+    if stage_name(previous) not in ONE_TO_ONE_STAGES:
+        return None
+    stages[i - 1], stages[i] = stages[i], previous
+    message = f"将 {stage_name(stages[i - 1])} 移动到 {stage_name(previous)} 之前"
+    if i > 1 and stage_name(stages[i - 2]) == "$sort":
+        message += ", 与 $sort 合并为 top-k 排序"
+    return message
+
+
+def rule_merge_limit(stages: list[Stage], i: int) -> str | None:
+    """合并相邻的 `$limit` 与相邻的 `$skip`"""
+    if i == 0:
+        return None
+    name = stage_name(stages[i])
+    if name not in {"$limit", "$skip"} or stage_name(stages[i - 1]) != name:
+        return None
+    first, second = stage_value(stages[i - 1]), stage_value(stages[i])
+    value = min(first, second) if name == "$limit" else first + second
+    stages[i - 1 : i + 1] = [{name: value}]
+    return f"合并相邻的 {name}"
+
+
+RULES: Sequence[Rule] = (
+    rule_merge_match,
+    rule_push_match,
+    rule_merge_set,
+    rule_merge_project,
+    rule_merge_unset,
+    rule_push_limit,
+    rule_merge_limit,
+)
+
+
+def optimize_stages(stages: Sequence[Stage]) -> OptimizeReport:
+    """在保证结果不变的前提下, 合并与重排聚合管道阶段"""
+    report = OptimizeReport(list(stages))
+    optimized = list(stages)
+    for _ in range(MAX_PASSES):
+        changed = False
+        i = 0
+        while i < len(optimized):
+            for rule in RULES:
+                if change := rule(optimized, i):
+                    report.changes.append(change)
+                    changed = True
+                    i = max(i - 2, 0)
+                    break
+            else:
+                i += 1
+        if not changed:
+            break
+    report.after = optimized
+    return report
@@ -0,0 +1,204 @@
+from collections import defaultdict
+from collections.abc import Callable, Generator, Iterable, Sequence
+from typing import TYPE_CHECKING, Any, ClassVar, Generic, Literal, TypeAlias, TypeVar
+
+from mango.compat import ModelField
+from mango.expression import ExpressionField
+from mango.utils import validate_value
+
+if TYPE_CHECKING:  # pragma: no cover
+    from mango.models import Document
+    from mango.result import KeyField
+    from mango.stage import Pipeline
+
+T_Document = TypeVar("T_Document", bound="Document")
+
+RefStrategy: TypeAlias = Literal["auto", "batch", "join"]
+
+JOIN_MAX_DOCUMENTS = 100
+"""自动选择策略时, 结果数量上限不超过该值的查询使用 `$lookup` 连接"""
+
+_refs: dict[Any, type["Ref[Any]"]] = {}
+
+
+class Ref(Generic[T_Document]):
+    """
+    对其他文档的引用, 在文档中保存为被引用文档的主键。
+    使用 `FindResult.prefetch` 或 `FindResult.join` 可以批量解析查询结果中的引用。
+    """
+
+    __slots__ = ("id", "_document", "_resolved")
+
+    __model__: ClassVar["type[Document] | str"]
+
+    def __init__(self, id: Any, document: T_Document | None = None) -> None:
+        self.id = id
+        self._document = document
+        self._resolved = document is not None
+
+    def __class_getitem__(cls, model: "type[T_Document] | str") -> Any:
+        if (ref := _refs.get(model)) is None:
+            name = model if isinstance(model, str) else model.__name__
+            ref = type(f"Ref[{name}]", (cls,), {"__slots__": (), "__model__": model})
+            _refs[model] = ref
+        return ref
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Ref):
+            return self.target() is other.target() and self.id == other.id
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(id={self.id!r})"
+
+    @classmethod
+    def target(cls) -> type[T_Document]:
+        """
+        被引用的文档模型。
+        使用字符串引用时, 可以是模型的类名, 或 `模块.类名` 形式的完整路径。
+        """
+        if isinstance(model := cls.__model__, str):
+            from mango.source import Mango
+
+            found = [
+                m
+                for m in Mango._document_models
+                if model in {m.__name__, f"{m.__module__}.{m.__qualname__}"}
+            ]
+            if not found:
+                raise TypeError(f"未找到被引用的文档模型: {model}")
+            if len(found) > 1:
+                names = ", ".join(
+                    sorted(f"{m.__module__}.{m.__qualname__}" for m in found)
+                )
+                raise TypeError(f"被引用的文档模型 {model} 不唯一, 请使用完整路径: {names}")
+            cls.__model__ = model = found[0]
+        return model  # type: ignore
+
+    @classmethod
+    def __get_validators__(cls) -> Generator[Callable[..., Any], None, None]:
+        yield cls.validate
+
+    @classmethod
+    def validate(cls, v: Any) -> "Ref[T_Document]":
+        if isinstance(v, cls):
+            return v
+        model = cls.target()
+        if isinstance(v, Ref):
+            raise TypeError(f"应为对 {model.__name__} 的引用")
+        if isinstance(v, model):
+            return cls(v.pk, v)
+        pk = model.__fields__[model.__primary_key__]
+        return cls(validate_value(model, pk, v, item=False))
+
+    @classmethod
+    def __modify_schema__(cls, field_schema: dict) -> None:
+        field_schema.update(type="string")
+
+    @property
+    def resolved(self) -> bool:
+        """引用是否已被解析"""
+        return self._resolved
+
+    @property
+    def document(self) -> T_Document | None:
+        """被引用的文档, 未解析或文档不存在时为 None"""
+        return self._document
+
+    def resolve(self, document: T_Document | None) -> None:
+        self._document = document
+        self._resolved = True
+
+    async def fetch(self) -> T_Document | None:
+        """获取被引用的文档, 已解析时直接返回"""
+        if not self._resolved:
+            self.resolve(await self.target().get(self.id))
+        return self._document
+
+
+def ref_field(model: type["Document"], key: "KeyField") -> ModelField:
+    """获取模型的引用字段, 支持顶层的 `Ref` 字段及其列表"""
+    name = getattr(key, "field", None)
+    field = name if isinstance(name, ModelField) else model.__fields__.get(str(key))
+    if field is None or not (
+        isinstance(field.type_, type) and issubclass(field.type_, Ref)
+    ):
+        raise TypeError(f"{key} 不是 {model.__name__} 的引用字段")
+    if model.__fields__.get(field.name) is not field:
+        raise TypeError(f"仅支持模型顶层的引用字段: {key}")
+    return field
+
+
+def refs_of(instance: "Document", field: ModelField) -> list[Ref[Any]]:
+    value = getattr(instance, field.name)
+    if value is None:
+        return []
+    return [value] if isinstance(value, Ref) else [v for v in value if v is not None]
+
+
+def choose_strategy(strategy: RefStrategy, limit: int) -> Literal["batch", "join"]:
+    """
+    选择引用的解析策略。
+    `$lookup` 在一次往返中完成连接, 但会对每个文档单独查找, 适合数量较少的结果;
+    批量 `$in` 查询会合并重复的引用, 适合数量较多或不受限制的结果。
+    """
+    if strategy == "auto":
+        return "join" if 0 < limit <= JOIN_MAX_DOCUMENTS else "batch"
+    return strategy
+
+
+async def prefetch(
+    instances: Sequence["Document"], fields: Iterable[ModelField]
+) -> None:
+    """使用每个被引用模型一次 `$in` 查询批量解析引用"""
+    refs: defaultdict[type[Document], list[Ref[Any]]] = defaultdict(list)
+    for field in fields:
+        for instance in instances:
+            refs[field.type_.target()].extend(refs_of(instance, field))
+    for model, targets in refs.items():
+        ids = list({ref.id: None for ref in targets})
+        found = {doc.pk: doc for doc in await model.find({"_id": {"$in": ids}})}
+        for ref in targets:
+            ref.resolve(found.get(ref.id))
+
+
+def add_lookups(
+    pipeline: "Pipeline", model: type["Document"], fields: Iterable[ModelField]
+) -> "Pipeline":
+    """添加解析引用的 `$lookup` 阶段, 被引用的文档保存在 `joined_path` 字段中"""
+    for field in fields:
+        pipeline.lookup(
+            from_=field.type_.target().__collection__.name,
+            local_field=ExpressionField.of(field, model.__meta__.by_alias),
+            foreign_field="_id",
+            as_=joined_path(field),
+        )
+    return pipeline
+
+
+def joined_path(field: ModelField) -> str:
+    return f"__ref_{field.name}"
+
+
+def pop_joined(
+    document: dict[str, Any], fields: Iterable[ModelField]
+) -> dict[str, list[dict[str, Any]]]:
+    """从 `$lookup` 的结果文档中取出被引用的文档"""
+    return {field.name: document.pop(joined_path(field), []) for field in fields}
+
+
+def attach(
+    instance: "Document",
+    joined: dict[str, list[dict[str, Any]]],
+    fields: Iterable[ModelField],
+) -> None:
+    """使用 `$lookup` 连接的文档解析引用"""
+    for field in fields:
+        model = field.type_.target()
+        found = {document["_id"]: document for document in joined[field.name]}
+        for ref in refs_of(instance, field):
+            document = found.get(ref.id)
+            ref.resolve(None if document is None else model.from_doc(dict(document)))
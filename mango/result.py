@@ -1,33 +1,81 @@
-from collections.abc import AsyncGenerator, Generator, Mapping
+import asyncio
+import contextlib
+from collections.abc import (
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Generator,
+    Mapping,
+    Sequence,
+)
 from typing import TYPE_CHECKING, Any, Generic, TypeAlias, TypeVar
 
+import bson
 from motor.motor_asyncio import AsyncIOMotorCursor, AsyncIOMotorLatentCommandCursor
-from pydantic import BaseModel
-
-from mango.expression import Expression, ExpressionField
+from typing_extensions import Self
+
+from mango.advisor import IndexAdvice, IndexAdvisor, is_equality
+from mango.cache import QueryCache, invalidate
+from mango.compat import BaseModel
+from mango.expression import (
+    Expression,
+    ExpressionField,
+    Update,
+    compile_filter,
+    compile_query,
+    compile_update,
+)
+from mango.fields import Field
+from mango.frozen import FrozenView, frozen_view
+from mango.hedge import HedgePolicy, query_shape
 from mango.index import Order
-from mango.utils import any_check, is_sequence, validate_fields
+from mango.ref import (
+    RefStrategy,
+    add_lookups,
+    attach,
+    choose_strategy,
+    pop_joined,
+    prefetch,
+    ref_field,
+)
+from mango.stage import Pipeline
+from mango.utils import any_check, is_sequence, validate_fields, validate_value
 
 if TYPE_CHECKING:  # pragma: no cover
     from pymongo.results import DeleteResult
 
+    from mango.compat import ModelField
+    from mango.drive import Collection
     from mango.models import Document
 
 T_Model = TypeVar("T_Model", bound="Document")
 
+T_Schema = TypeVar("T_Schema", bound=BaseModel)
+
+T_Result = TypeVar("T_Result")
+
+T = TypeVar("T")
+
+DEFAULT_BATCH_SIZE = 1000
+
 KeyField: TypeAlias = str | ExpressionField
 
 FindMapping: TypeAlias = Mapping[KeyField, Any]
 
 DirectionType: TypeAlias = Order
 
-SortType: TypeAlias = tuple[str, DirectionType]
+FetchedBatch: TypeAlias = list[dict[str, Any]] | BaseException | None
+
+SortType: TypeAlias = tuple[str, DirectionType | dict[str, str]]
+
+TEXT_SCORE = {"$meta": "textScore"}
 
 
 class FindOptions(BaseModel):
     limit: int = 0
     skip: int = 0
-    sort: list[SortType] = []
+    sort: list[SortType] = Field([])
+    projection: dict[str, Any] | None = None
 
     def kwdict(self, *exclude: str) -> dict[str, Any]:
         return self.dict(exclude=set(exclude), exclude_defaults=True)
@@ -43,63 +91,215 @@ class FindResult(Generic[T_Model]):
         self.collection = model.__collection__
         self._filter = filter
         self.options = FindOptions()
+        self._hedge: HedgePolicy | None = None
+        self._cache: tuple[QueryCache, float] | None = None
+        self._refs: list[ModelField] = []
+        self._ref_strategy: RefStrategy = "auto"
 
     def __await__(self) -> Generator[None, None, list[T_Model]]:
         """`await` : 等待时，将返回获取的模型列表"""
-        documents = yield from self.cursor.to_list(length=None).__await__()
+        joined = self._joined()
+        operation, read = (
+            ("join", self._find_joined) if joined else ("find", self._find)
+        )
+        if self._cache:
+            documents = yield from self._cached(operation, read).__await__()
+        else:
+            documents = yield from read().__await__()
+        if self._refs:
+            return (yield from self._hydrate(documents, joined=joined).__await__())
         instances: list[T_Model] = []
         for document in documents:
-            instances.append(self.model.from_doc(document))
+            instances.append(self.model.from_doc(dict(document)))
             yield
         return instances
 
     async def __aiter__(self) -> AsyncGenerator[T_Model, None]:
         """`async for`: 异步迭代查询结果"""
+        if self._refs:
+            # 按批次解析引用
+            joined = self._joined()
+            cursor = self._join_cursor() if joined else self.cursor
+            while documents := await cursor.to_list(length=DEFAULT_BATCH_SIZE):
+                for instance in await self._hydrate(documents, joined=joined):
+                    yield instance
+            return
         async for document in self.cursor:  # type: ignore
             yield self.model.from_doc(document)
 
+    async def read_ahead(
+        self, depth: int = 2, batch_size: int | None = None
+    ) -> AsyncGenerator[T_Model, None]:
+        """
+        异步迭代查询结果, 在后台预先获取后续批次。
+        当前批次的文档构建为模型时, 下一批次已在获取中, 网络等待与模型验证得以重叠。
+
+        depth: 最多预先获取的批次数量。
+        batch_size: 每批次获取的文档数量。
+        """
+        if depth < 1:
+            raise ValueError("depth 必须大于 0")
+        size = batch_size or DEFAULT_BATCH_SIZE
+        filter = self.filter
+        IndexAdvisor.check(
+            self.model, filter, self.options.sort, self.options.projection
+        )
+        cursor = self.collection.find(filter, batch_size=size, **self.options.kwdict())
+        queue: asyncio.Queue[FetchedBatch] = asyncio.Queue(depth)
+        fetcher = asyncio.create_task(fetch_batches(cursor, size, queue))
+        try:
+            while (batch := await queue.get()) is not None:
+                if isinstance(batch, BaseException):
+                    raise batch
+                # 让出控制权, 使后台任务在构建模型前发出下一批次的请求
+                await asyncio.sleep(0)
+                for document in batch:
+                    yield self.model.from_doc(document)
+        finally:
+            fetcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await fetcher
+            await cursor.close()
+
     @property
     def cursor(self) -> AsyncIOMotorCursor:
-        return self.collection.find(self.filter, **self.options.kwdict())
+        filter = self.filter
+        IndexAdvisor.check(
+            self.model, filter, self.options.sort, self.options.projection
+        )
+        return self.collection.find(filter, **self.options.kwdict())
 
     @property
     def filter(self) -> dict[str, Any]:
         """查询过滤条件"""
-        compiled: dict[str, Any] = {}
-        for condition in self._filter:
-            if isinstance(condition, Mapping):
-                condition = dict(condition)
-            elif isinstance(condition, Expression):
-                condition = condition.struct()
-            else:
-                raise TypeError("查询过滤条件不正确, 应为映射或表达式")
-            compiled |= self._compile(condition)
-        return compiled
+        return compile_filter(*self._filter)
 
     def _compile(
         self,
         source: Mapping[KeyField, Any] | Mapping[str, Any],
     ) -> dict[str, Any]:
-        compiled: dict[str, Any] = {}
-
-        for key, value in source.items():
-            key = str(key)
-            if isinstance(value, Expression):
-                compiled[key] = value.struct()
-            elif isinstance(value, Mapping):
-                compiled[key] = self._compile(value)
-            elif is_sequence(value):
-                compiled[key] = []
-                for i in value:
-                    if isinstance(i, Expression):
-                        i = i.struct()
-                    if isinstance(i, Mapping):
-                        i = self._compile(i)
-                    compiled[key].append(i)
+        return compile_query(source)
+
+    def hedge(self, policy: HedgePolicy | None = None) -> "FindResult[T_Model]":
+        """
+        启用对冲读取, 适用于 `get` 与返回少量文档的 `await`。
+        读取在延迟后仍未返回时, 将向副本集的其他成员发出相同的请求, 采用先返回的结果。
+
+        policy: 对冲策略, 默认使用共享的 `HedgePolicy.default`。
+        """
+        self._hedge = policy or HedgePolicy.default
+        return self
+
+    def prefetch(
+        self, *fields: KeyField, strategy: RefStrategy = "auto"
+    ) -> "FindResult[T_Model]":
+        """
+        解析查询结果中的引用字段, 被引用的文档可以通过 `Ref.document` 访问。
+
+        fields: 需要解析的 `Ref` 字段或其列表字段。
+        strategy: `batch` 在获取结果后对每个被引用模型执行一次 `$in` 查询,
+        `join` 将查询编译为带有 `$lookup` 阶段的聚合管道,
+        `auto` 在结果数量上限较小时使用 `join`, 否则使用 `batch`。
+        """
+        self._refs.extend(ref_field(self.model, field) for field in fields)
+        self._ref_strategy = strategy
+        return self
+
+    def join(self, *fields: KeyField) -> "FindResult[T_Model]":
+        """使用 `$lookup` 阶段解析查询结果中的引用字段, 参见 `prefetch`"""
+        return self.prefetch(*fields, strategy="join")
+
+    def join_pipeline(self) -> Pipeline:
+        """使用 `$lookup` 解析引用时执行的聚合管道"""
+        filter, options = self.filter, self.options
+        IndexAdvisor.check(self.model, filter, options.sort, options.projection)
+        pipeline = Pipeline({"$match": filter})
+        if options.sort:
+            pipeline.sort(*options.sort)
+        if options.skip:
+            pipeline.skip(options.skip)
+        if options.limit:
+            pipeline.limit(options.limit)
+        if options.projection:
+            pipeline.project(**options.projection)
+        return add_lookups(pipeline, self.model, self._refs)
+
+    def _joined(self) -> bool:
+        if not self._refs:
+            return False
+        return choose_strategy(self._ref_strategy, self.options.limit) == "join"
+
+    def _join_cursor(self) -> AsyncIOMotorLatentCommandCursor:
+        return self.collection.aggregate(
+            self.join_pipeline().compile(self.model.__encoder__)
+        )
+
+    async def _find_joined(self) -> list[dict[str, Any]]:
+        return await self._join_cursor().to_list(length=None)
+
+    async def _hydrate(
+        self, documents: list[dict[str, Any]], *, joined: bool
+    ) -> list[T_Model]:
+        """构建模型并解析引用"""
+        instances: list[T_Model] = []
+        for document in documents:
+            document = dict(document)
+            if joined:
+                references = pop_joined(document, self._refs)
+                instances.append(instance := self.model.from_doc(document))
+                attach(instance, references, self._refs)
             else:
-                compiled[key] = value
+                instances.append(self.model.from_doc(document))
+        if not joined:
+            await prefetch(instances, self._refs)
+        return instances
+
+    def cached(
+        self, ttl: float = 60, cache: QueryCache | None = None
+    ) -> "FindResult[T_Model]":
+        """
+        缓存 `await`、`get` 与 `count` 的查询结果, 以模型、过滤条件与查询选项为键。
+        缓存的结果将在过期或模型通过 mango 发生任何写入后失效。
+
+        ttl: 缓存的有效秒数。
+        cache: 使用的缓存, 默认使用共享的 `QueryCache.default`。
+        """
+        self._cache = (QueryCache.default if cache is None else cache, ttl)
+        return self
 
-        return compiled
+    async def _cached(self, operation: str, read: Callable[[], Awaitable[T]]) -> T:
+        cache, ttl = self._cache  # type: ignore
+        query = {
+            "operation": operation,
+            "filter": self.filter,
+            "options": self.options.kwdict(),
+        }
+        related = []
+        if operation == "join":
+            # 连接的结果包含被引用模型的文档, 其写入也将使缓存失效
+            query["refs"] = [field.name for field in self._refs]
+            related = [field.type_.target() for field in self._refs]
+        key = bson.encode(query, codec_options=self.model.__encoder__)
+        return await cache.fetch(self.model, (self.model, key), ttl, read, related)
+
+    async def _find(self) -> list[dict[str, Any]]:
+        if self._hedge:
+            return await self._hedged_find()
+        return await self.cursor.to_list(length=None)
+
+    async def _hedged_find(self) -> list[dict[str, Any]]:
+        filter, kwargs = self.filter, self.options.kwdict()
+        IndexAdvisor.check(
+            self.model, filter, self.options.sort, self.options.projection
+        )
+        shape = (self.model, "find", query_shape(filter))
+        return await self._hedge.read(  # type: ignore
+            self.collection,
+            shape,
+            lambda collection, max_time_ms: collection.find(
+                filter, max_time_ms=max_time_ms, **kwargs
+            ).to_list(length=None),
+        )
 
     def limit(self, limit: int = 0) -> "FindResult[T_Model]":
         """限制查询条件返回结果的数量"""
@@ -148,43 +348,260 @@ class FindResult(Generic[T_Model]):
         for key in keys:
             yield str(key), direction
 
+    def text_score(
+        self, field: str = "score", sort: bool = True
+    ) -> "FindResult[T_Model]":
+        """
+        投影全文搜索的相关性得分, 需要在过滤条件中使用 `OPR.text`。
+
+        field: 保存得分的字段名。
+        sort: 是否按得分由高到低排序, 该排序将优先于其他排序。
+        """
+        self.options.projection = (self.options.projection or {}) | {field: TEXT_SCORE}
+        if sort:
+            self.options.sort.insert(0, (field, TEXT_SCORE))
+        return self
+
+    async def scored(
+        self, field: str = "score"
+    ) -> AsyncGenerator[tuple[T_Model, float], None]:
+        """异步迭代查询结果及其全文搜索得分, 未调用 `text_score` 时将按得分排序"""
+        projection = self.options.projection or {}
+        if projection.get(field) != TEXT_SCORE:
+            self.text_score(field)
+        async for document in self.cursor:  # type: ignore
+            score = document.pop(field)
+            yield self.model.from_doc(document), score
+
+    def targets_single_shard(self) -> bool:
+        """
+        查询是否仅路由到单个分片, 即过滤条件以相等条件包含模型声明的完整分片键。
+        未声明分片键时总是为真。
+        """
+        equalities = equality_paths(self.filter)
+        return all(path in equalities for path in self.model.__shard_key__)
+
+    def advise(self) -> IndexAdvice:
+        """分析查询是否被模型声明的索引覆盖, 并给出建议索引"""
+        return IndexAdvisor.analyze(
+            self.model, self.filter, self.options.sort, self.options.projection
+        )
+
+    def _checked_filter(self) -> dict[str, Any]:
+        filter = self.filter
+        IndexAdvisor.check(self.model, filter)
+        return filter
+
+    async def frozen(self) -> list[FrozenView[T_Model]]:
+        """
+        获取查询结果的只读视图列表。
+        文档逐个验证后仅保留紧凑的视图, 适用于在内存中长期保存大量结果。
+        """
+        view = frozen_view(self.model)
+        return [view.from_doc(document) async for document in self.cursor]
+
     async def count(self) -> int:
         """获得符合条件的文档总数"""
+        if self._cache:
+            return await self._cached("count", self._count)
+        return await self._count()
+
+    async def _count(self) -> int:
         return await self.collection.count_documents(
-            self.filter, **self.options.kwdict("sort")
+            self._checked_filter(), **self.options.kwdict("sort")
+        )
+
+    async def exists(self) -> bool:
+        """
+        是否存在符合条件的文档。
+        仅获取一个文档的 `_id`, 查询字段被索引包含时无需读取文档。
+        """
+        filter, projection = self.filter, {"_id": 1}
+        IndexAdvisor.check(self.model, filter, projection=projection)
+        document = await self.collection.find_one(
+            filter, projection, **self.options.kwdict("sort", "limit", "projection")
         )
+        return document is not None
+
+    async def distinct(self, key: KeyField) -> list[Any]:
+        """获取符合条件的文档中指定字段的不重复值, 值将使用字段类型验证"""
+        path, pk = str(key), self.model.__primary_key__
+        if isinstance(key, ExpressionField):
+            field = key.field
+        elif key in {"_id", pk}:
+            path, field = "_id", self.model.__fields__[pk]
+        else:
+            field = self.model.__fields__.get(key)
+        values = await self.collection.distinct(path, self._checked_filter())
+        if field is None:
+            return values
+        return [validate_value(self.model, field, value) for value in values]
 
     async def get(self) -> T_Model | None:
         """
         从数据库中获取单个文档。
         返回单个文档，如果没有找到匹配的文档，返回“None”。
         """
-        if document := await self.collection.find_one(self.filter):
-            return self.model.from_doc(document)
-        return None
+        if self._cache:
+            document = await self._cached("get", self._find_one)
+        else:
+            document = await self._find_one()
+        if not document:
+            return None
+        if self._refs:
+            return (await self._hydrate([document], joined=False))[0]
+        return self.model.from_doc(dict(document))
+
+    async def _find_one(self) -> dict[str, Any] | None:
+        filter = self._checked_filter()
+        if self._hedge:
+            return await self._hedge.read(
+                self.collection,
+                (self.model, "get", query_shape(filter)),
+                lambda collection, max_time_ms: collection.find_one(
+                    filter, max_time_ms=max_time_ms
+                ),
+            )
+        return await self.collection.find_one(filter)
 
     async def delete(self) -> int:
         """删除符合条件的文档"""
-        result: DeleteResult = await self.collection.delete_many(self.filter)
+        result: DeleteResult = await self.collection.delete_many(self._checked_filter())
+        invalidate(self.model)
         return result.deleted_count
 
-    async def update(self, **kwargs: Any) -> None:
-        """使用提供的信息更新查找到的文档"""
-        values = validate_fields(self.model, kwargs)
-        await self.collection.update_many(self.filter, {"$set": values})
-
+    async def update(self, *updates: Update, **kwargs: Any) -> None:
+        """
+        使用提供的信息更新查找到的文档。
 
-class AggregateResult:
-    def __init__(self, cursor: AsyncIOMotorLatentCommandCursor) -> None:
-        self.cursor = cursor
+        updates: 字段更新操作, 如 `Model.views.inc(1)`、`Model.tags.push(x)`。
+        kwargs: 需要设置的字段值。
+        """
+        values = validate_fields(self.model, kwargs) if kwargs else {}
+        update = compile_update(
+            self.model, *updates, codec_options=self.model.__encoder__, **values
+        )
+        await self.collection.update_many(self._checked_filter(), update)
+        invalidate(self.model)
+
+
+def equality_paths(filter: Mapping[str, Any]) -> set[str]:
+    """过滤条件中以相等条件限定为单个值的字段路径"""
+    paths: set[str] = set()
+    for key, value in filter.items():
+        if key == "$and":
+            for clause in value:
+                paths |= equality_paths(clause)
+        elif key.startswith("$"):
+            continue
+        elif is_equality(value):
+            paths.add(key)
+    return paths
+
+
+async def fetch_batches(
+    cursor: AsyncIOMotorCursor,
+    size: int,
+    queue: "asyncio.Queue[FetchedBatch]",
+) -> None:
+    """按批次获取游标中的文档并放入队列, 结束时放入 `None`, 出错时放入异常"""
+    try:
+        while documents := await cursor.to_list(length=size):
+            await queue.put(documents)
+    except Exception as e:
+        await queue.put(e)
+    else:
+        await queue.put(None)
+
+
+class AggregateResult(Generic[T_Result]):
+    def __init__(
+        self,
+        collection: "Collection | AsyncIOMotorLatentCommandCursor",
+        pipeline: Sequence[Mapping[str, Any]] | None = None,
+        *args: Any,
+        model: type[T_Result] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        """
+        collection: 执行聚合的集合, 也可以直接传入已创建的聚合游标。
+        pipeline: 聚合管道, 传入游标时省略。
+        """
+        self._cursor: AsyncIOMotorLatentCommandCursor | None = None
+        if pipeline is None:
+            self._cursor = collection  # type: ignore
+        self.collection = collection
+        self.pipeline = pipeline or []
+        self.model = model
+        self.args = args
+        self.kwargs = kwargs
 
-    def __await__(self) -> Generator[None, None, list[dict[str, Any]]]:
+    def __await__(self) -> Generator[None, None, list[T_Result]]:
         """
         `await` : 等待时，将返回聚合管道的结果文档列表
         """
-        return (yield from self.cursor.to_list(length=None).__await__())
+        documents = yield from self.cursor.to_list(length=None).__await__()
+        if self.model is None:
+            return documents
+        instances: list[T_Result] = []
+        for document in documents:
+            instances.append(self._hydrate(document))
+            yield
+        return instances
 
-    async def __aiter__(self) -> AsyncGenerator[dict[str, Any], None]:
+    async def __aiter__(self) -> AsyncGenerator[T_Result, None]:
         """`async for`: 异步迭代聚合管道的结果文档"""
         async for document in self.cursor:  # type: ignore
-            yield document
+            yield self._hydrate(document)
+
+    @property
+    def cursor(self) -> AsyncIOMotorLatentCommandCursor:
+        if self._cursor is not None:
+            return self._cursor
+        return self.collection.aggregate(self.pipeline, *self.args, **self.kwargs)
+
+    def _hydrate(self, document: dict[str, Any]) -> Any:
+        if self.model is None:
+            return document
+        if from_doc := getattr(self.model, "from_doc", None):
+            return from_doc(document)
+        return self.model.parse_obj(document)
+
+    def as_model(self, model: type[T_Schema]) -> "AggregateResult[T_Schema]":
+        """将结果文档转换为指定的模型, 可以是文档模型或任意 pydantic 模型"""
+        if self._cursor is not None:
+            return AggregateResult(self._cursor, model=model)
+        return AggregateResult(
+            self.collection, self.pipeline, *self.args, model=model, **self.kwargs
+        )
+
+    def batch_size(self, size: int) -> Self:
+        """设置每批次从服务器获取的文档数量"""
+        if self._cursor is not None:
+            self._cursor.batch_size(size)
+        self.kwargs["batchSize"] = size
+        return self
+
+    def allow_disk_use(self, allow: bool = True) -> Self:
+        """允许聚合阶段写入临时文件, 以突破内存限制, 传入游标时不可用"""
+        if self._cursor is not None:
+            raise TypeError("聚合游标已创建, 无法设置 allowDiskUse")
+        self.kwargs["allowDiskUse"] = allow
+        return self
+
+    async def batches(
+        self, size: int | None = None
+    ) -> AsyncGenerator[list[T_Result], None]:
+        """按批次异步迭代聚合管道的结果, 同一时间仅在内存中保留一个批次"""
+        size = size or self.kwargs.get("batchSize") or DEFAULT_BATCH_SIZE
+        if self._cursor is not None:
+            cursor = self._cursor.batch_size(size)
+        else:
+            cursor = self.collection.aggregate(
+                self.pipeline, *self.args, **(self.kwargs | {"batchSize": size})
+            )
+        try:
+            while documents := await cursor.to_list(length=size):
+                yield [self._hydrate(document) for document in documents]
+        finally:
+            await cursor.close()
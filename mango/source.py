@@ -1,32 +1,150 @@
 import asyncio
+import logging
 from typing import TYPE_CHECKING, Any, ClassVar
 
+from pymongo.errors import OperationFailure
+
+from mango.advisor import IndexAdvisor
 from mango.drive import DEFAULT_CONNECT_URI, Client
+from mango.meta import collection_options
 from mango.utils import get_indexes, to_snake_case
+from mango.writer import BufferedWriter
 
 if TYPE_CHECKING:  # pragma: no cover
+    from mango.drive import Collection, Database
+    from mango.index import Index
     from mango.models import Document
 
+logger = logging.getLogger(__name__)
+
+INDEX_CONFLICT_CODES = {85, 86}
+"""IndexOptionsConflict 与 IndexKeySpecsConflict 错误码"""
+
+INDEX_IGNORED_FIELDS = {"v", "ns", "key", "name", "hidden", "background"}
+"""比较索引选项时忽略的字段, 包括单独比较的键与可以直接修改的隐藏状态"""
+
+INDEX_VERSION_FIELDS = {"textIndexVersion", "2dsphereIndexVersion"}
+"""服务器为文本与地理空间索引补充的版本字段, 未声明时不比较"""
+
+TEXT_INDEX_DEFAULTS = {"default_language": "english", "language_override": "language"}
+"""服务器为文本索引补充的默认选项"""
+
 
 async def init_model(model: type["Document"], *, revise_index: bool = False) -> None:
     """初始化文档模型"""
     meta = model.__meta__
     db = Client.get_database(meta.database)
-    model.__collection__ = db[meta.name or to_snake_case(model.__name__)]
+    name = meta.name or to_snake_case(model.__name__)
+    model.__collection__ = await init_collection(db, name, collection_options(meta))
     await init_index(model, revise_index=revise_index)
 
 
+async def init_collection(
+    db: "Database", name: str, options: dict[str, Any]
+) -> "Collection":
+    """创建带有选项的集合, 如果集合已存在, 则检查其选项是否与声明一致"""
+    if not options:
+        return db[name]
+    existing = await db.collection_options(name)
+    if existing is None:
+        return await db.create_collection(name, **options)
+    if drifted := [k for k, v in options.items() if not is_subset(v, existing.get(k))]:
+        logger.warning(
+            "集合 %s 的选项与声明不一致, 已存在的集合不会被修改: %s",
+            name,
+            ", ".join(f"{k}={existing.get(k)!r} (声明 {options[k]!r})" for k in drifted),
+        )
+    return db[name]
+
+
+def is_subset(declared: Any, existing: Any) -> bool:
+    """声明的选项是否包含在已存在的选项中, 服务器可能补充未声明的默认选项"""
+    if isinstance(declared, dict):
+        return isinstance(existing, dict) and all(
+            is_subset(v, existing.get(k)) for k, v in declared.items()
+        )
+    return declared == existing
+
+
 async def init_index(model: type["Document"], *, revise_index: bool = False) -> None:
     """初始化文档索引"""
+    IndexAdvisor.reset(model)
     required = ["_id_"]
     if indexes := list(get_indexes(model)):
-        required += await model.__collection__.create_indexes(indexes)
+        try:
+            required += await model.__collection__.create_indexes(indexes)
+        except OperationFailure as e:
+            if not (revise_index and e.code in INDEX_CONFLICT_CODES):
+                raise
+            for index in indexes:
+                required.append(await rebuild_index(model.__collection__, index))
     if revise_index:
         index_info = await model.__collection__.index_information()
         for index in set(index_info) - set(required):
             await model.__collection__.drop_index(index)
 
 
+async def rebuild_index(collection: "Collection", index: "Index") -> str:
+    """创建索引, 如果已存在同名或同键的索引但选项不一致, 则修改或重建它"""
+    try:
+        return (await collection.create_indexes([index]))[0]
+    except OperationFailure as e:
+        if e.code not in INDEX_CONFLICT_CODES:
+            raise
+
+    declared = index.document
+    key = index_key(declared)
+    for name, info in (await collection.index_information()).items():
+        if name != declared["name"] and index_key(info) != key:
+            continue
+        if name == declared["name"] and is_same_index(declared, info):
+            # 仅隐藏状态不同时, 无需重建索引
+            await collection.database.command(
+                "collMod",
+                collection.name,
+                index={"name": name, "hidden": declared.get("hidden", False)},
+            )
+            return name
+        await collection.drop_index(name)
+    return (await collection.create_indexes([index]))[0]
+
+
+def index_key(spec: dict[str, Any]) -> dict[str, Any]:
+    """索引的键, 服务器上文本索引的 `_fts` 与 `_ftsx` 键将还原为声明的文本字段"""
+    key = dict(spec["key"])
+    if "_fts" not in key:
+        return key
+    restored: dict[str, Any] = {}
+    for k, v in key.items():
+        if k == "_fts":
+            restored |= dict.fromkeys(spec.get("weights", {}), "text")
+        elif k != "_ftsx":
+            restored[k] = v
+    return restored
+
+
+def is_same_index(declared: dict[str, Any], existing: dict[str, Any]) -> bool:
+    """
+    声明的索引与服务器上的索引定义是否一致, 不比较名称与隐藏状态。
+    服务器会补充排序规则的完整选项、文本索引的权重与语言、索引版本等字段,
+    声明的选项只需包含在已存在的选项中, 未声明的选项必须为服务器的默认值。
+    """
+    if index_key(declared) != index_key(existing):
+        return False
+    defaults: dict[str, Any] = {}
+    if weights := existing.get("weights"):
+        defaults |= TEXT_INDEX_DEFAULTS | {"weights": dict.fromkeys(weights, 1)}
+    for field in (declared.keys() | existing.keys()) - INDEX_IGNORED_FIELDS:
+        if field in declared:
+            if not is_subset(declared[field], existing.get(field)):
+                return False
+        elif field not in INDEX_VERSION_FIELDS and (
+            field not in defaults or existing[field] != defaults[field]
+        ):
+            return False
+    return True
+
+
 class Mango:
     _document_models: ClassVar[set[type["Document"]]] = set()
 
@@ -67,6 +185,20 @@ class Mango:
             if not clients or client in clients:
                 client.close()
 
+    @classmethod
+    async def aclose(cls, *clients: Client) -> None:
+        """写入使用这些连接的批量写入器中剩余的文档, 然后断开连接"""
+        targets = {client.client for client in clients}
+        writers = [
+            writer
+            for writer in BufferedWriter.active()
+            if not clients or writer.model.__collection__.database.client in targets
+        ]
+        try:
+            await asyncio.gather(*(writer.close() for writer in writers))
+        finally:
+            cls.disconnect(*clients)
+
     @classmethod
     def register_model(cls, model: type["Document"]) -> None:
         """注册模型"""
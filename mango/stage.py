@@ -1,23 +1,76 @@
+import copy
 from collections.abc import Mapping, Sequence
 from typing import Any, Literal, TypeAlias
 
+import bson
+from bson.codec_options import DEFAULT_CODEC_OPTIONS, CodecOptions
+from bson.raw_bson import RawBSONDocument
 from typing_extensions import Self
 
+from mango.expression import (
+    Expression,
+    ExpressionField,
+    Geometry,
+    compile_expression,
+    compile_filter,
+    to_geometry,
+)
 from mango.index import Order
+from mango.optimizer import OptimizeReport, optimize_stages
 
 SortOrder: TypeAlias = Order | Literal[1, -1]
 
+FieldName: TypeAlias = str | ExpressionField
+
+SUB_PIPELINE_FIELDS = {"$lookup": "pipeline", "$unionWith": "pipeline"}
+"""带有子管道的阶段及子管道所在的字段"""
+
 
 class Pipeline(list[Mapping[str, Any]]):
     """聚合管道阶段"""
 
     def __init__(self, *stages: Mapping[str, Any]) -> None:
         super().__init__(stages)
+        self.report: OptimizeReport | None = None
+        self._compiled: tuple[
+            list[Mapping[str, Any]], CodecOptions, list[RawBSONDocument]
+        ] | None = None
+
+    def compile(
+        self, codec_options: CodecOptions = DEFAULT_CODEC_OPTIONS
+    ) -> list[RawBSONDocument]:
+        """
+        将管道编码为 BSON 文档列表。
+        编码结果会被缓存, 只要管道的阶段内容与编码选项不变, 重复执行时将直接复用。
+        缓存保存编码时阶段的副本, 原地修改阶段后将重新编码。
+        """
+        if self._compiled:
+            stages, options, compiled = self._compiled
+            if options == codec_options and stages == self:
+                return compiled
+        compiled = [
+            RawBSONDocument(bson.encode(stage, codec_options=codec_options))
+            for stage in self
+        ]
+        self._compiled = (copy.deepcopy(list(self)), codec_options, compiled)
+        return compiled
+
+    def optimize(self) -> Self:
+        """
+        返回优化后的新管道，原管道保持不变。
+
+        在不改变结果的前提下，前移 `$match`，合并相邻的 `$match`、`$project`、`$set` 与 `$unset`，
+        并将 `$limit`/`$skip` 前移使 `$sort` 与 `$limit` 相邻。应用的优化与差异记录在新管道的 `report` 中。
+        """
+        report = optimize_stages(self)
+        optimized = self.__class__(*report.after)
+        optimized.report = report
+        return optimized
 
     def stage(self, key: str, value: Any) -> Self:
-        """添加一个阶段"""
+        """添加一个阶段, 其中的字段与表达式将被编译为 MongoDB 结构"""
         key = key if key.startswith("$") else f"${key}"
-        self.append({key: value})
+        self.append({key: compile_stage(key, value)})
         return self
 
     def bucket(
@@ -51,7 +104,7 @@ class Pipeline(list[Mapping[str, Any]]):
             struct["output"] = output
         return self.stage("bucket", struct)
 
-    def count(self, field: str) -> Self:
+    def count(self, field: FieldName) -> Self:
         """
         将文档传递到下一阶段，该阶段包含输入到该阶段的文档数量的计数。
 
@@ -59,6 +112,7 @@ class Pipeline(list[Mapping[str, Any]]):
 
         [$count (aggregation)](https://www.mongodb.com/docs/manual/reference/operator/aggregation/count/)
         """
+        field = str(field)
         if not field or field.startswith("$") or "." in field:
             raise ValueError("必须是非空字符串, 不能以 `$` 开头，也不能包含 `.` 字符。")
         return self.stage("count", field)
@@ -88,8 +142,8 @@ class Pipeline(list[Mapping[str, Any]]):
         self,
         output: Mapping[str, Any],
         partition_by: Any = None,
-        partition_by_fields: Sequence[str] | None = None,
-        sort_by: Mapping[str, SortOrder] | None = None,
+        partition_by_fields: Sequence[FieldName] | None = None,
+        sort_by: Mapping[FieldName, SortOrder] | None = None,
     ) -> Self:
         """
         填充文档中的空值和缺少的字段值。
@@ -109,11 +163,54 @@ class Pipeline(list[Mapping[str, Any]]):
         elif partition_by_fields:
             if isinstance(partition_by_fields, str):
                 raise TypeError("partition_by_fields 不能为字符串")
-            struct["partitionByFields"] = partition_by_fields
+            struct["partitionByFields"] = [str(f) for f in partition_by_fields]
         if sort_by:
-            struct["sortBy"] = sort_by
+            struct["sortBy"] = {str(k): v for k, v in sort_by.items()}
         return self.stage("fill", struct)
 
+    def geo_near(
+        self,
+        near: Geometry,
+        distance_field: FieldName,
+        spherical: bool = True,
+        max_distance: float | None = None,
+        min_distance: float | None = None,
+        query: Mapping[FieldName, Any] | Expression | None = None,
+        key: FieldName | None = None,
+        include_locs: FieldName | None = None,
+        distance_multiplier: float | None = None,
+    ) -> Self:
+        """
+        按与指定点的距离由近到远输出文档。`$geoNear` 必须是管道中的第一个阶段，且集合需要存在地理空间索引。
+
+        near: 查找最近文档的点，可以是 GeoJSON 点或 (经度, 纬度) 坐标。
+        distance_field: 保存计算距离的输出字段。
+        spherical: 是否使用球面几何计算距离。
+        max_distance: 最大距离，对于 GeoJSON 点单位为米。
+        min_distance: 最小距离，对于 GeoJSON 点单位为米。
+        query: 限制文档的查询条件，可以是映射或表达式，不能包含 `$near` 等地理空间查询。
+        key: 计算距离使用的地理空间索引字段，集合存在多个地理空间索引时必须指定。
+        include_locs: 保存用于计算距离的位置的输出字段。
+        distance_multiplier: 计算距离的乘数，可以用于转换距离的单位。
+
+        [$geoNear (aggregation)](https://www.mongodb.com/docs/manual/reference/operator/aggregation/geoNear/)
+        """
+        options = {
+            "maxDistance": max_distance,
+            "minDistance": min_distance,
+            "query": query and compile_filter(query),
+            "key": key and str(key),
+            "includeLocs": include_locs and str(include_locs),
+            "distanceMultiplier": distance_multiplier,
+        }
+        struct = {
+            "near": to_geometry(near),
+            "distanceField": str(distance_field),
+            "spherical": spherical,
+        }
+        struct |= {k: v for k, v in options.items() if v is not None}
+        return self.stage("geoNear", struct)
+
     def group(self, id: Any, **fields: Mapping[str, Any]) -> Self:
         """
         `$group` 阶段根据“组键”将文档分成多个组。
@@ -141,8 +238,8 @@ class Pipeline(list[Mapping[str, Any]]):
     def lookup(
         self,
         from_: str | None = None,
-        local_field: str | None = None,
-        foreign_field: str | None = None,
+        local_field: FieldName | None = None,
+        foreign_field: FieldName | None = None,
         let: Mapping[str, Any] | None = None,
         pipeline: Self | Sequence[Mapping[str, Any]] | None = None,
         as_: str | None = None,
@@ -166,32 +263,32 @@ class Pipeline(list[Mapping[str, Any]]):
                 k: v
                 for k, v in {
                     "from": from_,
-                    "localField": local_field,
-                    "foreignField": foreign_field,
+                    "localField": local_field and str(local_field),
+                    "foreignField": foreign_field and str(foreign_field),
                     "let": let,
                     "pipeline": pipeline,
                     "as": as_,
                 }.items()
-                if v is None
+                if v is not None
             },
         )
 
-    def match(self, query: Mapping[str, Any]) -> Self:
+    def match(self, *query: Mapping[FieldName, Any] | Expression) -> Self:
         """
         筛选文档流，仅将匹配指定条件的文档传递到下一个管道阶段。
 
-        query: 指定查询条件。
+        query: 指定查询条件，可以是映射或表达式，多个条件将被合并。
 
         [$match (aggregation)](https://www.mongodb.com/docs/manual/reference/operator/aggregation/match/)
         """
-        return self.stage("match", query)
+        return self.stage("match", compile_filter(*query))
 
     def merge(
         self,
         collection: str,
         database: str | None = None,
         let: Mapping[str, Any] | None = None,
-        on: str | Sequence[str] | None = None,
+        on: FieldName | Sequence[FieldName] | None = None,
         matched: Literal["replace", "keepExisting", "merge", "fail"]
         | Self
         | Sequence[Mapping[str, Any]] = "merge",
@@ -217,7 +314,11 @@ class Pipeline(list[Mapping[str, Any]]):
         if let:
             struct["let"] = let
         if on:
-            struct["on"] = on
+            struct["on"] = (
+                str(on)
+                if isinstance(on, str | ExpressionField)
+                else [str(i) for i in on]
+            )
         self.stage("merge", struct)
 
     def out(self, collection: str, database: str | None = None) -> Self:
@@ -233,15 +334,16 @@ class Pipeline(list[Mapping[str, Any]]):
             "out", {"db": database, "coll": collection} if database else collection
         )
 
-    def project(self, **fields: bool | Mapping[str, Any]) -> Self:
+    def project(self, *includes: FieldName, **fields: Any) -> Self:
         """
         将带有指定字段的文档传递到管道中的下一阶段。指定的字段可以是输入文档中的现有字段或新计算的字段。
 
+        includes: 需要包含的字段。
         fields: 参数名为指定传递的字段。参数如果为布尔值，则可以包含或排除字段；如果为表达式，则可以添加新字段或重置现有字段的值。
 
         [$project (aggregation)](https://www.mongodb.com/docs/manual/reference/operator/aggregation/project/)
         """
-        return self.stage("project", fields)
+        return self.stage("project", {**{str(f): True for f in includes}, **fields})
 
     def redact(self, expression: Any) -> Self:
         """
@@ -273,6 +375,18 @@ class Pipeline(list[Mapping[str, Any]]):
         """
         return self.stage("sample", {"size": size})
 
+    def search(self, index: str | None = None, **operator: Any) -> Self:
+        """
+        使用 Atlas Search 索引执行全文搜索。`$search` 必须是管道中的第一个阶段，仅在 MongoDB Atlas 上可用。
+
+        index: 使用的搜索索引名称，不指定则使用 `default` 索引。
+        operator: 参数名为搜索操作符或选项，如 `text`、`compound`、`highlight`。
+
+        [$search (aggregation)](https://www.mongodb.com/docs/atlas/atlas-search/query-syntax/)
+        """
+        struct = {"index": index, **operator} if index else operator
+        return self.stage("search", struct)
+
     def set(self, **fields: Any) -> Self:
         """
         向文档中添加新字段。输出包含来自输入文档的所有现有字段和新添加的字段的文档。
@@ -293,15 +407,22 @@ class Pipeline(list[Mapping[str, Any]]):
         """
         return self.stage("skip", integer)
 
-    def sort(self, **fields: SortOrder) -> Self:
+    def sort(
+        self, *orders: FieldName | tuple[FieldName, SortOrder], **fields: SortOrder
+    ) -> Self:
         """
         对所有输入文档进行排序，并按排序顺序将它们返回给管道。
 
+        orders: 字段或 (字段, 排序顺序) 元组，仅指定字段时按升序排序。
         field: 参数名为指定要排序的字段，参数为字段的排序顺序。最多可以按32个字段进行排序。
 
         [$sort (aggregation)](https://www.mongodb.com/docs/manual/reference/operator/aggregation/sort/)
         """
-        return self.stage("sort", fields)
+        struct: dict[str, SortOrder] = {}
+        for order in orders:
+            key, direction = order if isinstance(order, tuple) else (order, Order.ASC)
+            struct[str(key)] = direction
+        return self.stage("sort", struct | fields)
 
     def union(
         self,
@@ -322,7 +443,7 @@ class Pipeline(list[Mapping[str, Any]]):
             {"coll": collection, "pipeline": pipeline} if pipeline else collection,
         )
 
-    def unset(self, *fields: str) -> Self:
+    def unset(self, *fields: FieldName) -> Self:
         """
         从文档中移除/排除字段。
 
@@ -330,15 +451,18 @@ class Pipeline(list[Mapping[str, Any]]):
 
         [$unset (aggregation)](https://www.mongodb.com/docs/manual/reference/operator/aggregation/unset/)
         """
-        return self.stage("unset", fields)
+        return self.stage("unset", [str(f) for f in fields])
 
     def unwind(
-        self, path: str, index_field: str | None = None, preserve_empty: bool = False
+        self,
+        path: FieldName,
+        index_field: str | None = None,
+        preserve_empty: bool = False,
     ) -> Self:
         """
         从输入文档中解构数组字段以输出每个元素的文档。每个输出文档都是输入文档，数组字段的值由元素替换。
 
-        path: 数组字段的字段路径。若要指定字段路径，请在字段名开头加上符号 `$`。
+        path: 数组字段的字段路径。若要指定字段路径，请在字段名开头加上符号 `$`，或直接传入字段。
         index_field: 保存元素数组索引的新字段的名称。名称不能以符号 `$` 开头。
         preserve_empty: 在文档中的指定字段路径为 null、不存在或为空数组的情况下，如果该值为 `True`，则 `$unwind` 将输出文档，否则不会输出文档。
 
@@ -351,3 +475,24 @@ class Pipeline(list[Mapping[str, Any]]):
         if index_field:
             struct["includeArrayIndex"] = index_field
         return self.stage("unwind", struct)
+
+
+def compile_stage(key: str, value: Any) -> Any:
+    """编译阶段的定义, `$match` 编译为查询条件, 子管道中的阶段按各自的类型编译"""
+    if key == "$match":
+        return compile_filter(value)
+    if key == "$facet":
+        return {str(k): compile_pipeline(v) for k, v in value.items()}
+    if (field := SUB_PIPELINE_FIELDS.get(key)) and isinstance(value, Mapping):
+        return {
+            str(k): compile_pipeline(v) if k == field else compile_expression(v)
+            for k, v in value.items()
+        }
+    return compile_expression(value)
+
+
+def compile_pipeline(stages: Sequence[Mapping[str, Any]]) -> list[Mapping[str, Any]]:
+    """编译子管道, 由 `Pipeline` 构建的阶段已被编译"""
+    if isinstance(stages, Pipeline):
+        return list(stages)
+    return [{k: compile_stage(k, v) for k, v in stage.items()} for stage in stages]
@@ -0,0 +1,202 @@
+import asyncio
+import os
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import AsyncGenerator, Iterable, Mapping
+from dataclasses import dataclass
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    ClassVar,
+    Generic,
+    Literal,
+    TypeAlias,
+    TypeVar,
+)
+
+from bson import json_util
+
+from mango.expression import Expression, compile_filter
+
+if TYPE_CHECKING:  # pragma: no cover
+    from bson import Timestamp
+    from motor.motor_asyncio import AsyncIOMotorChangeStream
+
+    from mango.models import Document
+    from mango.result import FindMapping
+
+T_Model = TypeVar("T_Model", bound="Document")
+
+ResumeToken: TypeAlias = Mapping[str, Any]
+
+FullDocument: TypeAlias = Literal[
+    "default", "updateLookup", "whenAvailable", "required"
+]
+
+FullDocumentBeforeChange: TypeAlias = Literal["off", "whenAvailable", "required"]
+
+
+@dataclass
+class ChangeEvent(Generic[T_Model]):
+    operation: str
+    """变更类型, 如 insert、update、replace、delete"""
+    document_key: dict[str, Any]
+    """变更文档的主键"""
+    document: T_Model | None
+    """变更后的完整文档, 删除事件中为 `None`"""
+    update: dict[str, Any] | None
+    """更新事件中被更新与移除的字段"""
+    cluster_time: "Timestamp | None"
+    """变更发生的集群时间"""
+    token: ResumeToken
+    """该事件的恢复令牌"""
+    raw: dict[str, Any]
+    """原始的变更事件"""
+
+    @classmethod
+    def from_change(
+        cls, model: type[T_Model], change: dict[str, Any]
+    ) -> "ChangeEvent[T_Model]":
+        full_document = change.get("fullDocument")
+        return cls(
+            operation=change["operationType"],
+            document_key=change.get("documentKey", {}),
+            document=model.from_doc(dict(full_document)) if full_document else None,
+            update=change.get("updateDescription"),
+            cluster_time=change.get("clusterTime"),
+            token=change["_id"],
+            raw=change,
+        )
+
+
+class TokenStore(ABC):
+    """恢复令牌存储, 子类实现令牌的持久化"""
+
+    @abstractmethod
+    async def load(self, key: str) -> ResumeToken | None:
+        """读取变更流最后处理的恢复令牌, 不存在时返回 `None`"""
+
+    @abstractmethod
+    async def save(self, key: str, token: ResumeToken) -> None:
+        """保存变更流最后处理的恢复令牌"""
+
+
+class FileTokenStore(TokenStore):
+    """
+    将恢复令牌保存在本地 JSON 文件中。
+    多个变更流可以共享同一个文件, 对同一文件的读取、修改与写入是互斥的。
+    """
+
+    _locks: ClassVar[dict[Path, threading.Lock]] = {}
+
+    def __init__(self, path: str | os.PathLike[str]) -> None:
+        self.path = Path(path)
+        self._lock = self._locks.setdefault(self.path.resolve(), threading.Lock())
+
+    async def load(self, key: str) -> ResumeToken | None:
+        return (await asyncio.to_thread(self._read)).get(key)
+
+    async def save(self, key: str, token: ResumeToken) -> None:
+        await asyncio.to_thread(self._write, key, token)
+
+    def _read(self) -> dict[str, Any]:
+        if not self.path.exists():
+            return {}
+        return json_util.loads(self.path.read_text(encoding="utf-8"))
+
+    def _write(self, key: str, token: ResumeToken) -> None:
+        with self._lock:
+            tokens = self._read()
+            tokens[key] = token
+            temp = self.path.with_suffix(f"{self.path.suffix}.tmp")
+            temp.write_text(json_util.dumps(tokens), encoding="utf-8")
+            temp.replace(self.path)
+
+
+def prefix_fields(query: Mapping[str, Any], prefix: str) -> dict[str, Any]:
+    """为查询条件中的字段路径添加前缀"""
+    prefixed: dict[str, Any] = {}
+    for key, value in query.items():
+        if key in {"$and", "$or", "$nor"}:
+            prefixed[key] = [prefix_fields(sub, prefix) for sub in value]
+        elif key.startswith("$"):
+            prefixed[key] = value
+        else:
+            prefixed[f"{prefix}.{key}"] = value
+    return prefixed
+
+
+class ChangeStream(Generic[T_Model]):
+    def __init__(
+        self,
+        model: type[T_Model],
+        *filter: "FindMapping | Expression",
+        operations: Iterable[str] | None = None,
+        batch_size: int = 100,
+        max_await_ms: int | None = None,
+        full_document: FullDocument = "updateLookup",
+        full_document_before_change: FullDocumentBeforeChange | None = None,
+        store: TokenStore | None = None,
+        name: str | None = None,
+    ) -> None:
+        """
+        filter: 过滤变更后完整文档的映射或表达式。
+        operations: 仅接收指定类型的变更。
+        batch_size: 每批次最多交付的事件数量。
+        max_await_ms: 等待新事件的最长时间。
+        full_document: 更新事件中完整文档的获取方式。
+        full_document_before_change: 变更前完整文档 (前像) 的获取方式, 需要集合启用
+        `changeStreamPreAndPostImages`, 前像保存在原始事件的 `fullDocumentBeforeChange` 中。
+        store: 恢复令牌存储, 每批次处理完成后保存令牌, 重启时从该令牌继续。
+        name: 令牌存储的键名, 同一集合存在多个消费者时用于区分, 默认为集合的完整名称。
+        """
+        self.model = model
+        self.collection = model.__collection__
+        self._filter = filter
+        self.operations = list(operations) if operations else None
+        self.batch_size = batch_size
+        self.max_await_ms = max_await_ms
+        self.full_document = full_document
+        self.full_document_before_change = full_document_before_change
+        self.store = store
+        self.name = name or self.collection.full_name
+
+    async def __aiter__(self) -> AsyncGenerator[ChangeEvent[T_Model], None]:
+        """`async for`: 异步迭代变更事件"""
+        async for batch in self.batches():
+            for event in batch:
+                yield event
+
+    @property
+    def pipeline(self) -> list[dict[str, Any]]:
+        """变更流的聚合管道"""
+        query = prefix_fields(compile_filter(*self._filter), "fullDocument")
+        if self.operations:
+            query["operationType"] = {"$in": self.operations}
+        return [{"$match": query}] if query else []
+
+    async def open(self) -> "AsyncIOMotorChangeStream":
+        """打开变更流, 如果存在已保存的恢复令牌, 则从该令牌继续"""
+        token = await self.store.load(self.name) if self.store else None
+        return self.collection.watch(
+            self.pipeline,
+            full_document=self.full_document,
+            full_document_before_change=self.full_document_before_change,
+            resume_after=token,
+            max_await_time_ms=self.max_await_ms,
+            batch_size=self.batch_size,
+        )
+
+    async def batches(self) -> AsyncGenerator[list[ChangeEvent[T_Model]], None]:
+        """按批次异步迭代变更事件, 一个批次包含当前已到达且不超过 `batch_size` 的事件"""
+        async with await self.open() as stream:
+            while stream.alive:
+                changes = [await stream.next()]
+                while len(changes) < self.batch_size:
+                    if (change := await stream.try_next()) is None:
+                        break
+                    changes.append(change)
+                yield [ChangeEvent.from_change(self.model, c) for c in changes]
+                if self.store:
+                    await self.store.save(self.name, stream.resume_token)
@@ -0,0 +1,171 @@
+import asyncio
+import mmap
+import os
+import struct
+from collections.abc import Generator, Iterable
+from concurrent.futures import Executor, ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Literal, TypeAlias, get_args
+
+import bson
+from bson import json_util
+from bson.raw_bson import RawBSONDocument
+
+from mango.cache import invalidate
+from mango.compat import ValidationError
+from mango.expression import Expression, compile_filter
+
+if TYPE_CHECKING:  # pragma: no cover
+    from mango.models import Document
+    from mango.result import FindMapping
+
+TransferFormat: TypeAlias = Literal["bson", "jsonl"]
+
+FORMATS = get_args(TransferFormat)
+
+StrPath: TypeAlias = str | os.PathLike[str]
+
+DEFAULT_BATCH_SIZE = 1000
+
+JSON_OPTIONS = json_util.CANONICAL_JSON_OPTIONS
+"""JSONL 使用规范格式的扩展 JSON, 以便无损地还原 BSON 类型"""
+
+_length = struct.Struct("<i")
+
+
+def iter_bson(buffer: mmap.mmap) -> Generator[bytes, None, None]:
+    """逐个切分连续存放的 BSON 文档"""
+    offset, size = 0, len(buffer)
+    while offset < size:
+        (length,) = _length.unpack_from(buffer, offset)
+        if length < _length.size or offset + length > size:
+            raise ValueError(f"BSON 文件在偏移 {offset} 处已损坏")
+        yield buffer[offset : offset + length]
+        offset += length
+
+
+def iter_jsonl(buffer: mmap.mmap) -> Generator[bytes, None, None]:
+    """逐行读取扩展 JSON 文档, 并编码为 BSON"""
+    for line in iter(buffer.readline, b""):
+        if line := line.strip():
+            yield bson.encode(json_util.loads(line, json_options=JSON_OPTIONS))
+
+
+def resolve_format(path: StrPath, format: str | None) -> TransferFormat:
+    """检查文件格式, 未指定时根据扩展名推断, `.jsonl` 与 `.json` 为 JSONL, 其余为 BSON"""
+    if format is None:
+        return "jsonl" if Path(path).suffix in {".jsonl", ".json"} else "bson"
+    if format not in FORMATS:
+        raise ValueError(f"未知的文件格式: {format}, 应为 {', '.join(FORMATS)}")
+    return format  # type: ignore
+
+
+def batched(items: Iterable[bytes], size: int) -> Generator[list[bytes], None, None]:
+    batch: list[bytes] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def validate_batch(model: type["Document"], batch: list[bytes]) -> list[str]:
+    """使用模型验证一批 BSON 文档, 返回验证失败的错误信息"""
+    errors = []
+    for raw in batch:
+        try:
+            model.from_doc(bson.decode(raw, codec_options=model.__encoder__))
+        except ValidationError as e:
+            errors.append(str(e))
+    return errors
+
+
+async def export_model(
+    model: type["Document"],
+    path: StrPath,
+    *filter: "FindMapping | Expression",
+    format: TransferFormat | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """将集合中符合条件的文档导出到文件, 返回导出的文档数量"""
+    resolved = resolve_format(path, format)
+    codec_options = model.__encoder__.with_options(document_class=RawBSONDocument)
+    collection = model.__collection__.with_options(codec_options=codec_options)
+    cursor = collection.find(compile_filter(*filter), batch_size=batch_size)
+    count = 0
+    with Path(path).open("wb") as file:
+        while documents := await cursor.to_list(length=batch_size):
+            await asyncio.to_thread(write_batch, file, documents, resolved)
+            count += len(documents)
+    return count
+
+
+def write_batch(
+    file: BinaryIO, documents: list[RawBSONDocument], format: TransferFormat
+) -> None:
+    if format == "bson":
+        file.writelines(document.raw for document in documents)
+    else:
+        file.writelines(
+            f"{json_util.dumps(document, json_options=JSON_OPTIONS)}\n".encode()
+            for document in documents
+        )
+
+
+async def import_model(
+    model: type["Document"],
+    path: StrPath,
+    format: TransferFormat | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    validate: bool = False,
+    workers: int | None = None,
+) -> int:
+    """
+    将文件中的文档导入集合, 返回导入的文档数量。
+    文件的读取、解析与验证在线程池中执行, 不会阻塞事件循环。
+    """
+    reader = iter_bson if resolve_format(path, format) == "bson" else iter_jsonl
+    loop = asyncio.get_running_loop()
+    workers = workers or os.cpu_count() or 1
+    count = 0
+    with Path(path).open("rb") as file, ThreadPoolExecutor(workers) as executor:
+        if not os.fstat(file.fileno()).st_size:
+            return 0
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            batches = batched(reader(buffer), batch_size)
+            while batch := await loop.run_in_executor(executor, next, batches, None):
+                if validate:
+                    await raise_invalid(loop, executor, workers, model, batch, count)
+                try:
+                    await model.__collection__.insert_many(
+                        [RawBSONDocument(raw) for raw in batch], ordered=False
+                    )
+                finally:
+                    invalidate(model)
+                count += len(batch)
+    return count
+
+
+async def raise_invalid(
+    loop: asyncio.AbstractEventLoop,
+    executor: Executor,
+    workers: int,
+    model: type["Document"],
+    batch: list[bytes],
+    offset: int,
+) -> None:
+    """在线程池中分块验证一批文档, 存在验证失败的文档时引发异常"""
+    chunk = max(len(batch) // workers, 1)
+    results = await asyncio.gather(
+        *(
+            loop.run_in_executor(executor, validate_batch, model, batch[i : i + chunk])
+            for i in range(0, len(batch), chunk)
+        )
+    )
+    if errors := [error for result in results for error in result]:
+        raise ValueError(
+            f"第 {offset + 1} 至 {offset + len(batch)} 个文档中有 {len(errors)} 个验证失败, "
+            f"已导入 {offset} 个文档:\n{errors[0]}"
+        )
@@ -1,11 +1,15 @@
 import re
-from collections.abc import Callable, Generator, Iterable, Sequence
+from collections.abc import Callable, Generator, Iterable, Mapping, Sequence
 from types import UnionType
 from typing import TYPE_CHECKING, Any
 
-import pydantic
-from pydantic.fields import ModelField
-
+from mango.compat import (
+    ROOT_KEY,
+    SHAPE_SINGLETON,
+    ErrorWrapper,
+    ModelField,
+    ValidationError,
+)
 from mango.fields import FieldInfo
 from mango.index import Index, IndexType
 
@@ -19,6 +23,15 @@ def to_snake_case(string: str) -> str:
     return re.sub("([a-z0-9])([A-Z])", r"\1_\2", tmp).lower()
 
 
+def get_path(data: Mapping[str, Any], path: str) -> Any:
+    """获取嵌套映射中指定路径的值, 路径不存在时返回 `None`"""
+    for key in path.split("."):
+        if not isinstance(data, Mapping):
+            return None
+        data = data.get(key)  # type: ignore
+    return data
+
+
 def all_check(
     iter_obj: Iterable[object],
     type_or_func: type
@@ -59,26 +72,79 @@ def is_sequence(
 
 
 def validate_fields(
-    model: type["Document"], input_data: dict[str, Any]
+    model: type["Document"],
+    input_data: dict[str, Any],
+    base: Mapping[str, Any] | None = None,
 ) -> dict[str, Any]:
-    """验证模型的指定字段"""
+    """
+    验证模型的指定字段, 直接使用模型已编译的字段验证器。
+    指定 `base` 时, 模型的根验证器将在 `base` 与这些字段合并后的值上执行,
+    `base` 通常为实例当前的值; 批量更新没有完整的文档, 不执行根验证器。
+    """
     if miss := set(input_data) - set(model.__fields__):
         raise ValueError(f"这些字段在 {model.__name__} 中不存在: {miss}")
 
-    fields = {
-        k: (v.outer_type_, v.field_info)
-        for k, v in model.__fields__.items()
-        if k in input_data
-    }
-    new_model = pydantic.create_model(model.__name__, **fields)
-    values, _, validation_error = pydantic.validate_model(new_model, input_data)
+    data = {**(base or {}), **input_data}
+    if base is not None:
+        data = pre_root_validate(model, data)
+
+    values = dict(base or {})
+    errors: list[Any] = []
+    for name in input_data:
+        field = model.__fields__[name]
+        validated, error = field.validate(
+            data[name], values, loc=field.alias, cls=model
+        )
+        if error:
+            errors.append(error)
+        else:
+            values[name] = validated
+
+    if base is not None:
+        values = post_root_validate(model, values, errors)
+
+    if errors:
+        raise ValidationError(errors, model)  # type: ignore
+
+    return {name: values[name] for name in input_data}
 
-    if validation_error:
-        raise validation_error
 
+def pre_root_validate(model: type[Any], data: dict[str, Any]) -> dict[str, Any]:
+    """执行模型的前置根验证器"""
+    for validator in model.__pre_root_validators__:
+        try:
+            data = validator(model, data)
+        except (ValueError, TypeError, AssertionError) as e:
+            raise ValidationError([ErrorWrapper(e, loc=ROOT_KEY)], model) from e
+    return data
+
+
+def post_root_validate(
+    model: type[Any], values: dict[str, Any], errors: list[Any]
+) -> dict[str, Any]:
+    """执行模型的后置根验证器, 验证错误将添加到 `errors` 中"""
+    for skip_on_failure, validator in model.__post_root_validators__:
+        if skip_on_failure and errors:
+            continue
+        try:
+            values = validator(model, values)
+        except (ValueError, TypeError, AssertionError) as e:
+            errors.append(ErrorWrapper(e, loc=ROOT_KEY))
     return values
 
 
+def validate_value(
+    model: type[Any], field: ModelField, value: Any, *, item: bool = True
+) -> Any:
+    """使用模型字段验证单个值, 当 `item` 为真时, 序列字段将验证其元素"""
+    if item and field.shape != SHAPE_SINGLETON and field.sub_fields:
+        field = field.sub_fields[0]
+    validated, errors = field.validate(value, {}, loc=field.name)
+    if errors:
+        raise ValidationError([errors], model)  # type: ignore
+    return validated
+
+
 def add_fields(model: type["Document"], **field_definitions: Any) -> None:
     """动态添加字段
 
@@ -117,23 +183,24 @@ def add_fields(model: type["Document"], **field_definitions: Any) -> None:
 
 def get_indexes(model: type["Document"]) -> Generator[Index, None, None]:
     """获取模型中定义的索引, 包括字段与元配置"""
+    by_alias = model.__meta__.by_alias
     for name, field in model.__fields__.items():
         finfo = field.field_info
-        if isinstance(finfo, FieldInfo):
-            if index := finfo.index:
-                if index is True:
-                    yield Index(name)
-                elif isinstance(index, IndexType):
-                    yield Index((name, index))
-                else:
-                    yield index
-            elif (expire := finfo.expire) is not None:
-                yield Index(name, expireAfterSeconds=expire)
+        if not isinstance(finfo, FieldInfo):
+            continue
+        index = finfo.index
+        if isinstance(index, Index):
+            yield index
+        elif (options := finfo.index_options()) or index:
+            key = field.alias if by_alias else name
+            yield Index(
+                (key, index) if isinstance(index, IndexType) else key, **options
+            )
 
     for index in model.__meta__.indexes:
-        if isinstance(index, str):
-            yield Index(index)
-        elif isinstance(index, Sequence):
+        if isinstance(index, Index):
+            yield index
+        elif isinstance(index, Sequence) and not isinstance(index, str):
             yield Index(*index)
         else:
-            yield index
+            yield Index(index)
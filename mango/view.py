@@ -0,0 +1,205 @@
+from collections.abc import Iterable, Mapping, Sequence
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, ClassVar
+
+from bson import ObjectId
+
+from mango.cache import invalidate
+from mango.meta import MetaConfig
+from mango.models import Document
+from mango.stage import Pipeline
+from mango.stream import ChangeEvent, ChangeStream, TokenStore
+from mango.utils import get_path
+
+if TYPE_CHECKING:  # pragma: no cover
+    from motor.motor_asyncio import AsyncIOMotorCollection
+
+STATE_COLLECTION = "mango_views"
+"""保存视图刷新进度的集合"""
+
+REFRESH_FIELD = "_refreshed"
+"""视图文档中记录最后一次刷新的字段, 用于移除不再产生的文档"""
+
+
+class ViewMeta(MetaConfig):
+    source: ClassVar[type[Document] | None] = None
+    pipeline: ClassVar[Sequence[Mapping[str, Any]]] = []
+    key: ClassVar[str] = "_id"
+    watermark: ClassVar[str | None] = None
+
+
+@dataclass
+class RefreshReport:
+    full: bool = False
+    """是否为完整刷新"""
+    keys: int = 0
+    """重新计算的键数量, 完整刷新时为 0"""
+    watermark: Any = None
+    """刷新后的水位"""
+
+
+class MaterializedView(Document):
+    """
+    物化视图。
+    视图文档由源模型的聚合管道计算, 通过 `$merge` 写入视图集合, 之后可以像普通模型一样查询与建立索引。
+
+    在 `Meta` 中声明:
+    source: 源模型。
+    pipeline: 应用于源文档的聚合管道, 输出文档的 `_id` 必须为 `key` 字段的值。
+    key: 源文档中决定视图文档 `_id` 的字段路径, 如分组的字段, 默认为 `_id`。
+    watermark: 源文档中单调递增的字段, 如更新时间, 用于增量刷新。
+
+    增量刷新只对发生变化的源文档的键重新执行管道。
+    删除源文档或修改其 `key` 字段的变化无法通过水位发现, 需要定期完整刷新或使用 `follow`。
+    """
+
+    Meta = ViewMeta
+
+    if TYPE_CHECKING:  # pragma: no cover
+        __meta__: ClassVar[type[ViewMeta]]
+
+    @classmethod
+    async def refresh(cls, full: bool = False, batch_size: int = 1000) -> RefreshReport:
+        """
+        刷新视图。
+        声明了水位且已存在刷新进度时, 仅重新计算水位及之后变化的源文档的键, 否则完整刷新。
+        完整刷新移除刷新标记早于本次刷新的文档, 刷新标记为 `ObjectId`, 仅精确到秒,
+        与 `follow` 并发时, 同一秒内开始的键刷新结果仍可能被移除, 将在该键下次变化时重新计算。
+
+        full: 强制完整刷新。
+        batch_size: 每次重新计算的键数量。
+        """
+        meta = cls.__meta__
+        state = await cls._state().find_one({"_id": cls._state_key()}) or {}
+        if full or not meta.watermark or "watermark" not in state:
+            return await cls._refresh_full()
+
+        source = cls._source()
+        report = RefreshReport(watermark=state["watermark"])
+        pipeline = Pipeline(
+            # 与水位相等的文档可能在上次刷新之后写入, 重新计算键是幂等的
+            {"$match": {meta.watermark: {"$gte": report.watermark}}},
+            {
+                "$group": {
+                    "_id": f"${meta.key}",
+                    "watermark": {"$max": f"${meta.watermark}"},
+                }
+            },
+        )
+        keys: list[Any] = []
+        async for group in source.aggregate(pipeline).cursor:
+            keys.append(group["_id"])
+            report.watermark = max(report.watermark, group["watermark"])
+            if len(keys) >= batch_size:
+                await cls._refresh_keys(keys)
+                report.keys += len(keys)
+                keys = []
+        if keys:
+            await cls._refresh_keys(keys)
+            report.keys += len(keys)
+        await cls._save_state(watermark=report.watermark)
+        return report
+
+    @classmethod
+    async def follow(
+        cls,
+        store: TokenStore | None = None,
+        batch_size: int = 100,
+        max_await_ms: int | None = None,
+    ) -> None:
+        """
+        跟随源集合的变更流持续刷新视图, 每批次变更仅重新计算受影响的键。
+        `key` 不为 `_id` 时, 删除与键的修改需要从变更前的文档得到原来的键,
+        源集合必须启用 `changeStreamPreAndPostImages`, 否则变更流将报错。
+
+        store: 恢复令牌存储, 重启时从上次处理完成的变更继续。
+        batch_size: 每批次最多处理的变更数量。
+        max_await_ms: 等待新变更的最长时间。
+        """
+        stream = ChangeStream(
+            cls._source(),
+            batch_size=batch_size,
+            full_document_before_change=(
+                None if cls.__meta__.key == "_id" else "required"
+            ),
+            max_await_ms=max_await_ms,
+            store=store,
+            name=f"view:{cls._state_key()}",
+        )
+        async for batch in stream.batches():
+            if keys := list(dict.fromkeys(cls._changed_keys(batch))):
+                await cls._refresh_keys(keys)
+
+    @classmethod
+    def _changed_keys(cls, events: Iterable[ChangeEvent[Any]]) -> Iterable[Any]:
+        key = cls.__meta__.key
+        for event in events:
+            if key == "_id":
+                yield event.document_key["_id"]
+                continue
+            for image in ("fullDocumentBeforeChange", "fullDocument"):
+                if document := event.raw.get(image):
+                    yield get_path(document, key)
+
+    @classmethod
+    async def _refresh_full(cls) -> RefreshReport:
+        meta = cls.__meta__
+        report = RefreshReport(full=True)
+        if meta.watermark:
+            # 先读取水位, 刷新期间发生的变化将在下次增量刷新时处理
+            latest = await cls._source().__collection__.find_one(
+                {meta.watermark: {"$exists": True}},
+                {meta.watermark: 1},
+                sort=[(meta.watermark, -1)],
+            )
+            report.watermark = latest and get_path(latest, meta.watermark)
+        run = await cls._merge(Pipeline())
+        # 仅删除早于本次刷新的文档, 保留并发的 `follow` 在刷新期间合并的文档
+        await cls.__collection__.delete_many({REFRESH_FIELD: {"$not": {"$gte": run}}})
+        invalidate(cls)
+        if report.watermark is not None:
+            await cls._save_state(watermark=report.watermark)
+        return report
+
+    @classmethod
+    async def _refresh_keys(cls, keys: list[Any]) -> None:
+        """重新计算指定键的视图文档, 并移除不再产生的文档"""
+        run = await cls._merge(Pipeline({"$match": {cls.__meta__.key: {"$in": keys}}}))
+        await cls.__collection__.delete_many(
+            {"_id": {"$in": keys}, REFRESH_FIELD: {"$ne": run}}
+        )
+        invalidate(cls)
+
+    @classmethod
+    async def _merge(cls, pipeline: Pipeline) -> ObjectId:
+        """在源集合上执行视图管道, 并将结果合并到视图集合, 返回本次刷新的标记"""
+        run = ObjectId()
+        pipeline.extend(cls.__meta__.pipeline)
+        pipeline.set(**{REFRESH_FIELD: run})
+        pipeline.merge(
+            cls.__collection__.name,
+            database=cls.__collection__.database.name,
+            matched="replace",
+        )
+        await cls._source().aggregate(pipeline)
+        return run
+
+    @classmethod
+    def _source(cls) -> type[Document]:
+        if (source := cls.__meta__.source) is None:
+            raise TypeError(f"{cls.__name__} 未声明源模型")
+        return source
+
+    @classmethod
+    def _state(cls) -> "AsyncIOMotorCollection":
+        return cls.__collection__.database[STATE_COLLECTION]
+
+    @classmethod
+    def _state_key(cls) -> str:
+        return cls.__collection__.full_name
+
+    @classmethod
+    async def _save_state(cls, **state: Any) -> None:
+        await cls._state().update_one(
+            {"_id": cls._state_key()}, {"$set": state}, upsert=True
+        )
@@ -0,0 +1,153 @@
+import asyncio
+import contextlib
+import logging
+from typing import TYPE_CHECKING, Any, ClassVar, Generic, TypeAlias, TypeVar
+
+from pymongo.errors import BulkWriteError, WriteError
+
+from mango.cache import invalidate
+
+if TYPE_CHECKING:  # pragma: no cover
+    from mango.models import Document
+
+T_Model = TypeVar("T_Model", bound="Document")
+
+logger = logging.getLogger(__name__)
+
+Pending: TypeAlias = tuple[dict[str, Any], T_Model, asyncio.Future[T_Model]]
+
+
+class BufferedWriter(Generic[T_Model]):
+    """
+    后台批量插入文档。
+    文档进入队列后由后台任务合并为无序的 `insert_many` 批次写入,
+    批次达到 `max_batch` 或等待超过 `max_delay_ms` 时写入。
+    """
+
+    _active: ClassVar[set["BufferedWriter[Any]"]] = set()
+
+    def __init__(
+        self,
+        model: type[T_Model],
+        max_batch: int = 1000,
+        max_delay_ms: float = 50,
+        max_queue: int = 10000,
+    ) -> None:
+        """
+        max_batch: 每批次最多写入的文档数量。
+        max_delay_ms: 第一个文档进入批次后最多等待的毫秒数。
+        max_queue: 队列的最大长度, 队列已满时 `insert` 将等待, 以限制写入速度。
+        """
+        if max_batch < 1:
+            raise ValueError("max_batch 必须大于 0")
+        self.model = model
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self._queue: asyncio.Queue[Pending[T_Model]] = asyncio.Queue(max_queue)
+        self._task: asyncio.Task[None] | None = None
+        self._closed = False
+
+    async def __aenter__(self) -> "BufferedWriter[T_Model]":
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        await self.close()
+
+    @classmethod
+    def active(cls) -> set["BufferedWriter[Any]"]:
+        """正在运行的写入器"""
+        return set(cls._active)
+
+    @property
+    def pending(self) -> int:
+        """尚未写入的文档数量"""
+        return self._queue.qsize()
+
+    async def insert(self, document: T_Model) -> "asyncio.Future[T_Model]":
+        """
+        将文档加入队列, 返回写入确认的 future, 写入成功时其结果为文档本身。
+        文档在加入队列时序列化, 之后对文档的修改不会被写入。
+        """
+        if self._closed:
+            raise RuntimeError("写入器已关闭")
+        future: asyncio.Future[T_Model] = asyncio.get_running_loop().create_future()
+        await self._queue.put((document.doc(), document, future))
+        self._start()
+        return future
+
+    async def flush(self) -> None:
+        """等待队列中的全部文档写入完成"""
+        if self._task:
+            await self._queue.join()
+
+    async def close(self) -> None:
+        """写入剩余的文档并停止后台任务"""
+        self._closed = True
+        await self.flush()
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        self._active.discard(self)
+
+    def _start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            self._active.add(self)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                if (timeout := deadline - loop.time()) <= 0:
+                    break
+                if (pending := await self._get(timeout)) is None:
+                    break
+                batch.append(pending)
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _get(self, timeout: float) -> Pending[T_Model] | None:
+        """
+        在超时前从队列中取出一个文档, 超时时返回 `None`。
+        `asyncio.wait_for` 在超时与取出同时发生时会丢弃已取出的文档,
+        这里只取消尚未完成的 `get`, 未完成的 `get` 不会从队列中移除文档。
+        """
+        getter = asyncio.ensure_future(self._queue.get())
+        try:
+            done, _ = await asyncio.wait({getter}, timeout=timeout)
+        finally:
+            getter.cancel()
+        return getter.result() if getter in done else None
+
+    async def _write(self, batch: list[Pending[T_Model]]) -> None:
+        errors: dict[int, Exception] = {}
+        try:
+            await self.model.__collection__.insert_many(
+                [document for document, _, _ in batch], ordered=False
+            )
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                errors[error["index"]] = WriteError(
+                    error.get("errmsg"), error.get("code"), error
+                )
+        except Exception as e:
+            logger.warning("批量写入 %s 失败: %s", self.model.__name__, e)
+            errors = dict.fromkeys(range(len(batch)), e)
+        invalidate(self.model)
+        for i, (_, instance, future) in enumerate(batch):
+            if future.done():
+                continue
+            if error := errors.get(i):
+                future.set_exception(error)
+            else:
+                future.set_result(instance)
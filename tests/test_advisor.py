@@ -0,0 +1,125 @@
+import logging
+from collections.abc import Iterator
+from typing import Any
+
+import pytest
+
+from mango import Document, Field, Index, IndexAdvisor
+from mango.advisor import IndexAdviceError, is_equality
+from mango.utils import add_fields
+
+
+class Order(Document):
+    customer: str = Field(index=True)
+    status: str
+    total: int
+    created: int
+
+    class Meta:
+        indexes = (("status", ("created", Index.DESC), "total"),)
+
+
+@pytest.fixture(autouse=True)
+def _advisor() -> Iterator[None]:
+    yield
+    IndexAdvisor.disable()
+    IndexAdvisor.reset()
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        ("a", True),
+        ({"a": 1}, True),
+        ({"$eq": 1}, True),
+        ({"$in": [1]}, True),
+        ({"$in": [1, 2]}, False),
+        ({"$gt": 1}, False),
+        ({"$eq": 1, "$ne": 2}, False),
+    ],
+)
+def test_is_equality(value: Any, expected: bool) -> None:
+    assert is_equality(value) is expected
+
+
+def test_analyze_covered_by_index() -> None:
+    advice = IndexAdvisor.analyze(
+        Order, {"status": "paid"}, [("created", -1)], {"status": 1, "_id": 0}
+    )
+    assert advice.ok
+    assert advice.index == [("status", 1), ("created", -1), ("total", 1)]
+    assert advice.covered
+
+
+def test_analyze_reverse_sort() -> None:
+    advice = IndexAdvisor.analyze(Order, {"status": "paid"}, [("created", 1)])
+    assert advice.ok
+    assert not advice.covered
+
+
+def test_analyze_projection_not_covered() -> None:
+    advice = IndexAdvisor.analyze(
+        Order, {"status": "paid"}, projection={"status": 1, "customer": 1}
+    )
+    assert advice.ok
+    assert not advice.covered
+
+
+def test_analyze_in_memory_sort() -> None:
+    advice = IndexAdvisor.analyze(Order, {"customer": "a"}, [("created", 1)])
+    assert not advice.collection_scan
+    assert advice.in_memory_sort
+    assert advice.suggestion
+    assert list(advice.suggestion.document["key"]) == ["customer", "created"]
+
+
+def test_analyze_suggests_esr_order() -> None:
+    advice = IndexAdvisor.analyze(
+        Order, {"total": {"$gt": 10}, "created": 1}, [("customer", -1)]
+    )
+    assert advice.collection_scan
+    assert advice.suggestion
+    assert list(advice.suggestion.document["key"].items()) == [
+        ("created", 1),
+        ("customer", -1),
+        ("total", 1),
+    ]
+
+
+def test_analyze_unindexable() -> None:
+    advice = IndexAdvisor.analyze(Order, {"$where": "this.total > 1"})
+    assert advice.collection_scan
+
+
+def test_indexes_invalidated_by_add_fields() -> None:
+    class Item(Document):
+        name: str
+
+    assert IndexAdvisor.indexes(Item) == [[("_id", 1)]]
+    add_fields(Item, sku=(str, Field(index=True)))
+    assert IndexAdvisor.indexes(Item) == [[("_id", 1)], [("sku", 1)]]
+
+
+def test_check_off() -> None:
+    assert IndexAdvisor.check(Order, {"total": 1}) is None
+
+
+def test_check_log(caplog: pytest.LogCaptureFixture) -> None:
+    IndexAdvisor.enable("log")
+    with caplog.at_level(logging.WARNING, "mango.advisor"):
+        advice = IndexAdvisor.check(Order, {"total": 1})
+    assert advice
+    assert not advice.ok
+    assert "全集合扫描" in caplog.text
+
+
+def test_check_raise() -> None:
+    IndexAdvisor.enable("raise")
+    assert IndexAdvisor.check(Order, {"status": "paid"})
+    with pytest.raises(IndexAdviceError):
+        IndexAdvisor.check(Order, {"total": 1})
+
+
+def test_enable_unknown_mode() -> None:
+    with pytest.raises(ValueError, match="未知"):
+        IndexAdvisor.enable("warn")  # type: ignore
@@ -0,0 +1,153 @@
+from types import SimpleNamespace
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from bson import ObjectId
+
+from mango import Document
+from mango import cache as cache_module
+from mango.cache import QueryCache, generations, invalidate
+from mango.ref import Ref
+
+
+class Writer(Document):
+    name: str
+
+
+class Book(Document):
+    title: str
+    author: Ref[Writer]
+    editor: Ref[Writer]
+
+
+class Cursor:
+    def __init__(self, documents: list[dict[str, Any]]) -> None:
+        self.documents = documents
+
+    async def to_list(self, length: int | None = None) -> list[dict[str, Any]]:
+        return self.documents[:length]
+
+
+@pytest.fixture()
+def book() -> dict[str, Any]:
+    author, editor = ObjectId(), ObjectId()
+    document = {"_id": ObjectId(), "title": "mango", "author": author}
+    document["editor"] = editor
+    joined = {
+        "author": {"_id": author, "name": "author"},
+        "editor": {"_id": editor, "name": "editor"},
+    }
+
+    def aggregate(pipeline: list[Any]) -> Cursor:
+        lookups = [stage["$lookup"] for stage in pipeline if "$lookup" in stage]
+        return Cursor(
+            [
+                document
+                | {lookup["as"]: [joined[lookup["localField"]]] for lookup in lookups}
+            ]
+        )
+
+    Writer.__collection__ = MagicMock()
+    Writer.__collection__.name = "writer"
+    Book.__collection__ = MagicMock()
+    Book.__collection__.aggregate.side_effect = aggregate
+    return document
+
+
+@pytest.mark.usefixtures("book")
+async def test_cached_joins_of_different_refs_do_not_collide() -> None:
+    cache = QueryCache()
+    [by_author] = await Book.find().join(Book.author).cached(cache=cache)
+    [by_editor] = await Book.find().join(Book.editor).cached(cache=cache)
+    assert by_author.author.document.name == "author"
+    assert by_editor.editor.document.name == "editor"
+    assert cache.stats.misses == 2
+
+
+@pytest.mark.usefixtures("book")
+async def test_cached_join_invalidated_by_referenced_model() -> None:
+    cache = QueryCache()
+    await Book.find().join(Book.author).cached(cache=cache)
+    await Book.find().join(Book.author).cached(cache=cache)
+    assert cache.stats.hits == 1
+    invalidate(Writer)
+    await Book.find().join(Book.author).cached(cache=cache)
+    assert cache.stats.misses == 2
+
+
+@pytest.fixture()
+def writers() -> MagicMock:
+    documents = [{"_id": ObjectId(), "name": f"w{i}"} for i in range(3)]
+    collection = MagicMock()
+    collection.find.side_effect = lambda *_, **__: Cursor(documents)
+    collection.find_one = AsyncMock(return_value=documents[0])
+    collection.count_documents = AsyncMock(return_value=3)
+    collection.delete_many = AsyncMock()
+    Writer.__collection__ = collection
+    return collection
+
+
+async def test_cached_hit_and_miss(writers: MagicMock) -> None:
+    cache = QueryCache()
+    first = await Writer.find(Writer.name != "x").cached(cache=cache)
+    second = await Writer.find(Writer.name != "x").cached(cache=cache)
+    assert [w.name for w in first] == [w.name for w in second]
+    await Writer.find(Writer.name != "y").cached(cache=cache)
+    assert await Writer.find().cached(cache=cache).count() == 3
+    assert await Writer.find().cached(cache=cache).count() == 3
+    assert await Writer.find().cached(cache=cache).get()
+    assert writers.find.call_count == 2
+    writers.count_documents.assert_awaited_once()
+    writers.find_one.assert_awaited_once()
+    assert (cache.stats.hits, cache.stats.misses) == (2, 4)
+    assert cache.stats.hit_rate == 1 / 3
+
+
+async def test_cached_invalidated_by_write(writers: MagicMock) -> None:
+    cache = QueryCache()
+    await Writer.find().cached(cache=cache)
+    await Writer.find().delete()
+    await Writer.find().cached(cache=cache)
+    assert writers.find.call_count == 2
+    assert cache.stats.expirations == 1
+
+
+async def test_cached_expires(
+    writers: MagicMock, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    now = 100.0
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(monotonic=lambda: now))
+    cache = QueryCache()
+    await Writer.find().cached(ttl=10, cache=cache)
+    now += 5
+    await Writer.find().cached(ttl=10, cache=cache)
+    now += 10
+    await Writer.find().cached(ttl=10, cache=cache)
+    assert writers.find.call_count == 2
+    assert cache.stats.expirations == 1
+
+
+async def test_cache_eviction_and_limits() -> None:
+    cache = QueryCache(max_entries=2, max_documents=2)
+    gen = generations(Writer)
+    cache.set(Writer, "a", [1], gen=gen, ttl=60)
+    cache.set(Writer, "b", [1], gen=gen, ttl=60)
+    assert cache.get(Writer, "a")
+    cache.set(Writer, "c", [1], gen=gen, ttl=60)
+    assert cache.get(Writer, "b") is None
+    assert cache.get(Writer, "a")
+    assert cache.stats.evictions == 1
+    cache.set(Writer, "d", [1, 2, 3], gen=gen, ttl=60)
+    assert cache.get(Writer, "d") is None
+
+
+async def test_cache_skips_result_written_during_read() -> None:
+    cache = QueryCache()
+
+    async def read() -> list[int]:
+        invalidate(Writer)
+        return [1]
+
+    assert await cache.fetch(Writer, "k", 60, read) == [1]
+    assert len(cache) == 0
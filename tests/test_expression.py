@@ -0,0 +1,52 @@
+import copy
+
+import pytest
+
+from mango import Document
+from mango.expression import Update
+
+
+class Stats(Document):
+    name: str
+    views: int
+    ratio: float | None = None
+    tags: list[str]
+    scores: dict[str, int]
+
+
+@pytest.mark.parametrize(
+    "update",
+    [Stats.views.inc(1), Stats.ratio.mul(2), Stats.tags.push("a")],
+)
+def test_update_accepts_matching_field(update: Update) -> None:
+    update.validate(Stats)
+
+
+@pytest.mark.parametrize(
+    ("update", "match"),
+    [
+        (Stats.name.inc(1), "数字字段"),
+        (Stats.tags.mul(2), "数字字段"),
+        (Stats.scores.push(1), "数组字段"),
+        (Stats.scores.add_to_set(1), "数组字段"),
+        (Stats.scores.pull(1), "数组字段"),
+    ],
+)
+def test_update_rejects_mismatched_field(update: Update, match: str) -> None:
+    with pytest.raises(TypeError, match=match):
+        update.validate(Stats)
+
+
+def test_field_copy_returns_itself() -> None:
+    assert copy.copy(Stats.views) is Stats.views
+    stage = {"$group": {"_id": Stats.name, "keys": [Stats.tags]}}
+    copied = copy.deepcopy(stage)
+    assert copied["$group"]["_id"] is Stats.name
+    assert copied["$group"]["keys"][0] is Stats.tags
+
+
+def test_field_reduce() -> None:
+    cls, args = Stats.views.__reduce__()
+    field = cls(*args)
+    assert str(field) == "views"
+    assert field.field is Stats.views.field
@@ -0,0 +1,156 @@
+import asyncio
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from bson import ObjectId
+from pymongo.read_preferences import ReadPreference
+
+from mango import Document
+from mango.hedge import HedgePolicy, HedgeStats, query_shape
+
+
+class Collection:
+    """按读取偏好返回延迟不同的结果"""
+
+    def __init__(self, delays: dict[str, Any], read_preference: Any = None) -> None:
+        self.delays = delays
+        self.read_preference = read_preference or ReadPreference.PRIMARY
+        self.max_time_ms: list[int | None] = []
+
+    def with_options(self, read_preference: Any) -> "Collection":
+        return Collection(self.delays, read_preference)
+
+    async def read(self, max_time_ms: int | None) -> str:
+        self.max_time_ms.append(max_time_ms)
+        delay = self.delays[self.read_preference.name]
+        if isinstance(delay, Exception):
+            raise delay
+        await asyncio.sleep(delay)
+        return self.read_preference.name
+
+
+def read(collection: Any, max_time_ms: int | None) -> Any:
+    return collection.read(max_time_ms)
+
+
+def test_stats_rates() -> None:
+    assert HedgeStats().hedge_rate == 0
+    assert HedgeStats().win_rate == 0
+    stats = HedgeStats(requests=4, hedged=2, wins=1)
+    assert stats.hedge_rate == 0.5
+    assert stats.win_rate == 0.5
+
+
+def test_query_shape() -> None:
+    shape = query_shape({"b": {"$gt": 1, "$lt": 5}, "a": 1, "c": {"x": 1}})
+    assert shape == ("a", "b:$gt,$lt", "c")
+    assert shape == query_shape({"a": 2, "c": {"x": 2}, "b": {"$lt": 0, "$gt": 9}})
+
+
+def test_delay() -> None:
+    assert HedgePolicy(delay_ms=30).delay("s") == 0.03
+    policy = HedgePolicy(fallback_delay_ms=10, min_samples=5, percentile=0.8)
+    for latency in (0.05, 0.01, 0.04, 0.02):
+        policy.observe("s", latency)
+    assert policy.delay("s") == 0.01
+    policy.observe("s", 0.03)
+    assert policy.delay("s") == 0.05
+    assert policy.delay("other") == 0.01
+
+
+def test_delay_window() -> None:
+    policy = HedgePolicy(window=3, min_samples=1, percentile=0.5)
+    for latency in (9, 9, 1, 1, 1):
+        policy.observe("s", latency)
+    assert policy.delay("s") == 1
+
+
+def test_invalid_percentile() -> None:
+    with pytest.raises(ValueError, match="percentile"):
+        HedgePolicy(percentile=1)
+
+
+def test_hedge_preference() -> None:
+    primary: Any = Collection({})
+    secondary: Any = Collection({}, ReadPreference.SECONDARY)
+    assert HedgePolicy().hedge_preference(primary) == ReadPreference.SECONDARY
+    assert HedgePolicy().hedge_preference(secondary) == ReadPreference.PRIMARY
+    nearest = HedgePolicy(read_preference=ReadPreference.NEAREST)
+    assert nearest.hedge_preference(primary) == ReadPreference.NEAREST
+
+
+async def test_read_without_hedge() -> None:
+    policy = HedgePolicy(delay_ms=50)
+    collection = Collection({"Primary": 0})
+    assert await policy.read(collection, "s", read) == "Primary"  # type: ignore
+    assert policy.stats == HedgeStats(requests=1)
+    assert collection.max_time_ms == [None]
+    assert len(policy._latencies["s"]) == 1
+
+
+async def test_read_hedge_wins() -> None:
+    policy = HedgePolicy(delay_ms=10, max_time_ms=500)
+    collection = Collection({"Primary": 0.1, "Secondary": 0})
+    assert await policy.read(collection, "s", read) == "Secondary"  # type: ignore
+    assert policy.stats == HedgeStats(requests=1, hedged=1, wins=1)
+    assert "s" not in policy._latencies
+    # 原请求结束后记录其完整延迟
+    await asyncio.sleep(0.15)
+    assert policy._latencies["s"][0] >= 0.1
+
+
+async def test_read_primary_wins_after_hedge() -> None:
+    policy = HedgePolicy(delay_ms=10)
+    collection = Collection({"Primary": 0.03, "Secondary": 0.2})
+    assert await policy.read(collection, "s", read) == "Primary"  # type: ignore
+    assert policy.stats == HedgeStats(requests=1, hedged=1, wins=0)
+    assert policy._latencies["s"][0] >= 0.03
+
+
+async def test_read_hedge_fails() -> None:
+    policy = HedgePolicy(delay_ms=10)
+    collection = Collection({"Primary": 0.05, "Secondary": RuntimeError()})
+    assert await policy.read(collection, "s", read) == "Primary"  # type: ignore
+    assert policy.stats.wins == 0
+
+
+class Account(Document):
+    name: str
+
+
+@pytest.fixture()
+def collection() -> MagicMock:
+    collection = MagicMock()
+    collection.find_one = AsyncMock(return_value={"_id": ObjectId(), "name": "a"})
+    Account.__collection__ = collection
+    return collection
+
+
+async def test_get_hedge(collection: MagicMock) -> None:
+    policy = HedgePolicy(delay_ms=50)
+    account = await Account.get(ObjectId(), hedge=policy)
+    assert account
+    assert account.name == "a"
+    assert policy.stats.requests == 1
+    assert collection.find_one.call_args.kwargs == {"max_time_ms": None}
+
+
+async def test_find_hedge(collection: MagicMock) -> None:
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=[{"_id": ObjectId(), "name": "b"}])
+    collection.find.return_value = cursor
+    policy = HedgePolicy(delay_ms=50)
+    accounts = await Account.find(Account.name == "b").hedge(policy)
+    assert [a.name for a in accounts] == ["b"]
+    assert policy.stats.requests == 1
+    args, kwargs = collection.find.call_args
+    assert args == ({"name": {"$eq": "b"}},)
+    assert kwargs["max_time_ms"] is None
+
+
+async def test_find_hedge_default(collection: MagicMock) -> None:
+    requests = HedgePolicy.default.stats.requests
+    assert await Account.get(ObjectId(), hedge=True)
+    assert HedgePolicy.default.stats.requests == requests + 1
+    collection.find_one.assert_awaited_once()
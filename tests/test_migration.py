@@ -0,0 +1,143 @@
+import asyncio
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+from mango import Document
+from mango.migration import (
+    MigrationRunner,
+    migrate_document,
+    migrations_of,
+    register,
+    schema_version,
+)
+
+
+class Customer(Document):
+    full_name: str
+    tier: int = 0
+
+    class Meta:
+        migrate_on_read = True
+
+
+@Customer.migration(1)
+def rename_name(document: dict[str, Any]) -> dict[str, Any]:
+    document["full_name"] = document.pop("name")
+    return document
+
+
+@Customer.migration(2)
+def add_tier(document: dict[str, Any]) -> dict[str, Any]:
+    document.setdefault("tier", 1)
+    return document
+
+
+def test_register_orders_and_rejects_duplicates() -> None:
+    assert list(migrations_of(Customer)) == [1, 2]
+    assert schema_version(Customer) == 2
+    with pytest.raises(ValueError, match="已存在"):
+        register(Customer, 2, add_tier)
+    with pytest.raises(ValueError, match="大于 0"):
+        register(Customer, 0, add_tier)
+
+
+def test_migrate_document_applies_pending_versions() -> None:
+    assert migrate_document(Customer, {"name": "a"}) == {
+        "full_name": "a",
+        "tier": 1,
+        "_v": 2,
+    }
+    assert migrate_document(Customer, {"full_name": "a", "_v": 1}) == {
+        "full_name": "a",
+        "tier": 1,
+        "_v": 2,
+    }
+
+
+def test_from_doc_migrates_on_read() -> None:
+    customer = Customer.from_doc({"_id": ObjectId(), "name": "a"})
+    assert (customer.full_name, customer.tier) == ("a", 1)
+    assert customer.doc()["_v"] == 2
+
+
+async def test_update_does_not_stamp_version() -> None:
+    Customer.__collection__ = AsyncMock()
+    await Customer(full_name="a").update(tier=3)
+    (_, update), _ = Customer.__collection__.update_one.call_args
+    assert "_v" not in update["$set"]
+
+
+class Collection:
+    """按 `_id` 顺序返回文档的集合, 替换仅在过滤条件匹配未被修改的文档时生效"""
+
+    def __init__(self, documents: list[dict[str, Any]]) -> None:
+        self.documents = documents
+        self.modified: set[Any] = set()
+        self.writes: list[list[ReplaceOne]] = []
+
+    def find(self, filter: dict[str, Any], **kwargs: Any) -> MagicMock:
+        after = filter.get("_id", {}).get("$gt")
+        found = [
+            d
+            for d in self.documents
+            if d.get("_v", 0) < 2 and (after is None or d["_id"] > after)
+        ][: kwargs["limit"]]
+        cursor = MagicMock()
+        cursor.to_list = AsyncMock(return_value=[dict(d) for d in found])
+        return cursor
+
+    async def bulk_write(self, operations: list[ReplaceOne], **_: Any) -> MagicMock:
+        self.writes.append(operations)
+        matched = 0
+        for operation in operations:
+            filter = operation._filter
+            if filter["_id"] in self.modified:
+                continue
+            literal = filter["$expr"]["$eq"][1]["$literal"]
+            index = next(i for i, d in enumerate(self.documents) if d == literal)
+            self.documents[index] = operation._doc
+            matched += 1
+        return MagicMock(matched_count=matched, modified_count=matched)
+
+
+@pytest.fixture()
+def collection() -> Collection:
+    collection = Collection(
+        [{"_id": i, "name": f"c{i}"} for i in range(5)]
+        + [{"_id": 5, "full_name": "c5", "tier": 1, "_v": 2}]
+    )
+    Customer.__collection__ = collection  # type: ignore[assignment]
+    return collection
+
+
+async def test_runner_migrates_in_batches(collection: Collection) -> None:
+    report = await MigrationRunner(Customer, batch_size=2).run()
+    assert (report.scanned, report.migrated, report.skipped) == (5, 5, 0)
+    assert report.last_id == 4
+    assert [len(operations) for operations in collection.writes] == [2, 2, 1]
+    assert all(d["_v"] == 2 and "name" not in d for d in collection.documents)
+
+
+async def test_runner_skips_concurrently_modified(collection: Collection) -> None:
+    collection.modified.add(1)
+    report = await MigrationRunner(Customer, batch_size=10).run()
+    assert (report.migrated, report.skipped) == (4, 1)
+    assert collection.documents[1] == {"_id": 1, "name": "c1"}
+
+
+async def test_runner_resumes_after(collection: Collection) -> None:
+    report = await MigrationRunner(Customer, after=2).run()
+    assert (report.scanned, report.last_id) == (2, 4)
+    assert collection.documents[2] == {"_id": 2, "name": "c2"}
+
+
+@pytest.mark.usefixtures("collection")
+async def test_runner_throttles() -> None:
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await MigrationRunner(Customer, batch_size=1, max_rate=100).run()
+    assert loop.time() - start >= 0.04
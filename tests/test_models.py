@@ -0,0 +1,92 @@
+from typing import Any
+from unittest.mock import AsyncMock
+
+import pytest
+from bson import ObjectId
+
+from mango import Document
+from mango.compat import ValidationError, root_validator
+from mango.utils import validate_fields
+
+
+class Reading(Document):
+    n: int
+    region: str
+
+    class Meta:
+        shard_key = ("region",)
+
+
+@pytest.fixture()
+def collection() -> AsyncMock:
+    collection = AsyncMock()
+    Reading.__collection__ = collection
+    return collection
+
+
+@pytest.mark.parametrize("kwargs", [{"region": "us"}, {"id": ObjectId()}])
+async def test_update_rejects_immutable_kwargs(
+    collection: AsyncMock, kwargs: dict[str, Any]
+) -> None:
+    reading = Reading(n=1, region="eu")
+    with pytest.raises(ValueError, match="不可修改"):
+        await reading.update(Reading.n.inc(1), **kwargs)
+    collection.find_one_and_update.assert_not_called()
+
+
+async def test_update_rejects_shard_key_operator(collection: AsyncMock) -> None:
+    reading = Reading(n=1, region="eu")
+    with pytest.raises(ValueError, match="region"):
+        await reading.update(Reading.region.set("us"))
+    collection.find_one_and_update.assert_not_called()
+
+
+class Member(Document):
+    name: str
+    level: int
+
+
+@pytest.fixture()
+def members() -> AsyncMock:
+    collection = AsyncMock()
+    Member.__collection__ = collection
+    return collection
+
+
+async def test_get_or_create_upserts_once(members: AsyncMock) -> None:
+    members.find_one_and_update.return_value = {
+        "_id": ObjectId(),
+        "name": "mango",
+        "level": 1,
+    }
+    member = await Member.get_or_create(Member.name == "mango", defaults={"level": 1})
+    assert member.level == 1
+    members.find_one.assert_not_called()
+    (filter, update), _ = members.find_one_and_update.call_args
+    assert filter == {"name": {"$eq": "mango"}}
+    assert update["$setOnInsert"]["level"] == 1
+
+
+async def test_get_or_create_invalid_candidate_gets(members: AsyncMock) -> None:
+    members.find_one.return_value = {"_id": ObjectId(), "name": "mango", "level": 2}
+    member = await Member.get_or_create(Member.name == "mango")
+    assert member.level == 2
+    members.find_one_and_update.assert_not_called()
+
+
+class Period(Document):
+    start: int
+    end: int
+
+    @root_validator(skip_on_failure=True)
+    def check_order(cls, values: dict[str, Any]) -> dict[str, Any]:
+        if values["start"] > values["end"]:
+            raise ValueError("start 不能晚于 end")
+        return values
+
+
+def test_validate_fields_runs_root_validators() -> None:
+    period = Period(start=1, end=2)
+    assert validate_fields(Period, {"end": 3}, period.__dict__) == {"end": 3}
+    with pytest.raises(ValidationError, match="start 不能晚于 end"):
+        validate_fields(Period, {"end": 0}, period.__dict__)
@@ -0,0 +1,37 @@
+from typing import Any
+
+import pytest
+
+from mango.optimizer import merge_projections
+
+
+@pytest.mark.parametrize(
+    ("first", "second", "expected"),
+    [
+        ({"a.b": 1}, {"a": 1}, {"a.b": 1}),
+        ({"a": 1}, {"a.b": 1}, {"a.b": 1}),
+        ({"a.b": 1, "a.c": 1}, {"a": 1}, {"a.b": 1, "a.c": 1}),
+        ({"a": 1, "b": 1}, {"a": 1}, {"a": 1}),
+        ({"a": 1, "_id": 0}, {"a": 1}, {"a": 1, "_id": 0}),
+    ],
+)
+def test_merge_inclusions(
+    first: dict[str, Any], second: dict[str, Any], expected: dict[str, Any]
+) -> None:
+    assert merge_projections(first, second) == expected
+
+
+def test_merge_exclusions() -> None:
+    assert merge_projections({"a": 0}, {"b": 0}) == {"a": 0, "b": 0}
+
+
+@pytest.mark.parametrize(
+    ("first", "second"),
+    [
+        ({"a": 1}, {"b": 1}),
+        ({"a": 1}, {"b": 0}),
+        ({"a": "$b"}, {"a": 1}),
+    ],
+)
+def test_merge_unmergeable(first: dict[str, Any], second: dict[str, Any]) -> None:
+    assert merge_projections(first, second) is None
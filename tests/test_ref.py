@@ -0,0 +1,28 @@
+import pytest
+
+from mango import Document
+from mango.ref import Ref
+
+
+class Author(Document):
+    name: str
+
+
+class OtherAuthor(Document):
+    __module__ = "tests.other"
+    __qualname__ = "Author"
+
+    name: str
+
+
+OtherAuthor.__name__ = "Author"
+
+
+def test_ref_target_by_qualified_name() -> None:
+    assert Ref[f"{__name__}.Author"].target() is Author
+    assert Ref["tests.other.Author"].target() is OtherAuthor
+
+
+def test_ref_target_ambiguous_name() -> None:
+    with pytest.raises(TypeError, match="不唯一"):
+        Ref["Author"].target()
@@ -0,0 +1,187 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import aclosing
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from bson import ObjectId
+from pydantic import BaseModel
+
+from mango import Document
+from mango.result import AggregateResult, fetch_batches
+
+
+class Post(Document):
+    title: str
+
+
+@pytest.fixture()
+def collection() -> AsyncMock:
+    collection = AsyncMock()
+    collection.find_one.return_value = {"_id": 1}
+    Post.__collection__ = collection
+    return collection
+
+
+async def test_exists_overrides_projection(collection: AsyncMock) -> None:
+    result = Post.find(Post.title == "mango")
+    result.options.projection = {"title": 1}
+    assert await result.exists()
+    args, kwargs = collection.find_one.call_args
+    assert args == ({"title": {"$eq": "mango"}}, {"_id": 1})
+    assert "projection" not in kwargs
+
+
+async def test_exists_after_text_score(collection: AsyncMock) -> None:
+    result = Post.find({"$text": {"$search": "mango"}}).text_score()
+    assert await result.exists()
+    args, kwargs = collection.find_one.call_args
+    assert args[1] == {"_id": 1}
+    assert "projection" not in kwargs
+
+
+class Cursor:
+    def __init__(self, documents: list[dict[str, Any]]) -> None:
+        self.documents = documents
+        self.size = 0
+        self.closed = False
+
+    def batch_size(self, size: int) -> "Cursor":
+        self.size = size
+        return self
+
+    async def to_list(self, length: int | None) -> list[dict[str, Any]]:
+        length = length or len(self.documents)
+        batch, self.documents = self.documents[:length], self.documents[length:]
+        return batch
+
+    async def close(self) -> None:
+        self.closed = True
+
+    async def __aiter__(self) -> AsyncIterator[dict[str, Any]]:
+        while self.documents:
+            yield self.documents.pop(0)
+
+
+class Summary(BaseModel):
+    title: str
+    count: int
+
+
+@pytest.fixture()
+def cursor(collection: AsyncMock) -> Cursor:
+    documents = [{"_id": ObjectId(), "title": f"t{i}", "count": i} for i in range(5)]
+    cursor = Cursor(documents)
+    collection.aggregate = MagicMock(return_value=cursor)
+    return cursor
+
+
+@pytest.mark.usefixtures("cursor")
+async def test_aggregate_options(collection: AsyncMock) -> None:
+    pipeline = [{"$match": {"title": "t1"}}]
+    result = Post.aggregate(pipeline).batch_size(2).allow_disk_use()
+    assert len(await result) == 5
+    collection.aggregate.assert_called_once_with(
+        pipeline, batchSize=2, allowDiskUse=True
+    )
+
+
+@pytest.mark.usefixtures("cursor")
+async def test_aggregate_as_model() -> None:
+    summaries = await Post.aggregate([]).as_model(Summary)
+    assert [s.count for s in summaries] == [0, 1, 2, 3, 4]
+    assert isinstance(summaries[0], Summary)
+
+
+@pytest.mark.usefixtures("cursor")
+async def test_aggregate_iterate_as_model() -> None:
+    posts = [post async for post in Post.aggregate([]).as_model(Post)]
+    assert len(posts) == 5
+    assert isinstance(posts[0], Post)
+
+
+async def test_aggregate_batches(collection: AsyncMock, cursor: Cursor) -> None:
+    batches = [len(b) async for b in Post.aggregate([]).batch_size(2).batches()]
+    assert batches == [2, 2, 1]
+    assert collection.aggregate.call_args.kwargs == {"batchSize": 2}
+    assert cursor.closed
+
+
+async def test_aggregate_batches_closed_on_break(cursor: Cursor) -> None:
+    async with aclosing(Post.aggregate([]).batches(3)) as batches:
+        async for batch in batches:
+            assert len(batch) == 3
+            break
+    assert cursor.closed
+
+
+async def test_aggregate_from_cursor(cursor: Cursor) -> None:
+    result = AggregateResult(cursor).as_model(Summary).batch_size(4)
+    assert cursor.size == 4
+    with pytest.raises(TypeError):
+        result.allow_disk_use()
+    assert len(await result) == 5
+
+
+class FindCursor(Cursor):
+    def __init__(self, documents: list[dict[str, Any]], fail: bool = False) -> None:
+        super().__init__(documents)
+        self.fail = fail
+        self.fetched = 0
+
+    async def to_list(self, length: int | None) -> list[dict[str, Any]]:
+        if self.fail and not self.documents:
+            raise RuntimeError("cursor failed")
+        self.fetched += 1
+        return await super().to_list(length)
+
+
+def posts(count: int) -> list[dict[str, Any]]:
+    return [{"_id": ObjectId(), "title": f"t{i}"} for i in range(count)]
+
+
+async def test_read_ahead(collection: AsyncMock) -> None:
+    cursor = FindCursor(posts(5))
+    collection.find = MagicMock(return_value=cursor)
+    titles = [p.title async for p in Post.find(Post.title != "x").read_ahead(2, 2)]
+    assert titles == ["t0", "t1", "t2", "t3", "t4"]
+    args, kwargs = collection.find.call_args
+    assert args == ({"title": {"$ne": "x"}},)
+    assert kwargs["batch_size"] == 2
+    assert cursor.closed
+
+
+async def test_read_ahead_closed_on_break(collection: AsyncMock) -> None:
+    cursor = FindCursor(posts(10))
+    collection.find = MagicMock(return_value=cursor)
+    async with aclosing(Post.find().read_ahead(1, 2)) as result:
+        async for _ in result:
+            break
+    assert cursor.closed
+    assert cursor.fetched < 5
+
+
+async def test_read_ahead_error(collection: AsyncMock) -> None:
+    collection.find = MagicMock(return_value=FindCursor(posts(2), fail=True))
+    titles: list[str] = []
+
+    async def consume() -> None:
+        async for post in Post.find().read_ahead(batch_size=2):
+            titles.append(post.title)
+
+    with pytest.raises(RuntimeError, match="cursor failed"):
+        await consume()
+    assert titles == ["t0", "t1"]
+
+
+async def test_read_ahead_depth() -> None:
+    with pytest.raises(ValueError, match="depth"):
+        await anext(Post.find().read_ahead(0))
+
+
+async def test_fetch_batches() -> None:
+    queue: asyncio.Queue[Any] = asyncio.Queue()
+    await fetch_batches(FindCursor(posts(3)), 2, queue)  # type: ignore
+    assert [len(await queue.get()), len(await queue.get())] == [2, 1]
+    assert await queue.get() is None
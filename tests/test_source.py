@@ -0,0 +1,221 @@
+import logging
+from datetime import datetime
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from pymongo.collation import Collation
+from pymongo.errors import OperationFailure
+
+from mango import Capped, Document, Storage, TimeSeries
+from mango.index import Index
+from mango.meta import collection_options
+from mango.source import init_collection, is_same_index, is_subset, rebuild_index
+
+FRENCH = {
+    "locale": "fr",
+    "caseLevel": False,
+    "caseFirst": "off",
+    "strength": 3,
+    "numericOrdering": False,
+    "alternate": "non-ignorable",
+    "maxVariable": "punct",
+    "normalization": False,
+    "backwards": False,
+    "version": "57.1",
+}
+
+TEXT = {
+    "v": 2,
+    "key": [("_fts", "text"), ("_ftsx", 1)],
+    "weights": {"content": 1},
+    "default_language": "english",
+    "language_override": "language",
+    "textIndexVersion": 3,
+}
+
+
+@pytest.mark.parametrize(
+    ("index", "info", "expected"),
+    [
+        (Index(("content", Index.TEXT), name="t"), TEXT, True),
+        (Index(("title", Index.TEXT), name="t"), TEXT, False),
+        (
+            Index(("content", Index.TEXT), name="t"),
+            TEXT | {"weights": {"content": 5}},
+            False,
+        ),
+        (
+            Index("name", name="n", collation=Collation("fr")),
+            {"v": 2, "key": [("name", 1)], "collation": FRENCH},
+            True,
+        ),
+        (
+            Index("name", name="n"),
+            {"v": 2, "key": [("name", 1)], "collation": FRENCH},
+            False,
+        ),
+        (
+            Index(("loc", Index.GEOSPHERE), name="g"),
+            {"v": 2, "key": [("loc", "2dsphere")], "2dsphereIndexVersion": 3},
+            True,
+        ),
+        (Index("a", name="a"), {"v": 2, "key": [("a", 1)], "unique": True}, False),
+    ],
+)
+def test_is_same_index(index: Index, info: dict[str, Any], expected: bool) -> None:
+    assert is_same_index(index.document, info) is expected
+
+
+async def test_rebuild_index_only_toggles_hidden() -> None:
+    collection = MagicMock()
+    collection.name = "post"
+    collection.create_indexes = AsyncMock(side_effect=OperationFailure("", 85))
+    collection.index_information = AsyncMock(return_value={"t": TEXT})
+    collection.drop_index = AsyncMock()
+    collection.database.command = AsyncMock()
+    index = Index(("content", Index.TEXT), name="t", hidden=True)
+
+    assert await rebuild_index(collection, index) == "t"
+
+    collection.drop_index.assert_not_called()
+    collection.database.command.assert_awaited_once_with(
+        "collMod", "post", index={"name": "t", "hidden": True}
+    )
+
+
+class Metric(Document):
+    at: datetime
+    host: str
+    value: float
+
+    class Meta:
+        timeseries = TimeSeries("at", "host", "seconds", expire=3600)
+
+
+class Event(Document):
+    name: str
+
+    class Meta:
+        capped = Capped(1024, max=10)
+        storage = Storage("zstd", prefix_compression=False)
+
+
+def test_collection_options() -> None:
+    assert collection_options(Metric.__meta__) == {
+        "timeseries": {
+            "timeField": "at",
+            "metaField": "host",
+            "granularity": "seconds",
+        },
+        "expireAfterSeconds": 3600,
+    }
+    assert collection_options(Event.__meta__) == {
+        "capped": True,
+        "size": 1024,
+        "max": 10,
+        "storageEngine": {"wiredTiger": {"configString": "block_compressor=zstd"}},
+        "indexOptionDefaults": {
+            "storageEngine": {
+                "wiredTiger": {"configString": "prefix_compression=false"}
+            }
+        },
+    }
+    assert collection_options(Document.__meta__) == {}
+
+
+def test_collection_options_exclusive() -> None:
+    meta = type("Meta", (Metric.__meta__,), {"clustered": True})
+    with pytest.raises(ValueError, match="timeseries, clustered"):
+        collection_options(meta)
+
+
+@pytest.mark.parametrize(
+    ("declared", "existing", "expected"),
+    [
+        ({"a": 1}, {"a": 1, "b": 2}, True),
+        ({"a": {"b": 1}}, {"a": {"b": 1, "c": 2}}, True),
+        ({"a": 1}, {"a": 2}, False),
+        ({"a": {"b": 1}}, {"a": 1}, False),
+        ({"a": 1}, None, False),
+        (True, True, True),
+    ],
+)
+def test_is_subset(declared: Any, existing: Any, expected: bool) -> None:
+    assert is_subset(declared, existing) is expected
+
+
+@pytest.fixture()
+def db() -> MagicMock:
+    db = MagicMock()
+    db.collection_options = AsyncMock(return_value=None)
+    db.create_collection = AsyncMock()
+    return db
+
+
+async def test_init_collection_without_options(db: MagicMock) -> None:
+    assert await init_collection(db, "post", {}) is db["post"]
+    db.collection_options.assert_not_called()
+
+
+async def test_init_collection_creates(db: MagicMock) -> None:
+    options = collection_options(Metric.__meta__)
+    created = await init_collection(db, "metric", options)
+    assert created is db.create_collection.return_value
+    db.create_collection.assert_awaited_once_with("metric", **options)
+
+
+async def test_init_collection_existing(
+    db: MagicMock, caplog: pytest.LogCaptureFixture
+) -> None:
+    options = collection_options(Event.__meta__)
+    db.collection_options.return_value = options | {"autoIndexId": True}
+    with caplog.at_level(logging.WARNING, "mango.source"):
+        assert await init_collection(db, "event", options) is db["event"]
+    db.create_collection.assert_not_called()
+    assert not caplog.records
+
+
+async def test_init_collection_drift(
+    db: MagicMock, caplog: pytest.LogCaptureFixture
+) -> None:
+    db.collection_options.return_value = {"capped": True, "size": 2048}
+    with caplog.at_level(logging.WARNING, "mango.source"):
+        await init_collection(db, "event", collection_options(Event.__meta__))
+    db.create_collection.assert_not_called()
+    assert "size=2048 (声明 1024)" in caplog.text
+    assert "max=None (声明 10)" in caplog.text
+    assert "capped" not in caplog.text
+
+
+@pytest.fixture()
+def metrics() -> MagicMock:
+    collection = MagicMock()
+    collection.insert_one = AsyncMock()
+    collection.insert_many = AsyncMock()
+    collection.find_one = AsyncMock()
+    Metric.__collection__ = collection
+    return collection
+
+
+def metric(value: float) -> Metric:
+    return Metric(at=datetime(2024, 1, 1), host="a", value=value)
+
+
+async def test_timeseries_save_inserts(metrics: MagicMock) -> None:
+    await metric(1).save()
+    metrics.insert_one.assert_awaited_once()
+    metrics.find_one.assert_not_called()
+
+
+async def test_timeseries_save_all_unordered(metrics: MagicMock) -> None:
+    await Metric.save_all(metric(1), metric(2))
+    assert metrics.insert_many.call_args.kwargs == {"ordered": False}
+
+
+@pytest.mark.usefixtures("metrics")
+async def test_timeseries_rejects_upsert() -> None:
+    with pytest.raises(TypeError, match="不支持 upsert"):
+        await Metric.get_or_create(Metric.host == "a")
+    with pytest.raises(TypeError, match="不支持 upsert"):
+        await Metric.get_or_create_many(Metric.host, ["a"])
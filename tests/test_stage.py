@@ -0,0 +1,23 @@
+import bson
+
+from mango import Document
+from mango.stage import Pipeline
+
+
+class Item(Document):
+    y: int
+
+
+def test_compile_reencodes_mutated_stage() -> None:
+    pipeline = Pipeline({"$match": {"x": {"$gt": 1}}})
+    compiled = pipeline.compile()
+    assert pipeline.compile() is compiled
+    pipeline[0]["$match"]["x"]["$gt"] = 2  # type: ignore[index]
+    assert bson.decode(pipeline.compile()[0].raw) == {"$match": {"x": {"$gt": 2}}}
+
+
+def test_lookup_sub_pipeline_match_is_a_filter() -> None:
+    pipeline = Pipeline().lookup(
+        from_="b", pipeline=[{"$match": Item.y == 3}], as_="joined"
+    )
+    assert pipeline[0]["$lookup"]["pipeline"] == [{"$match": {"y": {"$eq": 3}}}]
@@ -0,0 +1,15 @@
+import asyncio
+from pathlib import Path
+
+from mango.stream import FileTokenStore
+
+
+async def test_file_token_store_keeps_concurrent_tokens(tmp_path: Path) -> None:
+    path = tmp_path / "tokens.json"
+    stores = [FileTokenStore(path), FileTokenStore(path)]
+    await asyncio.gather(
+        *(stores[i % 2].save(f"stream-{i}", {"_data": str(i)}) for i in range(50))
+    )
+    store = FileTokenStore(path)
+    for i in range(50):
+        assert await store.load(f"stream-{i}") == {"_data": str(i)}
@@ -0,0 +1,121 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock
+
+import bson
+import pytest
+from bson import ObjectId
+from bson.raw_bson import RawBSONDocument
+
+from mango import Document
+from mango.transfer import resolve_format
+
+
+class Cursor:
+    def __init__(self, documents: list[RawBSONDocument]) -> None:
+        self.documents = documents
+
+    async def to_list(self, length: int) -> list[RawBSONDocument]:
+        batch, self.documents = self.documents[:length], self.documents[length:]
+        return batch
+
+
+def make_model() -> type[Document]:
+    """在函数内定义模型, 验证时不需要序列化模型类"""
+
+    class Gauge(Document):
+        sensor: str
+        value: float
+        at: datetime
+
+    return Gauge
+
+
+@pytest.fixture()
+def model() -> type[Document]:
+    model = make_model()
+    model.__collection__ = AsyncMock()
+    return model
+
+
+def rows(count: int) -> list[dict[str, Any]]:
+    return [
+        {
+            "_id": ObjectId(),
+            "sensor": f"s{i}",
+            "value": i / 2,
+            "at": datetime(2024, 1, 1, i % 24),
+        }
+        for i in range(count)
+    ]
+
+
+def inserted(collection: AsyncMock) -> list[dict[str, Any]]:
+    return [
+        bson.decode(document.raw)
+        for call in collection.insert_many.call_args_list
+        for document in call.args[0]
+    ]
+
+
+@pytest.mark.parametrize("suffix", [".bson", ".jsonl"])
+async def test_round_trip(model: type[Document], tmp_path: Path, suffix: str) -> None:
+    documents = rows(5)
+    collection = MagicMock()
+    collection.find.return_value = Cursor(
+        [RawBSONDocument(bson.encode(d)) for d in documents]
+    )
+    model.__collection__.with_options = MagicMock(return_value=collection)
+    path = tmp_path / f"readings{suffix}"
+
+    assert await model.export(path, model.sensor != "x", batch_size=2) == 5
+    assert collection.find.call_args.args == ({"sensor": {"$ne": "x"}},)
+
+    assert await model.import_(path, batch_size=2, validate=True, workers=2) == 5
+    assert model.__collection__.insert_many.await_count == 3
+    assert inserted(model.__collection__) == documents
+
+
+async def test_import_invalid(model: type[Document], tmp_path: Path) -> None:
+    documents = rows(3)
+    del documents[2]["value"]
+    path = tmp_path / "readings.bson"
+    path.write_bytes(b"".join(bson.encode(d) for d in documents))
+
+    with pytest.raises(ValueError, match="已导入 2 个文档"):
+        await model.import_(path, batch_size=2, validate=True)
+    assert len(inserted(model.__collection__)) == 2
+
+
+async def test_import_empty(model: type[Document], tmp_path: Path) -> None:
+    path = tmp_path / "empty.jsonl"
+    path.touch()
+    assert await model.import_(path) == 0
+    model.__collection__.insert_many.assert_not_called()
+
+
+async def test_import_corrupted(model: type[Document], tmp_path: Path) -> None:
+    path = tmp_path / "readings.bson"
+    path.write_bytes(bson.encode(rows(1)[0])[:-3])
+    with pytest.raises(ValueError, match="已损坏"):
+        await model.import_(path)
+
+
+@pytest.mark.parametrize(
+    ("path", "format", "expected"),
+    [
+        ("a.jsonl", None, "jsonl"),
+        ("a.json", None, "jsonl"),
+        ("a.bson", None, "bson"),
+        ("a.dump", None, "bson"),
+        ("a.bson", "jsonl", "jsonl"),
+    ],
+)
+def test_resolve_format(path: str, format: str | None, expected: str) -> None:
+    assert resolve_format(path, format) == expected
+
+
+def test_resolve_unknown_format() -> None:
+    with pytest.raises(ValueError, match="未知的文件格式"):
+        resolve_format("a.csv", "csv")
@@ -0,0 +1,191 @@
+from collections.abc import AsyncGenerator
+from datetime import datetime
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock
+
+import bson
+import pytest
+
+from mango import Document
+from mango.stream import ChangeEvent
+from mango.view import REFRESH_FIELD, STATE_COLLECTION, MaterializedView
+
+
+class Sale(Document):
+    region: str
+    amount: int
+    updated: datetime
+
+
+class RegionTotal(MaterializedView):
+    total: int
+
+    class Meta:
+        source = Sale
+        key = "region"
+        watermark = "updated"
+        pipeline = ({"$group": {"_id": "$region", "total": {"$sum": "$amount"}}},)
+
+
+class Cursor:
+    def __init__(self, documents: list[dict[str, Any]]) -> None:
+        self.documents = documents
+
+    async def __aiter__(self) -> AsyncGenerator[dict[str, Any], None]:
+        for document in self.documents:
+            yield document
+
+    async def to_list(self, length: int | None = None) -> list[dict[str, Any]]:
+        return self.documents[:length]
+
+
+class Source:
+    """记录在源集合上执行的管道, 并返回预设的分组结果"""
+
+    def __init__(self, groups: list[dict[str, Any]]) -> None:
+        self.groups = groups
+        self.merges: list[list[dict[str, Any]]] = []
+        self.scans: list[list[dict[str, Any]]] = []
+
+    def aggregate(self, pipeline: list[Any]) -> Cursor:
+        stages = [bson.decode(stage.raw) for stage in pipeline]
+        if "$merge" in stages[-1]:
+            self.merges.append(stages)
+            return Cursor([])
+        self.scans.append(stages)
+        return Cursor(self.groups)
+
+
+@pytest.fixture()
+def state() -> AsyncMock:
+    return AsyncMock()
+
+
+@pytest.fixture()
+def view(state: AsyncMock) -> MagicMock:
+    collection = MagicMock()
+    collection.name = "region_total"
+    collection.full_name = "test.region_total"
+    collection.database.name = "test"
+    collection.database.__getitem__.side_effect = {STATE_COLLECTION: state}.get
+    collection.delete_many = AsyncMock()
+    RegionTotal.__collection__ = collection
+    return collection
+
+
+def use_source(groups: list[dict[str, Any]], latest: Any = None) -> Source:
+    source = Source(groups)
+    collection = MagicMock()
+    collection.aggregate.side_effect = source.aggregate
+    collection.find_one = AsyncMock(return_value=latest)
+    Sale.__collection__ = collection
+    return source
+
+
+def merge_run(stages: list[dict[str, Any]]) -> bson.ObjectId:
+    return next(s["$set"][REFRESH_FIELD] for s in stages if "$set" in s)
+
+
+async def test_refresh_full(view: MagicMock, state: AsyncMock) -> None:
+    latest = datetime(2023, 1, 2)
+    state.find_one.return_value = None
+    source = use_source([], latest={"updated": latest})
+
+    report = await RegionTotal.refresh()
+
+    assert report.full
+    assert report.watermark == latest
+    [stages] = source.merges
+    assert stages[0] == {"$group": {"_id": "$region", "total": {"$sum": "$amount"}}}
+    assert stages[-1]["$merge"]["into"] == {"db": "test", "coll": "region_total"}
+    view.delete_many.assert_awaited_once_with(
+        {REFRESH_FIELD: {"$not": {"$gte": merge_run(stages)}}}
+    )
+    state.update_one.assert_awaited_once_with(
+        {"_id": "test.region_total"}, {"$set": {"watermark": latest}}, upsert=True
+    )
+
+
+@pytest.mark.usefixtures("view")
+async def test_refresh_incremental(state: AsyncMock) -> None:
+    before, after = datetime(2023, 1, 1), datetime(2023, 1, 3)
+    state.find_one.return_value = {"watermark": before}
+    source = use_source(
+        [
+            {"_id": "eu", "watermark": after},
+            {"_id": "us", "watermark": datetime(2023, 1, 2)},
+        ]
+    )
+
+    report = await RegionTotal.refresh()
+
+    assert not report.full
+    assert report.keys == 2
+    assert report.watermark == after
+    [stages] = source.merges
+    assert stages[0] == {"$match": {"region": {"$in": ["eu", "us"]}}}
+    # 与上次水位相等的文档也需要重新计算
+    assert source.scans[0][0] == {"$match": {"updated": {"$gte": before}}}
+    state.update_one.assert_awaited_once_with(
+        {"_id": "test.region_total"}, {"$set": {"watermark": after}}, upsert=True
+    )
+
+
+async def test_refresh_removes_keys_without_output(
+    view: MagicMock, state: AsyncMock
+) -> None:
+    watermark = datetime(2023, 1, 1)
+    state.find_one.return_value = {"watermark": watermark}
+    source = use_source([{"_id": "eu", "watermark": watermark}])
+
+    report = await RegionTotal.refresh()
+
+    # 水位没有前进时保持不变
+    assert report.watermark == watermark
+    [stages] = source.merges
+    view.delete_many.assert_awaited_once_with(
+        {"_id": {"$in": ["eu"]}, REFRESH_FIELD: {"$ne": merge_run(stages)}}
+    )
+
+
+async def test_refresh_in_batches(view: MagicMock, state: AsyncMock) -> None:
+    watermark = datetime(2023, 1, 1)
+    state.find_one.return_value = {"watermark": watermark}
+    source = use_source(
+        [{"_id": region, "watermark": watermark} for region in ("eu", "us", "ap")]
+    )
+
+    report = await RegionTotal.refresh(batch_size=2)
+
+    assert report.keys == 3
+    assert [stages[0]["$match"]["region"]["$in"] for stages in source.merges] == [
+        ["eu", "us"],
+        ["ap"],
+    ]
+    assert view.delete_many.await_count == 2
+
+
+def test_changed_keys_use_pre_image() -> None:
+    deleted, moved = bson.ObjectId(), bson.ObjectId()
+    changes = [
+        {
+            "_id": {},
+            "operationType": "delete",
+            "documentKey": {"_id": deleted},
+            "fullDocumentBeforeChange": {"_id": deleted, "region": "eu"},
+        },
+        {
+            "_id": {},
+            "operationType": "replace",
+            "documentKey": {"_id": moved},
+            "fullDocumentBeforeChange": {"_id": moved, "region": "us"},
+            "fullDocument": {
+                "_id": moved,
+                "region": "ap",
+                "amount": 1,
+                "updated": datetime(2023, 1, 1),
+            },
+        },
+    ]
+    events = [ChangeEvent.from_change(Sale, change) for change in changes]
+    assert list(RegionTotal._changed_keys(events)) == ["eu", "us", "ap"]
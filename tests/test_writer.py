@@ -0,0 +1,56 @@
+import asyncio
+from typing import Any
+from unittest.mock import MagicMock
+
+import pytest
+
+from mango import Document, Mango
+from mango.writer import BufferedWriter
+
+
+class Event(Document):
+    n: int
+
+
+class Audit(Document):
+    n: int
+
+
+@pytest.fixture()
+def written() -> list[dict[str, Any]]:
+    written: list[dict[str, Any]] = []
+
+    async def insert_many(documents: list[dict[str, Any]], **_: Any) -> None:
+        written.extend(documents)
+
+    for model in (Event, Audit):
+        model.__collection__ = MagicMock()
+        model.__collection__.insert_many.side_effect = insert_many
+    return written
+
+
+async def test_trickled_inserts_are_all_written(written: list[dict[str, Any]]) -> None:
+    async with BufferedWriter(Event, max_batch=100, max_delay_ms=2) as writer:
+        futures = []
+        for n in range(30):
+            futures.append(await writer.insert(Event(n=n)))
+            await asyncio.sleep(0.001 * (n % 3))
+        await asyncio.wait_for(writer.flush(), 1)
+        await asyncio.gather(*futures)
+    assert sorted(document["n"] for document in written) == list(range(30))
+
+
+async def test_aclose_closes_writers_of_given_clients(
+    written: list[dict[str, Any]],
+) -> None:
+    client, other = MagicMock(), MagicMock()
+    Event.__collection__.database.client = client.client
+    Audit.__collection__.database.client = other.client
+    event, audit = BufferedWriter(Event), BufferedWriter(Audit)
+    await event.insert(Event(n=1))
+    await audit.insert(Audit(n=2))
+    await Mango.aclose(client)
+    assert event not in BufferedWriter.active()
+    assert audit in BufferedWriter.active()
+    await audit.close()
+    assert [document["n"] for document in written] == [1, 2]